@@ -1,54 +1,48 @@
 """Application principale"""
 
 import os
+import click
 from flask import Flask
-from flask_migrate import Migrate, upgrade
 from config import Config
 from models import db
+from ingest import ingest_queue
+from sqlite_pragmas import sqlite_maintenance
 from routes import register_routes
-import click
-from flask.cli import with_appcontext
-from backup import export_backup, restore_backup
+from schema import ensure_schema, init_migrate
+from storage import UploadRequest
+from commands import register_commands
 
 
-def create_app():
+def create_app(config=None):
     """
     Initialisation de l'application
+    :param config: valeurs de configuration surchargeant ``Config``
     """
     app = Flask(__name__)
-    migrate = Migrate()
+    app.request_class = UploadRequest
     app.config.from_object(Config)
+    if config:
+        app.config.update(config)
 
-    # Création du dossier d'upload
-    if not os.path.exists(app.config['UPLOAD_FOLDER']):
-        os.makedirs(app.config['UPLOAD_FOLDER'])
-
-    if not os.path.exists(app.config['DB_FOLDER']):
-        os.makedirs(app.config['DB_FOLDER'])
+    # Création des dossiers d'upload, de la base et des miniatures
+    for key in ('UPLOAD_FOLDER', 'DB_FOLDER', 'THUMB_FOLDER'):
+        os.makedirs(app.config[key], exist_ok=True)
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    sqlite_maintenance.init_app(app)
+    ingest_queue.init_app(app)
     register_routes(app)
 
-    if os.path.exists("migrations"):
-        with app.app_context():
-            upgrade()
-
-    @app.cli.command("backup")
-    @click.option("--output", default="backup.json", help="Fichier de sortie")
-    @with_appcontext
-    def backup_command(output):
-        """Export complet de la base en JSON."""
-        export_backup(output)
-        click.echo(f"Backup créé : {output}")
-
-    @app.cli.command("restore")
-    @click.option("--input", default="backup.json", help="Fichier à restaurer")
-    @with_appcontext
-    def restore_command(input):
-        """Restauration complète depuis un JSON."""
-        restore_backup(input)
-        click.echo(f"Base restaurée depuis : {input}")
+    # En production, les migrations sont une étape unique du démarrage
+    # (cf. gunicorn.conf.py) et non le fait de chaque worker ; ailleurs,
+    # seule une base en retard charge Alembic
+    if app.config['AUTO_MIGRATE']:
+        ensure_schema(app)
+
+    register_commands(app)
+    # Commandes « flask db » : Flask-Migrate n'est chargé que sous la CLI
+    if click.get_current_context(silent=True) is not None:
+        init_migrate(app)
 
     return app
 
@@ -56,5 +50,8 @@ def create_app():
 if __name__ == '__main__':
     # Creation de l'app
     appli = create_app()
-    # Lance l’application Flask en mode debug
-    appli.run(debug=True)
+    # Processus unique : les jobs en cours ont été interrompus par son arrêt
+    with appli.app_context():
+        ingest_queue.recover(appli.config)
+    # Serveur de développement ; mode debug avec FLASK_DEBUG=1
+    appli.run()
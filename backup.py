@@ -1,89 +1,570 @@
+import gzip
 import json
-from datetime import datetime
-from models import db, Prompt, Category
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from models import (db, Prompt, PromptRaw, Category, CategoryClosure,
+                    DeletedRecord, Tag, prompt_tags)
+from utils import (CategoryService, LoraService, SearchService,
+                   StatsService, TagService)
 from version import __version__
 
+# Version du format : 1.0 = document JSON unique, 2.0 = NDJSON (workflow
+# brut conservé sous forme de texte JSON : ni analysé ni resérialisé)
+SCHEMA_VERSION = "2.0"
+LEGACY_SCHEMA_VERSION = "1.0"
 
-def export_backup(filepath="backup.json"):
-    categories = Category.query.all()
-    prompts = Prompt.query.all()
+CATEGORY_FIELDS = ("id", "name", "description", "parent_id", "created_at",
+                   "updated_at")
+PROMPT_FIELDS = ("id", "prompt", "tags", "seed", "steps", "checkpoint", "cfg",
+                 "loras", "neg_prompt", "sampler", "scheduler", "category_id",
+                 "image_filename", "image_hash", "created_at", "updated_at")
 
-    data = {
-        "exported_at": datetime.utcnow().isoformat(),
-        "schema_version": "1.0",
+# Tables dont les triggers alimentent l'index plein texte, les compteurs des
+# statistiques, l'index des LoRAs et les pierres tombales : suspendus pendant
+# une restauration, qui recalcule les tables dérivées en une passe
+TRIGGER_TABLES = ("prompts", "prompt_tags", "categories")
+
+# Manifeste des sauvegardes, dans le dossier des fichiers de sauvegarde
+MANIFEST_NAME = "backup-manifest.json"
+
+# Une sauvegarde incrémentale reprend depuis la fin de la précédente moins
+# cette marge : une écriture horodatée juste avant la sauvegarde précédente
+# mais validée après sa lecture n'est pas perdue (les doublons d'une
+# incrémentale à l'autre sont sans effet à la restauration)
+INCREMENTAL_MARGIN = timedelta(minutes=5)
+
+# Signatures des fichiers compressés
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} non sérialisable")
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, default=_json_default)
+
+
+def compression_for(filepath):
+    """Compression déduite de l'extension (``.gz``, ``.zst``)"""
+    if filepath.endswith(".gz"):
+        return "gzip"
+    if filepath.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def detect_compression(filepath):
+    """Compression déduite des premiers octets du fichier"""
+    with open(filepath, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic == ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+
+def open_backup(filepath, mode, compression=None):
+    """Ouvre un fichier de sauvegarde en mode texte, compressé ou non"""
+    if compression == "gzip":
+        # Niveau 6 : l'essentiel du gain pour une fraction du temps du niveau 9
+        return gzip.open(filepath, mode + "t", encoding="utf-8",
+                         compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard  # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise RuntimeError(
+                "La compression zstd nécessite le paquet 'zstandard' "
+                "(pip install zstandard)") from exc
+        return zstandard.open(filepath, mode + "t", encoding="utf-8")
+    return open(filepath, mode, encoding="utf-8")
+
+
+def iter_categories(batch_size=500, since=None):
+    """Catégories (modifiées depuis ``since``), lues par lots (dictionnaires)"""
+    columns = [getattr(Category, field) for field in CATEGORY_FIELDS]
+    query = select(*columns).order_by(Category.id)
+    if since is not None:
+        query = query.where(Category.updated_at >= since)
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for row in result:
+        yield dict(zip(CATEGORY_FIELDS, row))
+
+
+def iter_prompts(batch_size=500, raw_text=False, since=None):
+    """
+    Prompts (modifiés depuis ``since``) avec leur workflow brut, lus par lots
+    via un curseur (lignes Core : rien n'est conservé dans la session).
+    :param raw_text: workflow en texte JSON plutôt qu'en dictionnaire
+    """
+    decode = PromptRaw.decode_text if raw_text else PromptRaw.decode
+    columns = [getattr(Prompt, field) for field in PROMPT_FIELDS]
+    query = (select(*columns, PromptRaw.data)
+             .outerjoin(PromptRaw, PromptRaw.prompt_id == Prompt.id)
+             .order_by(Prompt.id))
+    if since is not None:
+        query = query.where(Prompt.updated_at >= since)
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for row in result:
+        record = dict(zip(PROMPT_FIELDS, row))
+        record["prompt_raw"] = decode(row[-1]) if row[-1] else None
+        yield record
+
+
+def iter_deletions(since):
+    """Suppressions de prompts et de catégories depuis ``since``"""
+    result = db.session.execute(
+        select(DeletedRecord.kind, DeletedRecord.record_id,
+               DeletedRecord.deleted_at)
+        .where(DeletedRecord.deleted_at >= since)
+        .order_by(DeletedRecord.id))
+    for kind, record_id, deleted_at in result:
+        yield {"kind": kind, "id": record_id, "deleted_at": deleted_at}
+
+
+def read_manifest(directory):
+    """
+    Manifeste des sauvegardes de ``directory`` : ``backups`` (ordre
+    chronologique) et ``head``, la sauvegarde dont la base est l'état actuel
+    (dernière sauvegarde, ou sauvegarde restaurée), point de départ de la
+    prochaine incrémentale.
+    """
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"head": None, "backups": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def _record_backup(filepath, header, counts):
+    """Ajoute une sauvegarde au manifeste de son dossier"""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    name = os.path.basename(filepath)
+    manifest = read_manifest(directory)
+    # L'entrée d'un fichier qui vient d'être écrasé n'est plus valable
+    manifest["backups"] = [entry for entry in manifest["backups"]
+                           if entry["file"] != name]
+    manifest["backups"].append({
+        "id": header["backup_id"],
+        "file": name,
+        "kind": header["kind"],
+        "parent": header["parent"],
+        "since": header["since"],
+        "until": header["until"],
+        **counts,
+    })
+    manifest["head"] = header["backup_id"]
+    _write_manifest(directory, manifest)
+
+
+def _format_for(filepath):
+    return "ndjson" if ".ndjson" in os.path.basename(filepath) else "json"
+
+
+def _write_backup(filepath, fmt, header, sections):
+    """
+    Écrit une sauvegarde enregistrement par enregistrement, dans un fichier
+    temporaire renommé une fois complet : une sauvegarde interrompue
+    n'écrase pas la précédente.
+    :param sections: liste de ``(clé, type, enregistrements)``
+    :return: nombre d'enregistrements écrits par clé
+    """
+    counts = {key: 0 for key, _, _ in sections}
+    tmp_path = f"{filepath}.tmp"
+    try:
+        with open_backup(tmp_path, "w", compression_for(filepath)) as f:
+            if fmt == "ndjson":
+                f.write(_dumps({"type": "header", **header}) + "\n")
+                for key, kind, records in sections:
+                    for record in records:
+                        f.write(_dumps({"type": kind, **record}) + "\n")
+                        counts[key] += 1
+            else:
+                f.write(_dumps(header)[:-1])
+                for key, _, records in sections:
+                    f.write(f', "{key}": [')
+                    for index, record in enumerate(records):
+                        f.write((",\n" if index else "\n") + _dumps(record))
+                        counts[key] += 1
+                    f.write("\n]")
+                f.write("}\n")
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return counts
+
+
+def _backup_header(fmt, kind, parent=None, since=None, until=None):
+    until = until or datetime.utcnow().isoformat()
+    return {
+        "exported_at": until,
+        "schema_version": SCHEMA_VERSION if fmt == "ndjson"
+        else LEGACY_SCHEMA_VERSION,
         "application_version": __version__,
-        "categories": [
-            {
-                "id": c.id,
-                "name": c.name,
-                "description": c.description,
-                "parent_id": c.parent_id,
-                "created_at": c.created_at.isoformat() if c.created_at else None,
-            }
-            for c in categories
-        ],
-        "prompts": [
-            {
-                "id": p.id,
-                "prompt": p.prompt,
-                "tags": p.tags,
-                "seed": p.seed,
-                "steps": p.steps,
-                "checkpoint": p.checkpoint,
-                "loras": p.loras,
-                "neg_prompt": p.neg_prompt,
-                "category_id": p.category_id,
-                "image_filename": p.image_filename,
-                "prompt_raw": p.prompt_raw,
-                "created_at": p.created_at.isoformat() if p.created_at else None,
-                "updated_at": p.updated_at.isoformat() if p.updated_at else None,
-            }
-            for p in prompts
-        ],
+        "backup_id": uuid.uuid4().hex,
+        "kind": kind,
+        "parent": parent,
+        "since": since,
+        "until": until,
+    }
+
+
+def export_backup(filepath="backup.json", fmt=None, batch_size=500,
+                  incremental=False, since=None):
+    """
+    Export de la base, écrit enregistrement par enregistrement, puis ajouté
+    au manifeste du dossier (``backup-manifest.json``).
+
+    :param fmt: ``ndjson`` (un enregistrement par ligne, précédé d'un
+        en-tête) ou ``json`` (document au format historique 1.0). Déduit du
+        nom du fichier si absent (``.ndjson``).
+    :param incremental: n'exporte que les prompts et catégories modifiés ou
+        supprimés depuis la sauvegarde de référence du manifeste (``head``)
+    :param since: date de début explicite d'une sauvegarde incrémentale
+    :return: nombre de catégories, de prompts (et de suppressions) exportés
+    """
+    fmt = fmt or _format_for(filepath)
+    parent = None
+    if incremental or since is not None:
+        if fmt != "ndjson":
+            raise ValueError("Les sauvegardes incrémentales sont au format "
+                             "NDJSON (fichier .ndjson)")
+        manifest = read_manifest(os.path.dirname(os.path.abspath(filepath)))
+        head = next((entry for entry in manifest["backups"]
+                     if entry["id"] == manifest["head"]), None)
+        parent = head["id"] if head else None
+        if since is None:
+            if head is None:
+                raise ValueError(f"Aucune sauvegarde de référence dans "
+                                 f"{MANIFEST_NAME} : faire d'abord une "
+                                 "sauvegarde complète")
+            since = datetime.fromisoformat(head["until"])
+
+    if since is None:
+        header = _backup_header(fmt, "full")
+        sections = [
+            ("categories", "category", iter_categories(batch_size)),
+            ("prompts", "prompt", iter_prompts(batch_size, fmt == "ndjson")),
+        ]
+    else:
+        header = _backup_header(fmt, "incremental", parent, since.isoformat())
+        start = since - INCREMENTAL_MARGIN
+        sections = [
+            # Les suppressions précèdent les ajouts (un id peut être réutilisé)
+            ("deleted", "deletion", iter_deletions(start)),
+            ("categories", "category", iter_categories(batch_size, start)),
+            ("prompts", "prompt", iter_prompts(batch_size, True, start)),
+        ]
+
+    counts = _write_backup(filepath, fmt, header, sections)
+    _record_backup(filepath, header, counts)
+    return counts
+
+
+def iter_backup(filepath):
+    """
+    Lit une sauvegarde (NDJSON 2.0 ou JSON 1.0, compressée ou non) et
+    produit des couples ``(type, enregistrement)`` : ``header``, puis
+    ``deletion``, ``category`` et ``prompt``. Le format est détecté sur le
+    contenu.
+    """
+    with open_backup(filepath, "r", detect_compression(filepath)) as f:
+        first_line = f.readline()
+        try:
+            first = json.loads(first_line)
+        except ValueError:
+            first = None
+
+        if isinstance(first, dict) and first.get("type") == "header":
+            yield "header", first
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record.pop("type"), record
+            return
+
+        # Format historique : un seul document JSON, lu en entier
+        data = json.loads(first_line + f.read())
+    yield "header", {key: value for key, value in data.items()
+                     if key not in ("categories", "prompts")}
+    for record in data.get("categories", []):
+        yield "category", record
+    for record in data.get("prompts", []):
+        yield "prompt", record
+
+
+def read_header(filepath):
+    """En-tête d'une sauvegarde"""
+    records = iter_backup(filepath)
+    try:
+        return next(records)[1]
+    finally:
+        records.close()
+
+
+def backup_chain(filepath):
+    """
+    Chaîne de restauration de ``filepath`` : ``[(chemin, en-tête)]`` de la
+    sauvegarde complète à ``filepath``, remontée via le manifeste du dossier.
+    Une incrémentale sans parent est appliquée sur la base actuelle.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    entries = {entry["id"]: entry
+               for entry in read_manifest(directory)["backups"]}
+    header = read_header(filepath)
+    chain = [(filepath, header)]
+    while header.get("kind") == "incremental" and header.get("parent"):
+        parent = header["parent"]
+        entry = entries.get(parent)
+        if entry is None:
+            raise ValueError(f"Sauvegarde {parent} absente de {MANIFEST_NAME}")
+        path = os.path.join(directory, entry["file"])
+        if not os.path.exists(path):
+            raise ValueError(f"Fichier de sauvegarde manquant : {entry['file']}")
+        header = read_header(path)
+        if header.get("backup_id") != parent:
+            raise ValueError(f"{entry['file']} ne contient plus la "
+                             f"sauvegarde {parent}")
+        chain.insert(0, (path, header))
+    return chain
+
+
+def compact_backups(filepath, output, fmt=None):
+    """
+    Fusionne la chaîne de ``filepath`` (complète + incrémentales) en une
+    nouvelle sauvegarde complète, sans passer par la base : la sauvegarde
+    complète est relue en flux, seules les incrémentales sont gardées en
+    mémoire.
+    :return: nombre de catégories et de prompts de la sauvegarde fusionnée
+    """
+    chain = backup_chain(filepath)
+    base_path, base_header = chain[0]
+    if base_header.get("kind") == "incremental":
+        raise ValueError("La chaîne ne commence pas par une sauvegarde "
+                         "complète")
+
+    # Dernier état connu par id ; None : supprimé
+    changes = {"category": {}, "prompt": {}}
+    for path, _ in chain[1:]:
+        for kind, record in iter_backup(path):
+            if kind == "deletion":
+                changes[record["kind"]][record["id"]] = None
+            elif kind in changes:
+                changes[kind][record["id"]] = record
+
+    def merged(kind):
+        replaced = changes[kind]
+        for record_kind, record in iter_backup(base_path):
+            if record_kind == kind and record["id"] not in replaced:
+                yield record
+            elif kind == "category" and record_kind == "prompt":
+                break
+        yield from (record for record in replaced.values() if record)
+
+    fmt = fmt or _format_for(output)
+    header = _backup_header(fmt, "full", until=chain[-1][1].get("until"))
+    header["compacted_from"] = [h.get("backup_id") for _, h in chain]
+    counts = _write_backup(output, fmt, header, [
+        ("categories", "category", merged("category")),
+        ("prompts", "prompt", merged("prompt")),
+    ])
+    _record_backup(output, header, counts)
+    return counts
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _category_row(record):
+    created_at = _parse_datetime(record.get("created_at"))
+    return {
+        "id": record["id"],
+        "name": record["name"],
+        "description": record.get("description"),
+        "parent_id": record.get("parent_id"),
+        "created_at": created_at,
+        "updated_at": _parse_datetime(record.get("updated_at")) or created_at,
     }
 
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-
-def restore_backup(filepath="backup.json"):
-    from datetime import datetime
-
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    Prompt.query.delete()
-    Category.query.delete()
-    db.session.commit()
-
-    for c in data["categories"]:
-        category = Category(
-            id=c["id"],
-            name=c["name"],
-            description=c["description"],
-            parent_id=c["parent_id"],
-            created_at=datetime.fromisoformat(c["created_at"]) if c["created_at"] else None,
-        )
-        db.session.add(category)
-
-    db.session.commit()
-
-    for p in data["prompts"]:
-        prompt = Prompt(
-            id=p["id"],
-            prompt=p["prompt"],
-            tags=p["tags"],
-            seed=p["seed"],
-            steps=p["steps"],
-            checkpoint=p["checkpoint"],
-            loras=p["loras"],
-            neg_prompt=p["neg_prompt"],
-            category_id=p["category_id"],
-            image_filename=p["image_filename"],
-            prompt_raw=p["prompt_raw"],
-            created_at=datetime.fromisoformat(p["created_at"]) if p["created_at"] else None,
-            updated_at=datetime.fromisoformat(p["updated_at"]) if p["updated_at"] else None,
-        )
-        db.session.add(prompt)
-
-    db.session.commit()
+
+def _prompt_row(record):
+    row = {field: record.get(field) for field in PROMPT_FIELDS}
+    row["created_at"] = _parse_datetime(row["created_at"])
+    row["updated_at"] = _parse_datetime(row["updated_at"])
+    return row
+
+
+def _suspend_triggers():
+    """
+    Supprime, dans la transaction en cours, les triggers de
+    ``TRIGGER_TABLES`` (le DDL SQLite est transactionnel : un rollback les
+    rétablit).
+    :return: SQL de création des triggers supprimés
+    """
+    connection = db.session.connection()
+    rows = connection.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+        "AND tbl_name IN ({})".format(
+            ", ".join(f"'{name}'" for name in TRIGGER_TABLES))).all()
+    for name, _ in rows:
+        connection.exec_driver_sql(f'DROP TRIGGER "{name}"')
+    return [sql for _, sql in rows]
+
+
+def _resume_triggers(statements):
+    connection = db.session.connection()
+    for sql in statements:
+        connection.exec_driver_sql(sql)
+
+
+def _clear_tables():
+    """Vide les catégories, les prompts, leurs workflows et leurs tags"""
+    db.session.execute(Category.__table__.delete())
+    db.session.execute(prompt_tags.delete())
+    db.session.execute(Tag.__table__.delete())
+    db.session.execute(PromptRaw.__table__.delete())
+    db.session.execute(Prompt.__table__.delete())
+
+
+def _delete_records(kind, ids):
+    if kind == DeletedRecord.KIND_CATEGORY:
+        db.session.execute(
+            Category.__table__.delete().where(Category.id.in_(ids)))
+    else:
+        db.session.execute(
+            PromptRaw.__table__.delete().where(PromptRaw.prompt_id.in_(ids)))
+        db.session.execute(
+            Prompt.__table__.delete().where(Prompt.id.in_(ids)))
+
+
+def restore_backup(filepath="backup.json", batch_size=1000, progress=None):
+    """
+    Restauration lue en flux et insérée par lots (``executemany``) dans une
+    seule transaction : en cas d'erreur ou d'interruption, la base reste dans
+    son état précédent. Une sauvegarde incrémentale est restaurée avec sa
+    chaîne (sauvegarde complète puis incrémentales, cf. ``backup_chain``).
+    Les tables dérivées (tags, fermeture des catégories, plein texte, LoRAs,
+    compteurs) sont recalculées à la fin.
+    :param progress: Callback ``progress(stats)`` appelé après chaque lot
+    :return: Dictionnaire de statistiques de la restauration
+    """
+    chain = backup_chain(filepath)
+    stats = {"backups": len(chain), "categories": 0, "prompts": 0,
+             "deleted": 0, "rate": 0.0}
+    start = time.perf_counter()
+    pending = {"deletion": [], "category": [], "prompt": []}
+    raws = []
+
+    def flush(kind, replace):
+        rows = pending.get(kind)
+        if not rows:
+            return
+        if kind == "deletion":
+            for deleted_kind in (DeletedRecord.KIND_PROMPT,
+                                 DeletedRecord.KIND_CATEGORY):
+                ids = [row["id"] for row in rows if row["kind"] == deleted_kind]
+                if ids:
+                    _delete_records(deleted_kind, ids)
+            stats["deleted"] += len(rows)
+        else:
+            # Incrémentale : la version sauvegardée remplace la ligne existante
+            if replace:
+                _delete_records(kind, [row["id"] for row in rows])
+            if kind == "category":
+                db.session.execute(insert(Category.__table__), rows)
+                stats["categories"] += len(rows)
+            else:
+                db.session.execute(insert(Prompt.__table__), rows)
+                if raws:
+                    db.session.execute(insert(PromptRaw.__table__), raws)
+                    raws.clear()
+                stats["prompts"] += len(rows)
+        rows.clear()
+        stats["rate"] = stats["prompts"] / (time.perf_counter() - start)
+        if progress:
+            progress(stats)
+
+    try:
+        # pysqlite n'ouvre la transaction qu'à la première écriture, pas
+        # pour le DDL : la fermeture (recalculée à la fin) est vidée avant de
+        # suspendre les triggers, afin qu'un rollback les rétablisse
+        db.session.execute(CategoryClosure.__table__.delete())
+        triggers = _suspend_triggers()
+
+        for path, header in chain:
+            replace = header.get("kind") == "incremental"
+            if not replace:
+                _clear_tables()
+                # Suppressions antérieures à l'état restauré
+                db.session.execute(DeletedRecord.__table__.delete())
+            current = None
+            for kind, record in iter_backup(path):
+                if kind not in pending:
+                    continue
+                # Ordre du fichier respecté (suppressions avant ajouts)
+                if kind != current:
+                    flush(current, replace)
+                    current = kind
+                if kind == "deletion":
+                    pending[kind].append(record)
+                elif kind == "category":
+                    pending[kind].append(_category_row(record))
+                else:
+                    pending[kind].append(_prompt_row(record))
+                    raw = record.get("prompt_raw")
+                    if raw:
+                        raws.append({"prompt_id": record["id"], "data": (
+                            PromptRaw.encode_text(raw) if isinstance(raw, str)
+                            else PromptRaw.encode(raw))})
+                if len(pending[kind]) >= batch_size:
+                    flush(kind, replace)
+            flush(current, replace)
+
+        CategoryService.rebuild_closure()
+        TagService.rebuild()
+        LoraService.rebuild()
+        SearchService.rebuild()
+        StatsService.rebuild()
+        _resume_triggers(triggers)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        CategoryService.invalidate_tree()
+
+    if chain[0][1].get("kind") != "incremental":
+        _set_head(filepath, chain[-1][1].get("backup_id"))
+    return stats
+
+
+def _set_head(filepath, backup_id):
+    """
+    Après une restauration, la prochaine incrémentale part de la sauvegarde
+    restaurée (aucune si elle est absente du manifeste de son dossier)
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    manifest = read_manifest(directory)
+    if not manifest["backups"]:
+        return
+    known = any(entry["id"] == backup_id for entry in manifest["backups"])
+    manifest["head"] = backup_id if known else None
+    _write_manifest(directory, manifest)
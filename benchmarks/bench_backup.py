@@ -0,0 +1,196 @@
+"""
+Benchmark de la sauvegarde (``flask backup``).
+
+Remplit une base temporaire (``seed_database`` + workflows bruts), puis
+compare l'ancien export (toute la base chargée par l'ORM puis un seul
+``json.dump``) à l'export en flux de ``backup.export_backup`` dans ses
+différents formats : durée, pic mémoire Python (``tracemalloc``) et taille
+du fichier, ainsi qu'une sauvegarde incrémentale après modification de
+1 % des prompts. Compare ensuite l'ancienne restauration (``json.load`` puis un
+objet ORM par ligne) à ``backup.restore_backup`` (lecture en flux, insertions
+par lots dans une seule transaction).
+
+Usage : python benchmarks/bench_backup.py [--prompts 5000] [--nodes 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from sqlalchemy import text  # noqa: E402
+from app import create_app  # noqa: E402
+from backup import export_backup, restore_backup  # noqa: E402
+from models import (db, Category, CategoryClosure, Prompt, PromptRaw,  # noqa: E402
+                    Tag, prompt_tags)
+from utils import CategoryService, TagService  # noqa: E402
+from query_plans import seed_database  # noqa: E402
+
+
+def legacy_export(filepath):
+    """Export historique : tout en mémoire puis ``json.dump``"""
+    data = {
+        "categories": [
+            {"id": c.id, "name": c.name, "description": c.description,
+             "parent_id": c.parent_id,
+             "created_at": c.created_at.isoformat() if c.created_at else None}
+            for c in Category.query.all()
+        ],
+        "prompts": [
+            {"id": p.id, "prompt": p.prompt, "tags": p.tags, "seed": p.seed,
+             "steps": p.steps, "checkpoint": p.checkpoint, "loras": p.loras,
+             "neg_prompt": p.neg_prompt, "category_id": p.category_id,
+             "image_filename": p.image_filename, "prompt_raw": p.prompt_raw,
+             "created_at": p.created_at.isoformat() if p.created_at else None,
+             "updated_at": p.updated_at.isoformat() if p.updated_at else None}
+            for p in Prompt.query.all()
+        ],
+    }
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def legacy_restore(filepath):
+    """Restauration historique : fichier chargé en entier, ORM ligne à ligne"""
+    with open(filepath, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    db.session.execute(prompt_tags.delete())
+    Tag.query.delete()
+    PromptRaw.query.delete()
+    Prompt.query.delete()
+    CategoryClosure.query.delete()
+    Category.query.delete()
+    db.session.commit()
+
+    for c in data.get("categories", []):
+        db.session.add(Category(
+            id=c["id"], name=c["name"], description=c["description"],
+            parent_id=c["parent_id"],
+            created_at=datetime.fromisoformat(c["created_at"])
+            if c["created_at"] else None))
+    db.session.flush()
+    CategoryService.rebuild_closure()
+    db.session.commit()
+
+    for p in data.get("prompts", []):
+        db.session.add(Prompt(
+            id=p["id"], prompt=p["prompt"], tags=p["tags"], seed=p["seed"],
+            steps=p["steps"], checkpoint=p["checkpoint"], loras=p["loras"],
+            neg_prompt=p["neg_prompt"], category_id=p["category_id"],
+            image_filename=p["image_filename"], prompt_raw=p["prompt_raw"],
+            created_at=datetime.fromisoformat(p["created_at"])
+            if p["created_at"] else None,
+            updated_at=datetime.fromisoformat(p["updated_at"])
+            if p["updated_at"] else None))
+    db.session.flush()
+    TagService.rebuild()
+    db.session.commit()
+
+
+def add_workflows(nodes):
+    """Un workflow brut synthétique de ``nodes`` nœuds par prompt"""
+    workflow = {str(i): {"class_type": "KSampler",
+                         "inputs": {"seed": i, "steps": 30, "cfg": 7.0,
+                                    "model": [str(i - 1), 0]}}
+                for i in range(nodes)}
+    data = PromptRaw.encode(workflow)
+    db.session.execute(text(
+        "INSERT INTO prompt_raws (prompt_id, data) SELECT id, :data FROM prompts"
+    ), {"data": data})
+    db.session.commit()
+
+
+def measure(func, *args):
+    """
+    Durée (s) et pic mémoire (Mo) d'un appel ; deux exécutions, le traçage
+    de ``tracemalloc`` faussant la durée.
+    """
+    db.session.expunge_all()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    db.session.expunge_all()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--prompts", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--nodes", type=int, default=50,
+                        help="nœuds par workflow brut")
+    args = parser.parse_args()
+
+    # ``create_app`` applique les migrations du dossier courant
+    os.chdir(ROOT_DIR)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + db_path,
+                          "DB_PATH": db_path, "INGEST_ASYNC": False,
+                          "SQLITE_MAINTENANCE_INTERVAL": 0})
+        with app.app_context():
+            seed_database(args.prompts, args.categories)
+            add_workflows(args.nodes)
+            # Bibliothèque existante : rien de modifié récemment
+            for table in ("prompts", "categories"):
+                db.session.execute(text(
+                    f"UPDATE {table} SET updated_at = datetime('now', '-1 day')"))
+            db.session.commit()
+            print(f"{args.prompts} prompts, workflows de {args.nodes} nœuds")
+
+            scenarios = {
+                "ancien export (json)": (legacy_export, "legacy.json"),
+                "flux json": (export_backup, "stream.json"),
+                "flux ndjson": (export_backup, "stream.ndjson"),
+                "flux ndjson.gz": (export_backup, "stream.ndjson.gz"),
+            }
+            print(f"{'export':<22} {'durée (s)':>10} {'pic (Mo)':>9} "
+                  f"{'fichier (Mo)':>13}")
+            for name, (func, filename) in scenarios.items():
+                path = os.path.join(tmp, filename)
+                elapsed, peak = measure(func, path)
+                size = os.path.getsize(path) / 1024 / 1024
+                print(f"{name:<22} {elapsed:>10.2f} {peak:>9.1f} {size:>13.1f}")
+
+            # Nuit type : 1 % des prompts modifiés depuis la dernière sauvegarde
+            db.session.execute(text(
+                "UPDATE prompts SET steps = steps + 1, updated_at = :now "
+                "WHERE id % 100 = 0"
+            ), {"now": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")})
+            db.session.commit()
+            path = os.path.join(tmp, "incremental.ndjson.gz")
+            start = time.perf_counter()
+            export_backup(path, incremental=True)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path) / 1024 / 1024
+            print(f"{'incrémentale (1 %)':<22} {elapsed:>10.2f} {'-':>9} "
+                  f"{size:>13.2f}")
+
+            scenarios = {
+                "ancienne (json)": (legacy_restore, "legacy.json"),
+                "lots (json)": (restore_backup, "stream.json"),
+                "lots (ndjson)": (restore_backup, "stream.ndjson"),
+                "lots (ndjson.gz)": (restore_backup, "stream.ndjson.gz"),
+            }
+            print(f"\n{'restauration':<22} {'durée (s)':>10} {'pic (Mo)':>9}")
+            for name, (func, filename) in scenarios.items():
+                elapsed, peak = measure(func, os.path.join(tmp, filename))
+                print(f"{name:<22} {elapsed:>10.2f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Micro-benchmark de l'extraction des métadonnées ComfyUI.
+
+Vérifie chaque workflow de ``benchmarks/fixtures`` contre son fichier
+``<workflow>.expected.json``, puis compare ``ComfyUIImage`` (un seul parcours
+du graphe guidé par le registre ``workflows``) à l'implémentation historique
+qui reparcourait tout le graphe à chaque getter. Les workflows sont complétés
+de nœuds annexes pour atteindre une taille réaliste. Enfin, mesure le débit
+d'extraction avant et après l'enregistrement de nombreux workflows factices.
+
+Usage : python benchmarks/bench_comfyui_extract.py [--nodes 500] [--runs 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+from utils import ComfyUIImage  # noqa: E402
+from workflows import FieldSpec, register_workflow  # noqa: E402
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+
+class LegacyComfyUIImage(ComfyUIImage):
+    """Getters historiques : un parcours complet du graphe par appel"""
+
+    def _index_nodes(self):
+        class_types = {node.get("class_type") for node in self.prompt.values()}
+        self.workflow_type = ("anima" if "UNETLoader" in class_types
+                              else "illustrious")
+
+    def find_node(self, class_type):
+        for node in self.prompt.values():
+            if node.get("class_type") == class_type:
+                return node
+        return None
+
+    def find_nodes(self, class_type):
+        return [node for node in self.prompt.values()
+                if node.get("class_type") == class_type]
+
+    def get_value(self, value):
+        for node in self.prompt.values():
+            if value in list(node["inputs"].keys()):
+                inputs = node.get("inputs", {})
+                if value in inputs and not isinstance(inputs[value], list):
+                    return inputs[value]
+        return None
+
+    def _get_prompt(self, key, title):
+        prompt = self.get_value(key)
+        if isinstance(prompt, str):
+            return prompt
+        for node in self.find_nodes("CLIPTextEncode"):
+            if title in node.get("_meta", {}).get("title", ""):
+                return self.get_input(node, "text")
+        return None
+
+    def get_positive_prompt(self):
+        return self._get_prompt("positive", "Positive")
+
+    def get_negative_prompt(self):
+        return self._get_prompt("negative", "Negative")
+
+    def get_seed(self):
+        seed = self.get_value("seed")
+        return seed if seed is not None else self.get_value("noise_seed")
+
+    def get_steps(self):
+        return self.get_value("steps")
+
+    def get_cfg(self):
+        return self.get_value("cfg")
+
+    def get_sampler(self):
+        return self.get_value("sampler_name")
+
+    def get_scheduler(self):
+        return self.get_value("scheduler")
+
+    def get_checkpoint(self):
+        for class_type, key in (("Eff. Loader SDXL", "base_ckpt_name"),
+                                ("UNETLoader", "unet_name")):
+            checkpoint = self.get_input(self.find_node(class_type), key)
+            if checkpoint:
+                return checkpoint.split("/")[-1].replace(".safetensors", "")
+        return None
+
+    def get_loras(self):
+        loras = {}
+        for node in self.prompt.values():
+            inputs = node.get("inputs", {})
+            for key, value in inputs.items():
+                if not key.startswith("lora_name_"):
+                    continue
+                index = key.split("_")[-1]
+                if not value or value == "None":
+                    continue
+                name = value.split("/")[-1].replace(".safetensors", "")
+                loras[name] = inputs.get(f"model_weight_{index}")
+        for node in self.find_nodes("LoraLoaderModelOnly"):
+            name = self.get_input(node, "lora_name")
+            if name:
+                name = name.split("/")[-1].replace(".safetensors", "")
+                loras[name] = self.get_input(node, "strength_model", 1.0)
+        return loras or None
+
+
+def load_fixtures():
+    """Charge les workflows de référence et leurs valeurs attendues"""
+    fixtures = {}
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        if not filename.endswith(".json") or ".expected." in filename:
+            continue
+        name = filename[:-5]
+        with open(os.path.join(FIXTURES_DIR, filename), encoding="utf-8") as f:
+            workflow = json.load(f)
+        with open(os.path.join(FIXTURES_DIR, f"{name}.expected.json"),
+                  encoding="utf-8") as f:
+            expected = json.load(f)
+        fixtures[name] = (workflow, expected)
+    return fixtures
+
+
+def pad_workflow(workflow, nodes):
+    """Ajoute des nœuds annexes (groupes, masques, upscales...) en tête"""
+    padded = {}
+    for i in range(max(nodes - len(workflow), 0)):
+        padded[str(1000 + i)] = {
+            "class_type": ("ImageScaleBy", "MaskComposite", "ImageBlend",
+                           "PrimitiveNode", "Reroute")[i % 5],
+            "inputs": {
+                "image": [str(1000 + max(i - 1, 0)), 0],
+                "upscale_method": "lanczos",
+                "scale_by": 1.5,
+                "operation": "multiply",
+                "x": i, "y": i,
+                "blend_factor": 0.5,
+                "mask": [str(1000 + max(i - 2, 0)), 1],
+            },
+            "_meta": {"title": f"Node {i}"},
+        }
+    padded.update(workflow)
+    return padded
+
+
+def check_fixture(name, workflow, expected):
+    """Vérifie l'extraction d'un workflow de référence"""
+    image = ComfyUIImage(prompt=workflow)
+    result = image.extract()._asdict()
+    result["workflow_type"] = image.workflow_type
+    for field, value in expected.items():
+        assert result[field] == value, (name, field, result[field], value)
+
+
+def per_second(cls, prompt, runs):
+    """Nombre d'extractions par seconde (meilleure de 5 mesures)"""
+    seconds = min(timeit.repeat(lambda: cls(prompt=prompt).extract(),
+                                number=runs, repeat=5))
+    return runs / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=500,
+                        help="Taille des workflows (nombre de nœuds)")
+    parser.add_argument("--runs", type=int, default=200,
+                        help="Nombre d'extractions par mesure")
+    parser.add_argument("--extra-workflows", type=int, default=100,
+                        help="Workflows factices ajoutés au registre")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    for name, (workflow, expected) in fixtures.items():
+        check_fixture(name, workflow, expected)
+    print(f"{len(fixtures)} workflow(s) de référence vérifié(s)\n")
+
+    padded = {name: pad_workflow(workflow, args.nodes)
+              for name, (workflow, _) in fixtures.items()}
+
+    print(f"{'workflow':<14}{'legacy (img/s)':>16}{'registre (img/s)':>18}"
+          f"{'gain':>8}")
+    baseline = {}
+    for name, prompt in padded.items():
+        current = per_second(ComfyUIImage, prompt, args.runs)
+        baseline[name] = current
+        if LegacyComfyUIImage(prompt=prompt).workflow_type != name:
+            print(f"{name:<14}{'-':>16}{current:>18.0f}{'-':>8}")
+            continue
+        assert (LegacyComfyUIImage(prompt=prompt).extract()
+                == ComfyUIImage(prompt=prompt).extract()), name
+        legacy = per_second(LegacyComfyUIImage, prompt, args.runs)
+        print(f"{name:<14}{legacy:>16.0f}{current:>18.0f}"
+              f"{current / legacy:>7.1f}x")
+
+    for i in range(args.extra_workflows):
+        register_workflow(f"bench_{i}", detect=[f"BenchLoader{i}"], fields={
+            "checkpoint": [FieldSpec(f"BenchLoader{i}", "ckpt_name")],
+            "prompt": [FieldSpec(f"BenchPrompt{i}", "text")],
+        })
+
+    print(f"\nAvec {args.extra_workflows} workflows supplémentaires enregistrés :")
+    for name, prompt in padded.items():
+        current = per_second(ComfyUIImage, prompt, args.runs)
+        print(f"{name:<14}{current:>16.0f} img/s "
+              f"({current / baseline[name]:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Test de charge des pages ``index``, ``view`` et ``statistiques``.
+
+Sur une base de test (données synthétiques de ``query_plans``), des
+processus clients enchaînent les requêtes sur chaque page pendant une durée
+fixe. On compare le serveur de développement (``flask run``, ancienne
+commande du conteneur) au profil de production (gunicorn.conf.py), ou l'on
+mesure un serveur déjà lancé avec ``--url``. Clients et serveur partagent
+la machine : les débits sont à comparer entre eux, pas dans l'absolu.
+
+Usage : python benchmarks/bench_load.py [--clients 8] [--seconds 10] [--server dev,gunicorn] [--url http://127.0.0.1:5000]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+# Commandes de lancement des serveurs comparés (port ajouté à la suite)
+SERVERS = {
+    "dev": [sys.executable, "-m", "flask", "--app", "wsgi", "run",
+            "--host", "127.0.0.1", "--port"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                 "wsgi:app", "--bind"],
+}
+
+
+def seed(db_folder, prompts, categories):
+    """Crée et remplit la base de test"""
+    # pylint: disable=import-outside-toplevel
+    from app import create_app
+    from models import db
+    from query_plans import seed_database
+    app = create_app({"SQLALCHEMY_DATABASE_URI":
+                      "sqlite:///" + os.path.join(db_folder, "prompts.db"),
+                      "DB_PATH": os.path.join(db_folder, "prompts.db"),
+                      "DB_FOLDER": db_folder})
+    with app.app_context():
+        seed_database(prompts, categories)
+        db.session.commit()
+        db.engine.dispose()
+
+
+def free_port():
+    """Port TCP libre sur la boucle locale"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name, port, db_folder):
+    """Lance un serveur et attend qu'il réponde sur /healthz"""
+    address = f"127.0.0.1:{port}" if name == "gunicorn" else str(port)
+    env = dict(os.environ, DB_FOLDER=db_folder, AUTO_MIGRATE="0",
+               SECRET_KEY="bench")
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        SERVERS[name] + [address], cwd=ROOT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz",
+                                   timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Le serveur {name} ne répond pas")
+
+
+def client(args):
+    """Processus client : requêtes en boucle (connexion persistante)"""
+    url, paths, seconds = args
+    parsed = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80,
+                                      timeout=30)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        path = random.choice(paths)
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies, errors
+
+
+def load(url, pages, clients, seconds):
+    """Charge chaque page ; retourne {page: (req/s, p50, p95, erreurs)}"""
+    results = {}
+    with multiprocessing.Pool(clients) as pool:
+        for page, paths in pages.items():
+            runs = pool.map(client, [(url, paths, seconds)] * clients)
+            latencies = sorted(lat for lats, _ in runs for lat in lats)
+            errors = sum(errs for _, errs in runs)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            results[page] = (len(latencies) / seconds,
+                             statistics.median(latencies), p95, errors)
+    return results
+
+
+def report(label, results):
+    """Affiche les mesures d'un serveur"""
+    for page, (rate, p50, p95, errors) in results.items():
+        print(f"{label:<10} {page:<13} {rate:>8.0f} {p50 * 1000:>8.1f} "
+              f"{p95 * 1000:>8.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--server", default="dev,gunicorn",
+                        help="Serveurs comparés (dev, gunicorn)")
+    parser.add_argument("--url", help="Serveur déjà lancé à mesurer")
+    parser.add_argument("--prompts", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=200)
+    args = parser.parse_args()
+
+    ids = random.Random(0).sample(range(1, args.prompts + 1),
+                                  min(200, args.prompts))
+    pages = {"index": ["/"],
+             "view": [f"/prompt/{i}" for i in ids],
+             "statistiques": ["/statistiques"]}
+
+    print(f"{args.clients} clients, {args.seconds:.0f} s par page\n")
+    print(f"{'serveur':<10} {'page':<13} {'req/s':>8} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'erreurs':>7}")
+    if args.url:
+        report("url", load(args.url, pages, args.clients, args.seconds))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed(tmp, args.prompts, args.categories)
+        for name in args.server.split(","):
+            port = free_port()
+            process = start_server(name, port, tmp)
+            try:
+                report(name, load(f"http://127.0.0.1:{port}", pages,
+                                  args.clients, args.seconds))
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark de la pagination de la galerie.
+
+Compare, sur une base SQLite temporaire, la pagination ``LIMIT/OFFSET`` (et
+le ``COUNT(*)`` qui l'accompagnait) à la pagination par clé (``id < :last``)
+utilisée par ``PaginationService``, pour des pages de plus en plus lointaines.
+
+Usage : python benchmarks/bench_pagination.py [--rows 60000] [--per-page 24]
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+PAGES = (1, 100, 1000, 2000)
+
+
+def build_database(path, rows):
+    """Crée une table ``prompts`` minimale avec ``rows`` lignes"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE prompts (id INTEGER PRIMARY KEY, "
+                 "prompt TEXT NOT NULL, tags VARCHAR(120), checkpoint TEXT, "
+                 "category_id INTEGER, image_filename VARCHAR(120))")
+    conn.executemany(
+        "INSERT INTO prompts (prompt, tags, checkpoint, category_id, "
+        "image_filename) VALUES (?, ?, ?, ?, ?)",
+        ((f"1girl, masterpiece, prompt {i} " * 8, "portrait,cat",
+          f"model_{i % 7}", i % 50, f"{i:08x}.png") for i in range(rows)))
+    conn.commit()
+    return conn
+
+
+def timed(conn, sql, params, repeat):
+    """Durée moyenne (ms) d'une requête"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=60000)
+    parser.add_argument("--per-page", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, "bench.db"), args.rows)
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM prompts ORDER BY id DESC")]
+
+        count_ms = timed(conn, "SELECT count(*) FROM prompts", (), args.repeat)
+        print(f"{args.rows} prompts, {args.per_page} par page "
+              f"(COUNT(*) : {count_ms:.2f} ms par page avec paginate())")
+        print(f"{'page':>6} {'OFFSET (ms)':>12} {'curseur (ms)':>13}")
+        for page in PAGES:
+            offset = (page - 1) * args.per_page
+            if offset >= len(ids):
+                break
+            offset_ms = timed(
+                conn, "SELECT * FROM prompts ORDER BY id DESC "
+                      "LIMIT ? OFFSET ?",
+                (args.per_page + 1, offset), args.repeat)
+            # Dernier id de la page précédente, tel que porté par le curseur
+            last_id = ids[offset - 1] if offset else ids[0] + 1
+            keyset_ms = timed(
+                conn, "SELECT * FROM prompts WHERE id < ? ORDER BY id DESC "
+                      "LIMIT ?",
+                (last_id, args.per_page + 1), args.repeat)
+            print(f"{page:>6} {offset_ms:>12.2f} {keyset_ms:>13.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark du stockage des workflows bruts (``prompt_raw``).
+
+Construit deux bases SQLite temporaires avec les mêmes prompts : l'ancien
+schéma (workflow JSON dans la ligne de ``prompts``) et le schéma actuel
+(workflow compressé zlib dans ``prompt_raws``), puis compare leur taille et
+la latence des requêtes de liste et de statistiques.
+
+Usage : python benchmarks/bench_prompt_raw_storage.py [--rows 1000] [--nodes 300]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+# pylint: disable=wrong-import-position
+from bench_comfyui_extract import load_fixtures, pad_workflow  # noqa: E402
+
+PROMPTS_COLUMNS = """
+    id INTEGER PRIMARY KEY, prompt TEXT NOT NULL, tags VARCHAR(120),
+    seed INTEGER, steps INTEGER, checkpoint TEXT, cfg FLOAT, loras JSON,
+    neg_prompt TEXT, {raw}sampler VARCHAR(120), scheduler VARCHAR(120),
+    category_id INTEGER, image_filename VARCHAR(120), created_at DATETIME,
+    updated_at DATETIME
+"""
+
+QUERIES = {
+    # Page de la galerie (l'ORM charge toutes les colonnes de prompts)
+    "page galerie": "SELECT * FROM prompts ORDER BY id DESC LIMIT 24 OFFSET 240",
+    # Agrégation des statistiques (parcours de toute la table)
+    "stats checkpoints": "SELECT checkpoint, count(*) FROM prompts "
+                         "GROUP BY checkpoint",
+    "stats samplers": "SELECT sampler, scheduler, count(*) FROM prompts "
+                      "GROUP BY sampler, scheduler",
+}
+
+
+def build_database(path, rows, legacy):
+    """Crée et remplit une base avec l'ancien ou le nouveau schéma"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE prompts (" + PROMPTS_COLUMNS.format(
+        raw="prompt_raw JSON, " if legacy else "") + ")")
+    if not legacy:
+        conn.execute("CREATE TABLE prompt_raws (prompt_id INTEGER PRIMARY KEY,"
+                     " data BLOB NOT NULL)")
+
+    columns = ("prompt, tags, seed, steps, checkpoint, cfg, loras, neg_prompt, "
+               "sampler, scheduler, category_id, image_filename, created_at")
+    for i, (workflow, fields) in enumerate(rows, start=1):
+        values = (fields["prompt"], "tag", fields["seed"], fields["steps"],
+                  fields["checkpoint"], fields["cfg"],
+                  json.dumps(fields["loras"]), fields["neg_prompt"],
+                  fields["sampler"], fields["scheduler"], None,
+                  f"{i:032x}.png", "2026-01-01 00:00:00")
+        raw = json.dumps(workflow)
+        if legacy:
+            conn.execute(f"INSERT INTO prompts (id, {columns}, prompt_raw) "
+                         f"VALUES ({i}, {', '.join('?' * 13)}, ?)",
+                         values + (raw,))
+        else:
+            conn.execute(f"INSERT INTO prompts (id, {columns}) "
+                         f"VALUES ({i}, {', '.join('?' * 13)})", values)
+            conn.execute("INSERT INTO prompt_raws VALUES (?, ?)",
+                         (i, zlib.compress(raw.encode("utf-8"))))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def time_query(path, sql, runs=20):
+    """Latence moyenne d'une requête (nouvelle connexion, cache froid)"""
+    total = 0.0
+    for _ in range(runs):
+        conn = sqlite3.connect(path)
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        total += time.perf_counter() - start
+        conn.close()
+    return total / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000,
+                        help="Nombre de prompts")
+    parser.add_argument("--nodes", type=int, default=300,
+                        help="Taille des workflows (nombre de nœuds)")
+    args = parser.parse_args()
+
+    fixtures = list(load_fixtures().values())
+    rows = []
+    for i in range(args.rows):
+        workflow, expected = fixtures[i % len(fixtures)]
+        rows.append((pad_workflow(workflow, args.nodes), expected))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        for name, legacy in (("inline", True), ("prompt_raws", False)):
+            paths[name] = os.path.join(tmp, f"{name}.db")
+            build_database(paths[name], rows, legacy)
+
+        sizes = {name: os.path.getsize(path) / 1024 / 1024
+                 for name, path in paths.items()}
+        print(f"{'':<24}{'inline':>12}{'prompt_raws':>14}")
+        print(f"{'taille (Mo)':<24}{sizes['inline']:>12.1f}"
+              f"{sizes['prompt_raws']:>14.1f}")
+        for label, sql in QUERIES.items():
+            inline = time_query(paths["inline"], sql)
+            split = time_query(paths["prompt_raws"], sql)
+            print(f"{label + ' (ms)':<24}{inline:>12.2f}{split:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
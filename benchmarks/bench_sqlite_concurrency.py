@@ -0,0 +1,131 @@
+"""
+Benchmark de la concurrence lectures / écritures SQLite.
+
+Des threads lecteurs enchaînent les requêtes de la galerie pendant qu'un
+écrivain insère des prompts (une transaction par ajout, comme ``/add``). On
+compare le réglage par défaut de SQLite (journal ``DELETE``) aux pragmas de
+``Config`` appliqués par ``sqlite_pragmas`` (WAL, ``synchronous=NORMAL``...).
+
+Usage : python benchmarks/bench_sqlite_concurrency.py [--readers 4] [--seconds 5]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+from config import Config  # noqa: E402
+from sqlite_pragmas import CONNECT_PRAGMAS, apply_pragmas, connect_pragmas  # noqa: E402
+
+GALLERY_SQL = ("SELECT * FROM prompts WHERE id < ? ORDER BY id DESC LIMIT 25")
+INSERT_SQL = ("INSERT INTO prompts (prompt, tags, checkpoint, category_id, "
+              "image_filename) VALUES (?, ?, ?, ?, ?)")
+
+
+def build_database(path, rows, pragmas):
+    """Crée la table ``prompts`` et l'index utilisé par la galerie"""
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, pragmas)
+    conn.execute("CREATE TABLE prompts (id INTEGER PRIMARY KEY, "
+                 "prompt TEXT NOT NULL, tags VARCHAR(120), checkpoint TEXT, "
+                 "category_id INTEGER, image_filename VARCHAR(120))")
+    conn.execute("CREATE INDEX ix_prompts_category_id_id "
+                 "ON prompts (category_id, id)")
+    conn.executemany(INSERT_SQL, (
+        (f"1girl, masterpiece, prompt {i} " * 8, "portrait,cat",
+         f"model_{i % 7}", i % 50, f"{i:08x}.png") for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def run(path, pragmas, readers, seconds):
+    """Lance lecteurs et écrivain ; retourne les compteurs"""
+    stop = threading.Event()
+    stats = {"reads": 0, "writes": 0, "errors": 0, "max_read_ms": 0.0}
+    lock = threading.Lock()
+
+    def connect():
+        # timeout=5 : attente par défaut de pysqlite, comme via SQLAlchemy
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        apply_pragmas(conn, pragmas)
+        return conn
+
+    def reader():
+        conn = connect()
+        count, worst = 0, 0.0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                conn.execute(GALLERY_SQL, (10 ** 9,)).fetchall()
+                count += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    stats["errors"] += 1
+            worst = max(worst, time.perf_counter() - start)
+        conn.close()
+        with lock:
+            stats["reads"] += count
+            stats["max_read_ms"] = max(stats["max_read_ms"], worst * 1000)
+
+    def writer():
+        conn = connect()
+        i = 0
+        while not stop.is_set():
+            try:
+                conn.execute(INSERT_SQL, ("new prompt", "tag", "model", i % 50,
+                                          f"new_{i}.png"))
+                conn.commit()
+                i += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                with lock:
+                    stats["errors"] += 1
+        conn.close()
+        with lock:
+            stats["writes"] += i
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    tuned = connect_pragmas({key: getattr(Config, key)
+                             for key, _ in CONNECT_PRAGMAS})
+    scenarios = {"défaut": [], "Config": tuned}
+
+    print(f"{args.readers} lecteur(s) + 1 écrivain pendant {args.seconds} s, "
+          f"{args.rows} prompts")
+    print(f"{'réglage':<8} {'lectures/s':>11} {'écritures/s':>12} "
+          f"{'lecture max (ms)':>17} {'erreurs':>8}")
+    for name, pragmas in scenarios.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            build_database(path, args.rows, pragmas)
+            stats = run(path, pragmas, args.readers, args.seconds)
+        print(f"{name:<8} {stats['reads'] / args.seconds:>11.0f} "
+              f"{stats['writes'] / args.seconds:>12.0f} "
+              f"{stats['max_read_ms']:>17.1f} {stats['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Temps de démarrage à froid de l'application (processus neuf à chaque essai).
+
+On mesure l'interpréteur seul, l'import des dépendances incompressibles
+(Flask, Flask-SQLAlchemy), puis ``create_app()`` tel qu'un worker gunicorn
+(``wsgi.py``, sans migration) et tel qu'une commande ``flask`` sur une base
+déjà à jour (simple lecture de la révision). Une passe ``python -X
+importtime`` liste ensuite les paquets les plus coûteux et vérifie que
+Pillow, Alembic et multiprocessing ne sont pas chargés au démarrage.
+
+Usage : python benchmarks/bench_startup.py [--runs 7] [--top 12] [--target 200]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+# Modules qui ne doivent être chargés qu'à la demande
+LAZY_MODULES = ("PIL", "alembic", "flask_migrate", "multiprocessing")
+
+SCENARIOS = {
+    "python": "pass",
+    "dépendances": "import flask, flask_sqlalchemy",
+    "worker": "from app import create_app; "
+              "create_app({'AUTO_MIGRATE': False})",
+    "base à jour": "from app import create_app; create_app()",
+}
+
+LOADED = ("import sys; print(','.join(m for m in {modules!r} "
+          "if m in sys.modules))")
+
+
+def run(code, env, *options):
+    """Exécute ``code`` dans un interpréteur neuf ; retourne (durée, résultat)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *options, "-c", code],
+                            cwd=ROOT_DIR, env=env, check=True,
+                            capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+
+def import_times(stderr, top):
+    """Temps d'import propre cumulé par paquet de premier niveau"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line.split(":", 1)[1].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+    return sorted(((ms, name) for name, ms in packages.items()),
+                  reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=12,
+                        help="Paquets listés par la passe -X importtime")
+    parser.add_argument("--target", type=float, default=200,
+                        help="Objectif du démarrage worker en ms")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DB_FOLDER=tmp, SECRET_KEY="bench")
+        # Base migrée une fois, et bytecode à jour : seul le démarrage compte
+        run(SCENARIOS["base à jour"], env)
+
+        # Scénarios alternés à chaque tour pour lisser la charge de la machine
+        samples = {label: [] for label in SCENARIOS}
+        for _ in range(args.runs):
+            for label, code in SCENARIOS.items():
+                samples[label].append(run(code, env)[0] * 1000)
+        timings = {label: statistics.median(values)
+                   for label, values in samples.items()}
+
+        _, result = run(SCENARIOS["worker"] + "; "
+                        + LOADED.format(modules=LAZY_MODULES),
+                        env, "-X", "importtime")
+
+    print(f"médiane de {args.runs} démarrages\n")
+    print(f"{'scénario':<14} {'ms':>8}")
+    for label, spent in timings.items():
+        print(f"{label:<14} {spent:>8.0f}")
+
+    print("\nimports les plus coûteux par paquet (worker, -X importtime)\n")
+    for spent, name in import_times(result.stderr, args.top):
+        print(f"{name:<24} {spent:>8.1f} ms")
+    loaded = result.stdout.strip()
+    print(f"\nchargés au démarrage parmi {', '.join(LAZY_MODULES)} : "
+          f"{loaded or 'aucun'}")
+
+    overhead = timings["worker"] - timings["dépendances"]
+    verdict = "atteint" if timings["worker"] <= args.target else "manqué"
+    print(f"\nworker : {timings['worker']:.0f} ms dont {overhead:.0f} ms "
+          f"propres à l'application ; objectif {args.target:.0f} ms {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark des uploads concurrents de grandes images sur ``/add``.
+
+Un serveur WSGI multi-thread (Werkzeug) reçoit des PNG ComfyUI de plusieurs
+Mo envoyés en parallèle. On compare la réception historique (fichier
+temporaire de Werkzeug, copie dans le dossier d'upload puis relecture pour
+le hachage et l'extraction des métadonnées) à la réception en flux de
+``storage.UploadRequest`` (hachage, limite de taille et lecture des chunks
+PNG pendant l'arrivée des octets, sans relecture).
+
+Usage : python benchmarks/bench_upload.py [--uploads 24] [--clients 4] [--size 2048]
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, PngImagePlugin
+from werkzeug.serving import make_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+from flask import Request  # noqa: E402
+from app import create_app  # noqa: E402
+from ingest import ingest_queue  # noqa: E402
+from models import IngestJob  # noqa: E402
+
+
+def make_images(count, size):
+    """PNG à pixels aléatoires (incompressibles) portant un workflow"""
+    with open(os.path.join(BENCH_DIR, "fixtures", "illustrious.json"),
+              encoding="utf-8") as f:
+        workflow = json.load(f)
+    images = []
+    for _ in range(count):
+        info = PngImagePlugin.PngInfo()
+        info.add_text("prompt", json.dumps(workflow))
+        img = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG", pnginfo=info, compress_level=1)
+        images.append(buffer.getvalue())
+    return images
+
+
+def multipart(image):
+    """Corps multipart du formulaire d'ajout"""
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"tags\""
+            f"\r\n\r\nbench\r\n--{boundary}\r\nContent-Disposition: "
+            "form-data; name=\"image\"; filename=\"image.png\"\r\n"
+            "Content-Type: image/png\r\n\r\n").encode() + image + (
+            f"\r\n--{boundary}--\r\n").encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def disk_writes():
+    """Octets écrits vers le stockage par le processus (Linux uniquement)"""
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def run(images, clients, streaming):
+    """Envoie toutes les images ; retourne les mesures"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "b.db"),
+            "DB_PATH": os.path.join(tmp, "b.db"),
+            "UPLOAD_FOLDER": os.path.join(tmp, "uploads"),
+            "THUMB_FOLDER": os.path.join(tmp, "thumbs"),
+            "INGEST_ASYNC": True,
+        })
+        if not streaming:
+            app.request_class = Request
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def upload(image):
+            body, content_type = multipart(image)
+            conn = http.client.HTTPConnection("127.0.0.1", server.port)
+            start = time.perf_counter()
+            conn.request("POST", "/add", body, {
+                "Content-Type": content_type, "Accept": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            assert response.status == 202, response.status
+            return time.perf_counter() - start
+
+        writes = disk_writes()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            latencies = list(pool.map(upload, images))
+        elapsed = time.perf_counter() - start
+        # Fin des traitements d'arrière-plan (extraction, miniatures)
+        if ingest_queue.executor is not None:
+            ingest_queue.executor.shutdown(wait=True)
+            ingest_queue.executor = None
+        total = time.perf_counter() - start
+        writes = disk_writes() - writes if writes is not None else None
+
+        server.shutdown()
+        with app.app_context():
+            done = IngestJob.query.filter_by(
+                status=IngestJob.STATUS_DONE).count()
+        assert done == len(images), done
+    return {"elapsed": elapsed, "total": total, "latencies": latencies,
+            "writes": writes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--uploads", type=int, default=24)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--size", type=int, default=2048,
+                        help="Côté des images en pixels")
+    args = parser.parse_args()
+
+    images = make_images(args.uploads, args.size)
+    megabytes = sum(len(image) for image in images) / 1e6
+    print(f"{args.uploads} images de {megabytes / args.uploads:.1f} Mo, "
+          f"{args.clients} clients simultanés\n")
+    print(f"{'réception':<12} {'uploads/s':>10} {'Mo/s':>8} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'total s':>8} {'écrit Mo':>9}")
+    for label, streaming in (("historique", False), ("en flux", True)):
+        result = run(images, args.clients, streaming)
+        latencies = sorted(result["latencies"])
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        writes = ("-" if result["writes"] is None
+                  else f"{result['writes'] / 1e6:.0f}")
+        print(f"{label:<12} {args.uploads / result['elapsed']:>10.1f} "
+              f"{megabytes / result['elapsed']:>8.1f} "
+              f"{statistics.median(latencies) * 1000:>8.0f} "
+              f"{p95 * 1000:>8.0f} {result['total']:>8.2f} {writes:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Commandes CLI de l'application (``flask <commande>``)"""
+
+import os
+import tempfile
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from ingest import import_directory
+from models import db, Prompt
+from sqlite_pragmas import run_maintenance
+from thumbnails import build_thumbnails
+from utils import LoraService, StatsService, clean_tags, taille_lisible
+
+
+@click.command("backup")
+@click.option("--output", default="backup.json",
+              help="Fichier de sortie (.ndjson : une ligne par "
+                   "enregistrement, .gz / .zst : compressé)")
+@click.option("--format", "fmt", type=click.Choice(["json", "ndjson"]),
+              default=None, help="Format (déduit du nom du fichier par défaut)")
+@click.option("--batch-size", default=500, show_default=True,
+              help="Lignes lues par lot")
+@click.option("--incremental", is_flag=True,
+              help="Seulement les changements depuis la dernière sauvegarde "
+                   "du manifeste")
+@click.option("--since", type=click.DateTime(), default=None,
+              help="Seulement les changements depuis cette date (UTC)")
+@with_appcontext
+def backup_command(output, fmt, batch_size, incremental, since):
+    """Export de la base (complet ou incrémental), écrit au fil de la lecture."""
+    from backup import export_backup  # pylint: disable=import-outside-toplevel
+    try:
+        counts = export_backup(output, fmt=fmt, batch_size=batch_size,
+                               incremental=incremental, since=since)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    deleted = (f", {counts['deleted']} suppression(s)"
+               if "deleted" in counts else "")
+    click.echo(f"Backup créé : {output} ({counts['categories']} catégories, "
+               f"{counts['prompts']} prompts{deleted})")
+
+
+@click.command("restore")
+@click.option("--input", default="backup.json", help="Fichier à restaurer")
+@click.option("--batch-size", default=1000, show_default=True,
+              help="Lignes insérées par lot")
+@with_appcontext
+def restore_command(input, batch_size):  # pylint: disable=redefined-builtin
+    """Restauration depuis une sauvegarde (et sa chaîne si incrémentale)."""
+    from backup import restore_backup  # pylint: disable=import-outside-toplevel
+
+    def progress(stats):
+        click.echo(f"{stats['categories']} catégorie(s) • "
+                   f"{stats['prompts']} prompt(s) • "
+                   f"{stats['deleted']} suppression(s) • "
+                   f"{stats['rate']:.0f} prompts/s")
+
+    try:
+        stats = restore_backup(input, batch_size=batch_size,
+                               progress=progress)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    click.echo(f"Base restaurée depuis : {input} ({stats['backups']} "
+               f"sauvegarde(s), {stats['categories']} catégories, "
+               f"{stats['prompts']} prompts)")
+
+
+@click.command("backup-compact")
+@click.option("--input", required=True,
+              help="Dernière sauvegarde de la chaîne à fusionner")
+@click.option("--output", required=True,
+              help="Nouvelle sauvegarde complète")
+@with_appcontext
+def backup_compact_command(input, output):  # pylint: disable=redefined-builtin
+    """Fusionne une chaîne de sauvegardes incrémentales en une complète."""
+    from backup import compact_backups  # pylint: disable=import-outside-toplevel
+    try:
+        counts = compact_backups(input, output)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    click.echo(f"Sauvegarde complète créée : {output} "
+               f"({counts['categories']} catégories, "
+               f"{counts['prompts']} prompts)")
+
+
+@click.command("thumbnails")
+@click.option("--force", is_flag=True, help="Régénère les miniatures existantes")
+@with_appcontext
+def thumbnails_command(force):
+    """Génère les miniatures manquantes des images uploadées."""
+    config = current_app.config
+    filenames = [
+        filename for (filename,) in
+        Prompt.query.with_entities(Prompt.image_filename)
+        .filter(Prompt.image_filename.isnot(None))
+    ]
+
+    start = time.perf_counter()
+    created = errors = 0
+    for index, filename in enumerate(filenames, start=1):
+        if not os.path.isfile(os.path.join(config['UPLOAD_FOLDER'], filename)):
+            continue
+        try:
+            created += len(build_thumbnails(config, filename, force=force))
+        except OSError as exc:
+            errors += 1
+            click.echo(f"⚠️  {filename} : {exc}", err=True)
+        if index % 100 == 0:
+            rate = index / (time.perf_counter() - start)
+            click.echo(f"{index}/{len(filenames)} images ({rate:.1f} img/s)")
+
+    click.echo(f"{created} miniature(s) créée(s), {errors} erreur(s)")
+
+
+@click.command("import-dir")
+@click.argument("directory",
+                type=click.Path(exists=True, file_okay=False))
+@click.option("--tags", default="", help="Tags à appliquer (séparés par virgules)")
+@click.option("--category", "category_id", type=int, default=None,
+              help="Id de la catégorie des prompts importés")
+@click.option("--batch-size", default=500, show_default=True,
+              help="Nombre de prompts insérés par transaction")
+@click.option("--workers", type=int, default=None,
+              help="Nombre de processus d'analyse (défaut : nb de CPU)")
+@click.option("--thumbnails/--no-thumbnails", default=True,
+              help="Génère les miniatures pendant l'import")
+@with_appcontext
+def import_dir_command(directory, tags, category_id, batch_size, workers,
+                       thumbnails):
+    """Importe en masse un dossier d'images ComfyUI (reprenable)."""
+
+    def progress(stats):
+        click.echo(f"{stats['processed']}/{stats['found']} fichiers • "
+                   f"{stats['imported']} importé(s) • "
+                   f"{stats['duplicates']} doublon(s) • "
+                   f"{stats['errors']} erreur(s) • "
+                   f"{stats['rate']:.0f} img/s")
+
+    stats = import_directory(directory,
+                             tags=clean_tags(tags) if tags else None,
+                             category_id=category_id,
+                             batch_size=batch_size,
+                             workers=workers,
+                             thumbnails=thumbnails,
+                             progress=progress)
+    click.echo(f"Import terminé : {stats['imported']} prompt(s) ajouté(s)")
+    if stats['thumbnail_errors']:
+        click.echo(f"⚠️  {stats['thumbnail_errors']} miniature(s) impossible(s) "
+                   "à générer (cf. flask thumbnails)", err=True)
+
+
+@click.command("dedupe-uploads")
+@click.option("--batch-size", default=200, show_default=True,
+              help="Fichiers convertis par transaction")
+@click.option("--workers", type=int, default=None,
+              help="Nombre de threads de hachage")
+@with_appcontext
+def dedupe_uploads_command(batch_size, workers):
+    """Range les anciens uploads par empreinte et fusionne les doublons."""
+    from storage import migrate_uploads  # pylint: disable=import-outside-toplevel
+
+    def progress(stats):
+        click.echo(f"{stats['processed']}/{stats['found']} fichiers • "
+                   f"{stats['duplicates']} doublon(s) • "
+                   f"{stats['prompts']} prompt(s) repointé(s)")
+
+    stats = migrate_uploads(current_app.config, batch_size=batch_size,
+                            workers=workers, progress=progress)
+    click.echo(f"{stats['blobs']} blob(s) créé(s), {stats['duplicates']} "
+               f"doublon(s) supprimé(s) ({taille_lisible(stats['bytes_freed'])} "
+               "libérés)")
+
+
+@click.command("check-plans")
+@click.option("--current", is_flag=True,
+              help="Analyse la base configurée au lieu d'une base de test")
+@click.option("--prompts", default=5000, show_default=True,
+              help="Nombre de prompts de la base de test")
+@click.option("--categories", default=200, show_default=True,
+              help="Nombre de catégories de la base de test")
+@click.option("--verbose", "-v", is_flag=True,
+              help="Affiche les requêtes et plans en cause")
+@with_appcontext
+def check_plans_command(current, prompts, categories, verbose):
+    """Vérifie qu'aucune requête des routes ne parcourt une table entière."""
+    # pylint: disable=import-outside-toplevel
+    from app import create_app
+    from query_plans import check_plans, seed_database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if current:
+            app = current_app._get_current_object()  # pylint: disable=protected-access
+        else:
+            db_path = os.path.join(tmp, "plans.db")
+            app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + db_path,
+                              "DB_PATH": db_path,
+                              "INGEST_ASYNC": False})
+            with app.app_context():
+                seed_database(prompts, categories)
+            click.echo(f"Base de test : {prompts} prompts, "
+                       f"{categories} catégories")
+
+        reports = check_plans(app)
+
+    failures = 0
+    for report in reports:
+        ok = report.status == 200 and not report.scans
+        failures += not ok
+        click.echo(f"{'✅' if ok else '❌'} {report.route} "
+                   f"({report.queries} requête(s), HTTP {report.status})")
+        for table, statement, plan in report.scans:
+            click.echo(f"   parcours complet de « {table} »")
+            if verbose:
+                click.echo("   " + " ".join(statement.split()))
+                for detail in plan:
+                    click.echo(f"     {detail}")
+
+    if failures:
+        raise click.ClickException(f"{failures} route(s) en échec")
+    click.echo("Aucun parcours complet de table.")
+
+
+@click.command("optimize-db")
+@with_appcontext
+def optimize_db_command():
+    """PRAGMA optimize et checkpoint complet du journal WAL."""
+    busy, wal_pages, copied = run_maintenance(checkpoint="TRUNCATE")
+    click.echo(f"Statistiques mises à jour, WAL : {copied}/{wal_pages} "
+               f"page(s) recopiée(s){' (base occupée)' if busy else ''}")
+
+
+@click.command("rebuild-stats")
+@with_appcontext
+def rebuild_stats_command():
+    """Recalcule les compteurs des statistiques et l'index des LoRAs."""
+    start = time.perf_counter()
+    LoraService.rebuild()
+    StatsService.rebuild()
+    usage = StatsService.rebuild_storage(current_app.config['UPLOAD_FOLDER'])
+    db.session.commit()
+    click.echo(f"Compteurs recalculés en {time.perf_counter() - start:.2f} s "
+               f"({usage['files']} fichier(s) uploadé(s))")
+
+
+def register_commands(app):
+    """
+    Enregistrement des commandes CLI
+    """
+    app.cli.add_command(backup_command)
+    app.cli.add_command(restore_command)
+    app.cli.add_command(backup_compact_command)
+    app.cli.add_command(thumbnails_command)
+    app.cli.add_command(import_dir_command)
+    app.cli.add_command(dedupe_uploads_command)
+    app.cli.add_command(check_plans_command)
+    app.cli.add_command(optimize_db_command)
+    app.cli.add_command(rebuild_stats_command)
@@ -5,7 +5,8 @@ import os
 # Definition des repertoires de travail
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
-DB_FOLDER = os.path.join(BASE_DIR, 'database')
+THUMB_FOLDER = os.path.join(BASE_DIR, 'static', 'thumbs')
+DB_FOLDER = os.environ.get("DB_FOLDER", os.path.join(BASE_DIR, 'database'))
 
 # Extensions de fichiers autorisées pour les images
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -20,6 +21,51 @@ class Config:  # pylint: disable=too-few-public-methods
                                                           'prompts.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = UPLOAD_FOLDER
+    THUMB_FOLDER = THUMB_FOLDER
     DB_FOLDER = DB_FOLDER
     DB_PATH = os.path.join(DB_FOLDER,'prompts.db')
     IMG_PER_PAGE = int(os.environ.get("IMG_PER_PAGE", 24))
+
+    # Migrations appliquées à chaque création de l'application (développement,
+    # commandes CLI) ; 0 quand un serveur multi-workers s'en charge au démarrage
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "1") == "1"
+
+    # Miniatures de la galerie (côtés en pixels, format webp ou jpeg)
+    THUMBNAIL_SIZES = tuple(
+        int(size) for size in
+        os.environ.get("THUMBNAIL_SIZES", "256,384,512").split(","))
+    THUMBNAIL_FORMAT = os.environ.get("THUMBNAIL_FORMAT", "webp")
+    THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", 80))
+
+    # Taille maximale d'une requête, donc d'une image envoyée (Mo)
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_UPLOAD_MB", 64)) * 1024 * 1024
+
+    # Envoi des images délégué au serveur frontal : en-tête X-Sendfile
+    # (Apache, lighttpd) ou X-Accel-Redirect vers une location « internal »
+    # nginx servant UPLOAD_FOLDER (ex. « /_uploads »)
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "0") == "1"
+    MEDIA_X_ACCEL_PREFIX = os.environ.get("MEDIA_X_ACCEL_PREFIX", "")
+
+    # Traitement des uploads en arrière-plan (nombre de threads du pool)
+    INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+    INGEST_ASYNC = os.environ.get("INGEST_ASYNC", "1") == "1"
+
+    # Durée de vie (secondes) de l'arbre des catégories mis en cache
+    CATEGORY_TREE_TTL = int(os.environ.get("CATEGORY_TREE_TTL", 60))
+
+    # Durée de vie (secondes) des totaux approximatifs de la galerie
+    PROMPT_COUNT_TTL = int(os.environ.get("PROMPT_COUNT_TTL", 30))
+
+    # Réglages SQLite appliqués à chaque connexion (voir sqlite_pragmas.py).
+    # WAL : les lectures de la galerie ne sont plus bloquées par les écritures.
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    # Attente maximale (ms) d'un verrou avant « database is locked »
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+    # Cache de pages par connexion (négatif : en Kio)
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -20000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_TEMP_STORE = os.environ.get("SQLITE_TEMP_STORE", "MEMORY")
+    # Intervalle (s) entre deux PRAGMA optimize / wal_checkpoint (0 : jamais)
+    SQLITE_MAINTENANCE_INTERVAL = int(
+        os.environ.get("SQLITE_MAINTENANCE_INTERVAL", 3600))
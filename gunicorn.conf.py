@@ -0,0 +1,90 @@
+"""
+Profil de production : gunicorn, plusieurs processus de plusieurs threads.
+
+Usage : gunicorn -c gunicorn.conf.py wsgi:app
+
+Réglages par variables d'environnement :
+- ``PORT`` (5000), ``GUNICORN_WORKERS`` (2 × CPU + 1, 8 au plus),
+  ``GUNICORN_THREADS`` (4), ``GUNICORN_TIMEOUT`` (60 s) ;
+- ``AUTO_MIGRATE=0`` : migrations lancées à part (``flask db upgrade``)
+  au lieu d'être appliquées au démarrage.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Threads : les requêtes attendent surtout SQLite et le disque (GIL relâché) ;
+# processus : rendu des templates et décodage des images en parallèle
+worker_class = "gthread"
+workers = int(os.environ.get(
+    "GUNICORN_WORKERS", min(2 * multiprocessing.cpu_count() + 1, 8)))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recyclage périodique des workers (fragmentation mémoire de Pillow)
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = "-"
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+# Application du processus maître, créée à la première utilisation
+_APP = None
+
+
+def _master_app():
+    """Application du processus maître (migrations, jobs interrompus)"""
+    # pylint: disable=import-outside-toplevel,global-statement
+    global _APP
+    if _APP is None:
+        from app import create_app
+        _APP = create_app({"AUTO_MIGRATE": False})
+    return _APP
+
+
+def _recover_jobs(server, pid=None):
+    """Termine en erreur les jobs d'ingestion orphelins (cf. IngestQueue)"""
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy.exc import SQLAlchemyError
+    from ingest import ingest_queue
+    from models import db
+    app = _master_app()
+    with app.app_context():
+        try:
+            count = ingest_queue.recover(app.config, pid)
+        except SQLAlchemyError as exc:
+            db.session.rollback()
+            server.log.warning("Jobs d'ingestion non vérifiés : %s", exc)
+            count = 0
+        # Aucune connexion SQLite ne doit être héritée par les workers
+        db.engine.dispose()
+    if count:
+        server.log.warning("%d job(s) d'ingestion interrompu(s)", count)
+
+
+def on_starting(server):
+    """
+    Une seule fois, dans le processus maître, avant le lancement des
+    workers : applique les migrations (sauf ``AUTO_MIGRATE=0``, cf.
+    wsgi.py) puis termine les jobs laissés en cours par l'arrêt précédent.
+    """
+    if os.environ.get("AUTO_MIGRATE", "1") == "1":
+        # pylint: disable=import-outside-toplevel
+        from schema import upgrade_database
+        server.log.info("Application des migrations")
+        upgrade_database(_master_app())
+    _recover_jobs(server)
+
+
+def child_exit(server, worker):
+    """
+    Worker arrêté (recyclage ``max_requests``, timeout, plantage) : ses
+    jobs d'ingestion en mémoire sont perdus.
+    """
+    _recover_jobs(server, worker.pid)
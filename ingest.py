@@ -0,0 +1,331 @@
+"""Traitement en arrière-plan des images uploadées"""
+
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+from flask import current_app
+from sqlalchemy import func, select
+from models import db, Prompt, IngestJob
+from storage import (blob_hash, blob_refcount, lock_storage, release_blob,
+                     store_file)
+from thumbnails import build_thumbnails
+from utils import (ComfyUIImage, StatsService, TagService, allowed_file,
+                   file_sha256)
+
+# Clés de configuration nécessaires à la génération des miniatures
+THUMBNAIL_CONFIG_KEYS = ('UPLOAD_FOLDER', 'THUMB_FOLDER', 'THUMBNAIL_SIZES',
+                         'THUMBNAIL_FORMAT', 'THUMBNAIL_QUALITY')
+
+
+def create_prompt_from_image(image_path, filename, tags=None,
+                             category_id=None, workflow=None):
+    """
+    Crée (sans commit) un prompt à partir des métadonnées ComfyUI d'une image.
+    :param image_path: Chemin de l'image sur le disque
+    :param filename: Nom de l'image dans le dossier d'upload
+    :param tags: Tags nettoyés (cf. ``clean_tags``)
+    :param category_id: Catégorie du prompt
+    :param workflow: Workflow déjà lu pendant l'upload (évite de relire
+                     l'image)
+    :return: Le prompt ajouté à la session
+    """
+    image = ComfyUIImage(image_path, prompt=workflow)
+    prompt = Prompt(**image.get_metadata(),
+                    tags=tags,
+                    image_filename=filename,
+                    image_hash=blob_hash(filename) or file_sha256(image_path),
+                    category_id=category_id)
+    TagService.sync_prompt_tags(prompt)
+    db.session.add(prompt)
+    return prompt
+
+
+class IngestQueue:
+    """
+    File des images à traiter, exécutée par un pool de threads borné
+    (``INGEST_WORKERS``). L'état de chaque job est persisté dans
+    ``ingest_jobs`` afin d'être consultable depuis n'importe quel worker.
+    """
+
+    def __init__(self, app=None):
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Rattache la file à l'application"""
+        app.extensions['ingest_queue'] = self
+
+    def _get_executor(self, app):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=app.config['INGEST_WORKERS'],
+                thread_name_prefix="ingest")
+        return self.executor
+
+    def submit(self, filename, tags=None, category_id=None, workflow=None):
+        """
+        Enregistre un job pour une image déjà présente dans le dossier
+        d'upload et lance son traitement.
+        :param workflow: Workflow ComfyUI déjà extrait pendant l'upload
+        :return: Le job créé
+        """
+        job = IngestJob(id=uuid.uuid4().hex,
+                        status=IngestJob.STATUS_PENDING,
+                        image_filename=filename,
+                        tags=tags,
+                        category_id=category_id,
+                        worker_pid=os.getpid())
+        db.session.add(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()  # pylint: disable=protected-access
+        if app.config['INGEST_ASYNC']:
+            self._get_executor(app).submit(self._run, app, job.id, workflow)
+        else:
+            self._run(app, job.id, workflow)
+            # Traité dans un autre contexte (et une autre session)
+            db.session.refresh(job)
+        return job
+
+    @staticmethod
+    def recover(config, pid=None):
+        """
+        Termine en erreur les jobs interrompus, dont la file en mémoire a
+        disparu avec leur processus : sans cela ils resteraient en attente
+        et leur image ne serait jamais libérée.
+        :param pid: Processus arrêté ; None pour tous les jobs en cours, à
+                    n'utiliser qu'au démarrage, avant tout worker
+        :return: Nombre de jobs interrompus
+        """
+        query = IngestJob.query.filter(IngestJob.status.in_(
+            (IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING)))
+        if pid is not None:
+            query = query.filter(IngestJob.worker_pid == pid)
+        jobs = query.all()
+        filenames = {job.image_filename for job in jobs}
+        now = datetime.utcnow()
+        for job in jobs:
+            job.status = IngestJob.STATUS_ERROR
+            job.error = "Traitement interrompu par l'arrêt du serveur"
+            job.finished_at = now
+        db.session.commit()
+        for filename in filenames:
+            release_blob(config, filename)
+        return len(jobs)
+
+    @staticmethod
+    def _run(app, job_id, workflow=None):
+        with app.app_context():
+            job = db.session.get(IngestJob, job_id)
+            job.status = IngestJob.STATUS_RUNNING
+            db.session.commit()
+
+            config = app.config
+            image_path = os.path.join(config['UPLOAD_FOLDER'],
+                                      job.image_filename)
+            try:
+                prompt = create_prompt_from_image(image_path,
+                                                  job.image_filename,
+                                                  job.tags,
+                                                  job.category_id,
+                                                  workflow)
+                db.session.flush()
+                job.prompt_id = prompt.id
+                job.status = IngestJob.STATUS_DONE
+            except Exception as exc:  # pylint: disable=broad-except
+                db.session.rollback()
+                job = db.session.get(IngestJob, job_id)
+                job.status = IngestJob.STATUS_ERROR
+                job.error = str(exc)
+                app.logger.warning("Échec du traitement de %s : %s",
+                                   job.image_filename, exc)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            if job.status == IngestJob.STATUS_ERROR:
+                # Le job ne référence plus l'image une fois terminé
+                release_blob(config, job.image_filename)
+
+            if job.status == IngestJob.STATUS_DONE:
+                try:
+                    build_thumbnails(config, job.image_filename)
+                except OSError as exc:
+                    app.logger.warning("Miniatures impossibles pour "
+                                       "%s : %s", job.image_filename, exc)
+
+
+ingest_queue = IngestQueue()
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _discard_blobs(upload_folder, filenames):
+    """
+    Supprime les blobs copiés par un lot d'import annulé. Ceux qu'un autre
+    écrivain a référencés entre-temps sont conservés (et comptés).
+    """
+    if not filenames:
+        return
+    lock_storage()
+    for filename in set(filenames):
+        path = os.path.join(upload_folder, filename)
+        if blob_refcount(filename):
+            StatsService.record_upload(path)
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    db.session.commit()
+
+
+def parse_image_file(path):
+    """
+    Extrait les métadonnées ComfyUI d'un fichier (exécuté dans un processus
+    du pool d'import).
+    :return: (métadonnées, None) ou (None, message d'erreur)
+    """
+    try:
+        metadata = ComfyUIImage(path).get_metadata()
+    except (OSError, ValueError) as exc:
+        return None, str(exc)
+    if not metadata['prompt']:
+        return None, "Aucun prompt positif trouvé"
+    return metadata, None
+
+
+def import_directory(directory, tags=None, category_id=None, batch_size=500,
+                     workers=None, thumbnails=True, progress=None):
+    """
+    Importe toutes les images d'une arborescence.
+    Les fichiers sont hachés puis analysés en parallèle dans un
+    ``ProcessPoolExecutor`` ; les images déjà importées (même empreinte)
+    sont ignorées, ce qui rend l'import reprenable après interruption.
+    Les prompts sont insérés par lots, un commit par lot.
+    :param progress: Callback ``progress(stats)`` appelé après chaque lot
+    :return: Dictionnaire de statistiques de l'import
+    """
+    # multiprocessing n'est chargé que pour les imports en masse
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+
+    config = current_app.config
+    thumb_config = {key: config[key] for key in THUMBNAIL_CONFIG_KEYS}
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if allowed_file(name)
+    )
+    stats = {'found': len(paths), 'processed': 0, 'imported': 0,
+             'duplicates': 0, 'errors': 0, 'thumbnail_errors': 0,
+             'rate': 0.0}
+    start = time.perf_counter()
+
+    def report():
+        stats['rate'] = stats['processed'] / (time.perf_counter() - start)
+        if progress:
+            progress(stats)
+
+    # La déduplication repose sur ``Prompt.image_hash`` : une image
+    # existante sans empreinte serait importée une seconde fois
+    unhashed = db.session.scalar(
+        select(func.count()).select_from(Prompt)
+        .where(Prompt.image_hash.is_(None)))
+    if unhashed:
+        current_app.logger.warning(
+            "%d prompt(s) sans empreinte d'image, non reconnus comme "
+            "doublons : lancer d'abord « flask dedupe-uploads »", unhashed)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 1) Empreintes et déduplication (base + fichiers de ce même import)
+        new_files, seen = [], set()
+        hashes = pool.map(file_sha256, paths, chunksize=32)
+        for chunk in _batched(zip(paths, hashes), batch_size):
+            known = {
+                image_hash for (image_hash,) in
+                db.session.query(Prompt.image_hash)
+                .filter(Prompt.image_hash.in_([sha for _, sha in chunk]))
+            }
+            for path, sha in chunk:
+                if sha in known or sha in seen:
+                    stats['duplicates'] += 1
+                    stats['processed'] += 1
+                    continue
+                seen.add(sha)
+                new_files.append((path, sha))
+        report()
+
+        # 2) Analyse parallèle et insertion par lots
+        thumbnail_jobs = {}
+        parsed = pool.map(parse_image_file, [path for path, _ in new_files],
+                          chunksize=8)
+        for chunk in _batched(zip(new_files, parsed), batch_size):
+            ready, created, stored = [], [], []
+            try:
+                # Copie des fichiers avant de prendre le verrou d'écriture :
+                # les autres écrivains ne sont bloqués que le temps des
+                # insertions
+                for (path, sha), (metadata, error) in chunk:
+                    stats['processed'] += 1
+                    if error:
+                        stats['errors'] += 1
+                        current_app.logger.warning("%s : %s", path, error)
+                        continue
+                    filename, _, new = store_file(config['UPLOAD_FOLDER'],
+                                                  path, sha=sha)
+                    if new:
+                        created.append(filename)
+                    ready.append((path, sha, filename, metadata))
+
+                lock_storage()
+                for path, sha, filename, metadata in ready:
+                    # Un blob supprimé (release_blob) depuis sa copie est
+                    # refait, sous le verrou cette fois
+                    _, _, new = store_file(config['UPLOAD_FOLDER'],
+                                           path, sha=sha)
+                    if new:
+                        created.append(filename)
+                    stored.append(filename)
+
+                    prompt = Prompt(**metadata,
+                                    tags=tags,
+                                    image_filename=filename,
+                                    image_hash=sha,
+                                    category_id=category_id)
+                    TagService.sync_prompt_tags(prompt)
+                    db.session.add(prompt)
+                for filename in created:
+                    StatsService.record_upload(
+                        os.path.join(config['UPLOAD_FOLDER'], filename))
+                db.session.commit()
+            except BaseException:
+                db.session.rollback()
+                _discard_blobs(config['UPLOAD_FOLDER'], created)
+                raise
+
+            stats['imported'] += len(stored)
+            if thumbnails:
+                thumbnail_jobs.update(
+                    (pool.submit(build_thumbnails, thumb_config, filename),
+                     filename)
+                    for filename in stored)
+            report()
+
+        # Une miniature manquante n'annule pas l'import : la route
+        # ``thumbnail`` (ou ``flask thumbnails``) la regénérera
+        wait(thumbnail_jobs)
+        for job, filename in thumbnail_jobs.items():
+            if job.exception() is not None:
+                stats['thumbnail_errors'] += 1
+                current_app.logger.warning("Miniatures impossibles pour "
+                                           "%s : %s", filename,
+                                           job.exception())
+    return stats
@@ -0,0 +1,61 @@
+"""tags index
+
+Revision ID: 3b8f2a91c4d7
+Revises: 59e78dc1d6f1
+Create Date: 2026-10-18 09:12:41.208314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8f2a91c4d7'
+down_revision = '59e78dc1d6f1'
+branch_labels = None
+depends_on = None
+
+
+SPLIT_TAGS_SQL = """
+    WITH RECURSIVE split(prompt_id, tag, rest) AS (
+        SELECT id, '', tags || ',' FROM prompts WHERE tags IS NOT NULL
+        UNION ALL
+        SELECT prompt_id,
+               lower(trim(substr(rest, 1, instr(rest, ',') - 1))),
+               substr(rest, instr(rest, ',') + 1)
+        FROM split WHERE rest <> ''
+    )
+    SELECT DISTINCT prompt_id, tag FROM split WHERE tag <> ''
+"""
+
+
+def upgrade():
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tags_name', 'tags', ['name'], unique=True)
+    op.create_table('prompt_tags',
+    sa.Column('prompt_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], name='fk_prompt_tags_prompt', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], name='fk_prompt_tags_tag', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('prompt_id', 'tag_id')
+    )
+    op.create_index('ix_prompt_tags_tag_id', 'prompt_tags', ['tag_id', 'prompt_id'], unique=False)
+
+    # Backfill depuis les chaînes de tags existantes
+    op.execute(f"INSERT OR IGNORE INTO tags (name) SELECT DISTINCT tag FROM ({SPLIT_TAGS_SQL})")
+    op.execute(
+        "INSERT INTO prompt_tags (prompt_id, tag_id) "
+        f"SELECT s.prompt_id, t.id FROM ({SPLIT_TAGS_SQL}) s "
+        "JOIN tags t ON t.name = s.tag"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_prompt_tags_tag_id', table_name='prompt_tags')
+    op.drop_table('prompt_tags')
+    op.drop_index('ix_tags_name', table_name='tags')
+    op.drop_table('tags')
@@ -0,0 +1,64 @@
+"""prompt raws
+
+Revision ID: 4f0c2d8e6b19
+Revises: e1a7b3c95d20
+Create Date: 2026-10-18 14:05:33.870412
+
+"""
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f0c2d8e6b19'
+down_revision = 'e1a7b3c95d20'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def upgrade():
+    op.create_table('prompt_raws',
+    sa.Column('prompt_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], name='fk_prompt_raws_prompt', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('prompt_id')
+    )
+
+    # Copie compressée des workflows existants (le JSON est déjà sérialisé)
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text(
+            "SELECT id, prompt_raw FROM prompts "
+            "WHERE id > :last_id AND prompt_raw IS NOT NULL "
+            "AND prompt_raw <> 'null' ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("INSERT INTO prompt_raws (prompt_id, data) "
+                    "VALUES (:prompt_id, :data)"),
+            [{"prompt_id": row_id, "data": zlib.compress(raw.encode("utf-8"))}
+             for row_id, raw in rows]
+        )
+        last_id = rows[-1][0]
+
+    # DROP COLUMN natif (SQLite >= 3.35) : conserve les triggers FTS
+    op.execute("ALTER TABLE prompts DROP COLUMN prompt_raw")
+
+
+def downgrade():
+    op.execute("ALTER TABLE prompts ADD COLUMN prompt_raw JSON")
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT prompt_id, data FROM prompt_raws"))
+    for prompt_id, data in rows.fetchall():
+        conn.execute(
+            sa.text("UPDATE prompts SET prompt_raw = :raw WHERE id = :id"),
+            {"raw": zlib.decompress(data).decode("utf-8"), "id": prompt_id}
+        )
+
+    op.drop_table('prompt_raws')
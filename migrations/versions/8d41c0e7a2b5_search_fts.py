@@ -0,0 +1,70 @@
+"""search fts
+
+Revision ID: 8d41c0e7a2b5
+Revises: 3b8f2a91c4d7
+Create Date: 2026-10-18 10:03:27.551902
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c0e7a2b5'
+down_revision = '3b8f2a91c4d7'
+branch_labels = None
+depends_on = None
+
+
+# Noms des LoRAs (clés du dict JSON) séparés par des espaces
+LORA_NAMES_SQL = (
+    "CASE WHEN json_valid({row}.loras) THEN "
+    "(SELECT group_concat(key, ' ') FROM json_each({row}.loras)) END"
+)
+
+INSERT_FTS_SQL = (
+    "INSERT INTO prompts_fts (rowid, prompt, neg_prompt, checkpoint, loras) "
+    "VALUES (new.id, new.prompt, new.neg_prompt, new.checkpoint, "
+    + LORA_NAMES_SQL.format(row="new") + ");"
+)
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE prompts_fts USING fts5("
+        "prompt, neg_prompt, checkpoint, loras, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    # Pondération BM25 : prompt positif > checkpoint/LoRAs > prompt négatif
+    op.execute(
+        "INSERT INTO prompts_fts (prompts_fts, rank) "
+        "VALUES ('rank', 'bm25(10.0, 1.0, 4.0, 4.0)')"
+    )
+
+    op.execute(
+        "CREATE TRIGGER prompts_fts_ai AFTER INSERT ON prompts BEGIN "
+        + INSERT_FTS_SQL + " END"
+    )
+    op.execute(
+        "CREATE TRIGGER prompts_fts_ad AFTER DELETE ON prompts BEGIN "
+        "DELETE FROM prompts_fts WHERE rowid = old.id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER prompts_fts_au AFTER UPDATE OF "
+        "id, prompt, neg_prompt, checkpoint, loras ON prompts BEGIN "
+        "DELETE FROM prompts_fts WHERE rowid = old.id; "
+        + INSERT_FTS_SQL + " END"
+    )
+
+    # Backfill des prompts existants
+    op.execute(
+        "INSERT INTO prompts_fts (rowid, prompt, neg_prompt, checkpoint, loras) "
+        "SELECT id, prompt, neg_prompt, checkpoint, "
+        + LORA_NAMES_SQL.format(row="prompts") + " FROM prompts"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS prompts_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS prompts_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS prompts_fts_ai")
+    op.execute("DROP TABLE IF EXISTS prompts_fts")
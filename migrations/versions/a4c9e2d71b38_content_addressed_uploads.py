@@ -0,0 +1,27 @@
+"""content addressed uploads
+
+Revision ID: a4c9e2d71b38
+Revises: f3b81d6c2e47
+Create Date: 2026-10-18 21:10:37.518244
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c9e2d71b38'
+down_revision = 'f3b81d6c2e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Comptage des références d'un blob (cf. storage.blob_refcount)
+    op.create_index('ix_prompts_image_filename', 'prompts', ['image_filename'], unique=False)
+    op.create_index('ix_ingest_jobs_image_filename', 'ingest_jobs', ['image_filename'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ingest_jobs_image_filename', table_name='ingest_jobs')
+    op.drop_index('ix_prompts_image_filename', table_name='prompts')
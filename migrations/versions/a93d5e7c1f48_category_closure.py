@@ -0,0 +1,46 @@
+"""category closure
+
+Revision ID: a93d5e7c1f48
+Revises: 4f0c2d8e6b19
+Create Date: 2026-10-18 15:12:47.204318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93d5e7c1f48'
+down_revision = '4f0c2d8e6b19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], name='fk_category_closure_ancestor', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], name='fk_category_closure_descendant', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_category_closure_descendant', 'category_closure', ['descendant_id', 'depth'], unique=False)
+
+    # Remplissage initial depuis parent_id (garde-fou contre les cycles)
+    op.execute(
+        "WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS ("
+        " SELECT id, id, 0 FROM categories"
+        " UNION ALL"
+        " SELECT tree.ancestor_id, categories.id, tree.depth + 1"
+        " FROM tree JOIN categories"
+        " ON categories.parent_id = tree.descendant_id"
+        " WHERE tree.depth < 1000"
+        ") INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+        "SELECT ancestor_id, descendant_id, depth FROM tree"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_category_closure_descendant', table_name='category_closure')
+    op.drop_table('category_closure')
@@ -0,0 +1,29 @@
+"""query indexes
+
+Revision ID: b5e2f8a41c67
+Revises: a93d5e7c1f48
+Create Date: 2026-10-18 16:02:11.583920
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2f8a41c67'
+down_revision = 'a93d5e7c1f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_prompts_category_id_id', 'prompts', ['category_id', 'id'], unique=False)
+    op.create_index('ix_prompts_checkpoint', 'prompts', ['checkpoint'], unique=False)
+    op.create_index('ix_prompts_created_at', 'prompts', ['created_at'], unique=False)
+    op.create_index('ix_categories_parent_id', 'categories', ['parent_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_categories_parent_id', table_name='categories')
+    op.drop_index('ix_prompts_created_at', table_name='prompts')
+    op.drop_index('ix_prompts_checkpoint', table_name='prompts')
+    op.drop_index('ix_prompts_category_id_id', table_name='prompts')
@@ -0,0 +1,104 @@
+"""stat counters
+
+Revision ID: c7d14e92b3a8
+Revises: b5e2f8a41c67
+Create Date: 2026-10-18 16:48:29.117052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d14e92b3a8'
+down_revision = 'b5e2f8a41c67'
+branch_labels = None
+depends_on = None
+
+UPSERT = " ON CONFLICT (kind, key) DO UPDATE SET count = count + excluded.count"
+
+# Incrémente (NEW, +1) ou décrémente (OLD, -1) les compteurs d'un prompt
+PROMPT_DELTA = (
+    "INSERT INTO stat_counters (kind, key, count) VALUES "
+    "('total', 'prompts', {sign}), "
+    "('checkpoint', coalesce({row}.checkpoint, ''), {sign}), "
+    "('sampler', coalesce({row}.sampler, ''), {sign}), "
+    "('scheduler', coalesce({row}.scheduler, ''), {sign})" + UPSERT + "; "
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'lora', key, {sign} FROM json_each({row}.loras) "
+    "WHERE typeof(key) = 'text'" + UPSERT + ";"
+)
+
+TAG_DELTA = (
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'tag', name, {sign} FROM tags WHERE id = {row}.tag_id" + UPSERT + ";"
+)
+
+PURGE = ("DELETE FROM stat_counters WHERE count <= 0 "
+         "AND kind NOT IN ('total', 'storage');")
+
+TRIGGERS = {
+    'stat_counters_prompts_ai':
+        "AFTER INSERT ON prompts BEGIN "
+        + PROMPT_DELTA.format(row='NEW', sign=1) + " END",
+    'stat_counters_prompts_ad':
+        "AFTER DELETE ON prompts BEGIN "
+        + PROMPT_DELTA.format(row='OLD', sign=-1) + " " + PURGE + " END",
+    'stat_counters_prompts_au':
+        "AFTER UPDATE OF checkpoint, sampler, scheduler, loras ON prompts "
+        "WHEN OLD.checkpoint IS NOT NEW.checkpoint "
+        "OR OLD.sampler IS NOT NEW.sampler "
+        "OR OLD.scheduler IS NOT NEW.scheduler "
+        "OR OLD.loras IS NOT NEW.loras BEGIN "
+        + PROMPT_DELTA.format(row='OLD', sign=-1) + " "
+        + PROMPT_DELTA.format(row='NEW', sign=1) + " " + PURGE + " END",
+    'stat_counters_prompt_tags_ai':
+        "AFTER INSERT ON prompt_tags BEGIN "
+        + TAG_DELTA.format(row='NEW', sign=1) + " END",
+    'stat_counters_prompt_tags_ad':
+        "AFTER DELETE ON prompt_tags BEGIN "
+        + TAG_DELTA.format(row='OLD', sign=-1) + " " + PURGE + " END",
+}
+
+BACKFILL = (
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'total', 'prompts', count(*) FROM prompts",
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'checkpoint', coalesce(checkpoint, ''), count(*) FROM prompts "
+    "GROUP BY coalesce(checkpoint, '')",
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'sampler', coalesce(sampler, ''), count(*) FROM prompts "
+    "GROUP BY coalesce(sampler, '')",
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'scheduler', coalesce(scheduler, ''), count(*) FROM prompts "
+    "GROUP BY coalesce(scheduler, '')",
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'lora', j.key, count(*) FROM prompts, json_each(prompts.loras) j "
+    "WHERE typeof(j.key) = 'text' GROUP BY j.key",
+    "INSERT INTO stat_counters (kind, key, count) "
+    "SELECT 'tag', tags.name, count(*) FROM prompt_tags "
+    "JOIN tags ON tags.id = prompt_tags.tag_id GROUP BY tags.id",
+)
+
+
+def upgrade():
+    op.create_table('stat_counters',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'key')
+    )
+
+    # Compteurs initiaux ; l'occupation du dossier d'upload (``storage``)
+    # est calculée au premier affichage des statistiques.
+    for sql in BACKFILL:
+        op.execute(sql)
+
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_table('stat_counters')
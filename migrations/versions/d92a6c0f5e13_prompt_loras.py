@@ -0,0 +1,68 @@
+"""prompt loras
+
+Revision ID: d92a6c0f5e13
+Revises: c7d14e92b3a8
+Create Date: 2026-10-18 17:21:05.640381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd92a6c0f5e13'
+down_revision = 'c7d14e92b3a8'
+branch_labels = None
+depends_on = None
+
+# Lignes (prompt, LoRA, poids) d'un prompt ; un poids non numérique
+# (entrée reliée à un autre nœud) est stocké NULL
+INSERT_LORAS = (
+    "INSERT OR REPLACE INTO prompt_loras (prompt_id, lora_name, weight) "
+    "SELECT {row}.id, key, CASE WHEN type IN ('integer', 'real') "
+    "THEN value END FROM json_each({row}.loras) "
+    "WHERE typeof(key) = 'text';"
+)
+
+TRIGGERS = {
+    'prompt_loras_ai':
+        "AFTER INSERT ON prompts BEGIN "
+        + INSERT_LORAS.format(row='NEW') + " END",
+    'prompt_loras_ad':
+        "AFTER DELETE ON prompts BEGIN "
+        "DELETE FROM prompt_loras WHERE prompt_id = OLD.id; END",
+    'prompt_loras_au':
+        "AFTER UPDATE OF loras ON prompts "
+        "WHEN OLD.loras IS NOT NEW.loras BEGIN "
+        "DELETE FROM prompt_loras WHERE prompt_id = OLD.id; "
+        + INSERT_LORAS.format(row='NEW') + " END",
+}
+
+
+def upgrade():
+    op.create_table('prompt_loras',
+    sa.Column('prompt_id', sa.Integer(), nullable=False),
+    sa.Column('lora_name', sa.Text(), nullable=False),
+    sa.Column('weight', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], name='fk_prompt_loras_prompt', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('prompt_id', 'lora_name')
+    )
+    op.create_index('ix_prompt_loras_lora_name', 'prompt_loras', ['lora_name', 'weight', 'prompt_id'], unique=False)
+
+    # Remplissage depuis le JSON des prompts existants
+    op.execute(
+        "INSERT INTO prompt_loras (prompt_id, lora_name, weight) "
+        "SELECT prompts.id, j.key, CASE WHEN j.type IN ('integer', 'real') "
+        "THEN j.value END FROM prompts, json_each(prompts.loras) j "
+        "WHERE typeof(j.key) = 'text'"
+    )
+
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_index('ix_prompt_loras_lora_name', table_name='prompt_loras')
+    op.drop_table('prompt_loras')
@@ -0,0 +1,65 @@
+"""incremental backups
+
+Revision ID: f3b81d6c2e47
+Revises: d92a6c0f5e13
+Create Date: 2026-10-18 19:45:12.204317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b81d6c2e47'
+down_revision = 'd92a6c0f5e13'
+branch_labels = None
+depends_on = None
+
+# Horodatage UTC au format des colonnes DateTime de SQLAlchemy
+# ('YYYY-MM-DD HH:MM:SS.ffffff')
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:', 'now') || strftime('%f', 'now') || '000'"
+
+# Pierres tombales : suppressions reportées dans les sauvegardes incrémentales
+TRIGGERS = {
+    'deleted_records_prompts_ad':
+        "AFTER DELETE ON prompts BEGIN "
+        "INSERT INTO deleted_records (kind, record_id, deleted_at) "
+        f"VALUES ('prompt', OLD.id, {NOW_SQL}); END",
+    'deleted_records_categories_ad':
+        "AFTER DELETE ON categories BEGIN "
+        "INSERT INTO deleted_records (kind, record_id, deleted_at) "
+        f"VALUES ('category', OLD.id, {NOW_SQL}); END",
+}
+
+
+def upgrade():
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_categories_updated_at'), ['updated_at'], unique=False)
+    op.execute("UPDATE categories SET updated_at = coalesce(created_at, "
+               f"{NOW_SQL})")
+
+    op.create_index('ix_prompts_updated_at', 'prompts', ['updated_at'], unique=False)
+
+    op.create_table('deleted_records',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('record_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deleted_records_deleted_at', 'deleted_records', ['deleted_at'], unique=False)
+
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_index('ix_deleted_records_deleted_at', table_name='deleted_records')
+    op.drop_table('deleted_records')
+    op.drop_index('ix_prompts_updated_at', table_name='prompts')
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_categories_updated_at'))
+        batch_op.drop_column('updated_at')
@@ -1,11 +1,28 @@
 """Definition des modeles presents dans l'application"""
 
+import json
+import zlib
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
 
+# Table d'association prompts <-> tags (index normalisé des tags)
+prompt_tags = db.Table(
+    "prompt_tags",
+    db.Column("prompt_id", db.Integer,
+              db.ForeignKey("prompts.id", name="fk_prompt_tags_prompt",
+                            ondelete="CASCADE"),
+              primary_key=True),
+    db.Column("tag_id", db.Integer,
+              db.ForeignKey("tags.id", name="fk_prompt_tags_tag",
+                            ondelete="CASCADE"),
+              primary_key=True),
+    db.Index("ix_prompt_tags_tag_id", "tag_id", "prompt_id"),
+)
+
+
 class Prompt(db.Model):  # pylint: disable=too-few-public-methods
     """
     Modèle représentant un prompt dans la base de données.
@@ -13,6 +30,10 @@ class Prompt(db.Model):  # pylint: disable=too-few-public-methods
     et une date de création.
     """
     __tablename__ = "prompts"
+    __table_args__ = (
+        # Galerie filtrée par catégorie, triée par id (et comptes par catégorie)
+        db.Index("ix_prompts_category_id_id", "category_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     prompt = db.Column(db.Text, nullable=False)
@@ -21,11 +42,10 @@ class Prompt(db.Model):  # pylint: disable=too-few-public-methods
     # Métadonnées techniques
     seed = db.Column(db.Integer, nullable=True)
     steps = db.Column(db.Integer, nullable=True)
-    checkpoint = db.Column(db.Text, nullable=True)
+    checkpoint = db.Column(db.Text, nullable=True, index=True)
     cfg = db.Column(db.Float, nullable=True)
     loras = db.Column(db.JSON, nullable=True)
     neg_prompt = db.Column(db.Text, nullable=True)
-    prompt_raw = db.Column(db.JSON, nullable=True)
     sampler = db.Column(db.String(120), nullable=True)
     scheduler = db.Column(db.String(120), nullable=True)
 
@@ -37,14 +57,140 @@ class Prompt(db.Model):  # pylint: disable=too-few-public-methods
     )
 
     # Image et timestamps
-    image_filename = db.Column(db.String(120), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Blob de l'image (cf. storage.py), partagé par les prompts identiques
+    image_filename = db.Column(db.String(120), nullable=True, index=True)
+    # Empreinte SHA-256 de l'image (déduplication des imports)
+    image_hash = db.Column(db.String(64), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           index=True)
+
+    # Index normalisé des tags (synchronisé avec la colonne ``tags``)
+    tag_items = db.relationship(
+        "Tag",
+        secondary=prompt_tags,
+        backref=db.backref("prompts", lazy="dynamic")
+    )
+
+    # Workflow brut, stocké compressé hors de la table (chargé à la demande)
+    raw = db.relationship(
+        "PromptRaw",
+        uselist=False,
+        cascade="all, delete-orphan",
+        lazy="select"
+    )
+
+    @property
+    def prompt_raw(self):
+        """Workflow ComfyUI brut (dict), décompressé à la lecture"""
+        return PromptRaw.decode(self.raw.data) if self.raw else None
+
+    @prompt_raw.setter
+    def prompt_raw(self, value):
+        if value is None:
+            self.raw = None
+        elif self.raw is not None:
+            self.raw.data = PromptRaw.encode(value)
+        else:
+            self.raw = PromptRaw(data=PromptRaw.encode(value))
+
+    def to_dict(self):
+        """Représentation JSON du prompt (sans le workflow brut)"""
+        return {
+            "id": self.id,
+            "prompt": self.prompt,
+            "neg_prompt": self.neg_prompt,
+            "tags": self.tags,
+            "seed": self.seed,
+            "steps": self.steps,
+            "cfg": self.cfg,
+            "checkpoint": self.checkpoint,
+            "loras": self.loras,
+            "sampler": self.sampler,
+            "scheduler": self.scheduler,
+            "category_id": self.category_id,
+            "image_filename": self.image_filename,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
 
     def __repr__(self):
         return f"<Prompt {self.id}>"
 
 
+class PromptLora(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    LoRA utilisé par un prompt, avec son poids. Table dérivée de
+    ``prompts.loras`` et tenue à jour par des triggers SQL.
+    """
+    __tablename__ = "prompt_loras"
+    __table_args__ = (
+        # Prompts d'un LoRA et histogramme des poids (index couvrant)
+        db.Index("ix_prompt_loras_lora_name", "lora_name", "weight",
+                 "prompt_id"),
+    )
+
+    prompt_id = db.Column(
+        db.Integer,
+        db.ForeignKey("prompts.id", name="fk_prompt_loras_prompt",
+                      ondelete="CASCADE"),
+        primary_key=True
+    )
+    lora_name = db.Column(db.Text, primary_key=True)
+    weight = db.Column(db.Float, nullable=True)
+
+
+class PromptRaw(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Workflow ComfyUI brut d'un prompt (JSON compressé zlib).
+    Séparé de ``prompts`` pour ne pas alourdir les listes et statistiques.
+    """
+    __tablename__ = "prompt_raws"
+
+    prompt_id = db.Column(
+        db.Integer,
+        db.ForeignKey("prompts.id", name="fk_prompt_raws_prompt",
+                      ondelete="CASCADE"),
+        primary_key=True
+    )
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    @staticmethod
+    def encode(value):
+        """Sérialise et compresse un workflow"""
+        return zlib.compress(json.dumps(value).encode("utf-8"))
+
+    @staticmethod
+    def decode(data):
+        """Décompresse et désérialise un workflow"""
+        return json.loads(zlib.decompress(data))
+
+    @staticmethod
+    def encode_text(value):
+        """Compresse un workflow déjà sérialisé en JSON"""
+        return zlib.compress(value.encode("utf-8"))
+
+    @staticmethod
+    def decode_text(data):
+        """Décompresse un workflow sans le désérialiser (texte JSON)"""
+        return zlib.decompress(data).decode("utf-8")
+
+    def __repr__(self):
+        return f"<PromptRaw {self.prompt_id}>"
+
+
+class Tag(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Tag unique, relié aux prompts via la table ``prompt_tags``.
+    """
+    __tablename__ = "tags"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True, index=True)
+
+    def __repr__(self):
+        return f"<Tag {self.name}>"
+
+
 class Category(db.Model):
     __tablename__ = "categories"
 
@@ -56,10 +202,13 @@ class Category(db.Model):
     parent_id = db.Column(
         db.Integer,
         db.ForeignKey("categories.id", name="fk_category_parent"),
-        nullable=True
+        nullable=True,
+        index=True
     )
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
 
     # Relation récursive explicite
     children = db.relationship(
@@ -77,26 +226,140 @@ class Category(db.Model):
 
     def get_path(self):
         """Retourne le chemin complet de la catégorie (breadcrumbs)"""
-        path = [self.name]
-        current = self.parent
-        while current:
-            path.append(current.name)
-            current = current.parent
-        return " > ".join(reversed(path))
+        names = (
+            db.session.query(Category.name)
+            .join(CategoryClosure,
+                  CategoryClosure.ancestor_id == Category.id)
+            .filter(CategoryClosure.descendant_id == self.id)
+            .order_by(CategoryClosure.depth.desc())
+        )
+        return " > ".join(name for (name,) in names)
 
     def get_all_children(self):
-        """Récupère récursivement tous les enfants"""
-        children = []
-        for child in self.children:
-            children.append(child)
-            children.extend(child.get_all_children())
-        return children
+        """Récupère tous les descendants en une requête"""
+        return (
+            Category.query
+            .join(CategoryClosure,
+                  CategoryClosure.descendant_id == Category.id)
+            .filter(CategoryClosure.ancestor_id == self.id,
+                    CategoryClosure.depth > 0)
+            .order_by(CategoryClosure.depth, Category.id)
+            .all()
+        )
 
     def is_ancestor_of(self, category):
         """Vérifie si cette catégorie est ancêtre d'une autre"""
-        current = category.parent
-        while current:
-            if current.id == self.id:
-                return True
-            current = current.parent
-        return False
+        return db.session.query(
+            db.exists().where(
+                CategoryClosure.ancestor_id == self.id,
+                CategoryClosure.descendant_id == category.id,
+                CategoryClosure.depth > 0,
+            )
+        ).scalar()
+
+
+class CategoryClosure(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Table de fermeture de l'arbre des catégories : une ligne par couple
+    (ancêtre, descendant), y compris (catégorie, elle-même) à la profondeur 0.
+    Maintenue par ``CategoryService``.
+    """
+    __tablename__ = "category_closure"
+
+    ancestor_id = db.Column(
+        db.Integer,
+        db.ForeignKey("categories.id", name="fk_category_closure_ancestor",
+                      ondelete="CASCADE"),
+        primary_key=True
+    )
+    descendant_id = db.Column(
+        db.Integer,
+        db.ForeignKey("categories.id", name="fk_category_closure_descendant",
+                      ondelete="CASCADE"),
+        primary_key=True
+    )
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_category_closure_descendant", "descendant_id", "depth"),
+    )
+
+
+class IngestJob(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Traitement en arrière-plan d'une image uploadée
+    (extraction des métadonnées, indexation, miniatures).
+    """
+    __tablename__ = "ingest_jobs"
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_ERROR = "error"
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    image_filename = db.Column(db.String(120), nullable=False, index=True)
+    tags = db.Column(db.String(120), nullable=True)
+    category_id = db.Column(db.Integer, nullable=True)
+    prompt_id = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    # Processus dont la file en mémoire porte le job (cf. IngestQueue.recover)
+    worker_pid = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        """Représentation JSON du job"""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "prompt_id": self.prompt_id,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<IngestJob {self.id} {self.status}>"
+
+
+class StatCounter(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Compteur pré-calculé de la page statistiques, par ``(kind, key)`` :
+    prompts par checkpoint, LoRA, tag, sampler et scheduler (tenus à jour par
+    des triggers SQL), et occupation du dossier d'upload (``storage``).
+    """
+    __tablename__ = "stat_counters"
+
+    KIND_TOTAL = "total"
+    KIND_CHECKPOINT = "checkpoint"
+    KIND_LORA = "lora"
+    KIND_TAG = "tag"
+    KIND_SAMPLER = "sampler"
+    KIND_SCHEDULER = "scheduler"
+    KIND_STORAGE = "storage"
+
+    kind = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.Text, primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class DeletedRecord(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Pierre tombale d'un prompt ou d'une catégorie supprimé (insérée par un
+    trigger SQL), reportée dans les sauvegardes incrémentales.
+    """
+    __tablename__ = "deleted_records"
+
+    KIND_PROMPT = "prompt"
+    KIND_CATEGORY = "category"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           index=True)
+
+    def __repr__(self):
+        return f"<DeletedRecord {self.kind} {self.record_id}>"
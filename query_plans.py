@@ -0,0 +1,167 @@
+"""
+Vérification des plans d'exécution SQLite des routes (``flask check-plans``).
+
+Chaque route de lecture est appelée via le client de test ; les requêtes SQL
+émises sont capturées puis passées à ``EXPLAIN QUERY PLAN``. Un parcours
+complet d'une table (``SCAN <table>`` sans index) est signalé comme une
+régression, sauf s'il figure dans ``ALLOWED_SCANS`` ou s'il s'agit du seul
+parcours de la galerie dans l'ordre de la clé primaire, sans autre filtre,
+interrompu par un ``LIMIT``.
+"""
+
+import re
+from collections import namedtuple
+from fnmatch import fnmatch
+from sqlalchemy import event, text
+from models import db
+from utils import CategoryService, PaginationService, TagService
+
+# Parcours complets assumés : {(motif fnmatch de l'URL, table): raison}
+ALLOWED_SCANS = {
+    ('*', 'categories'): "l'arbre des catégories est chargé en entier",
+    ('/?tag=-*', 'prompts'): "aucun index ne sert une exclusion de tag : la "
+                             "galerie est parcourue par id jusqu'au LIMIT",
+}
+
+SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+PlanReport = namedtuple('PlanReport', ['route', 'status', 'queries', 'scans'])
+
+
+def seed_database(prompts=5000, categories=200):
+    """
+    Remplit une base vide avec des données synthétiques réalistes :
+    arbre de catégories, prompts, tags et index plein texte (triggers).
+    """
+    db.session.execute(text(
+        "INSERT INTO categories (id, name, description, parent_id) "
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+        " WHERE i < :categories) "
+        "SELECT i, 'categorie ' || i, '', "
+        " CASE WHEN i <= 10 THEN NULL ELSE (i - 1) / 5 END FROM n"
+    ), {"categories": categories})
+    db.session.execute(text(
+        "INSERT INTO prompts (prompt, tags, seed, steps, checkpoint, cfg, "
+        " neg_prompt, sampler, scheduler, loras, category_id, image_filename, "
+        " created_at, updated_at) "
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+        " WHERE i < :prompts) "
+        "SELECT 'masterpiece, 1girl, prompt ' || i || ', mountains ' || (i % 97), "
+        " 'tag' || (i % 40) || ',theme' || (i % 7), i, 30, "
+        " 'checkpoint_' || (i % 12), 7.0, 'bad hands', 'euler', 'normal', "
+        " json_object('lora_' || (i % 15), 0.5 + (i % 6) / 10.0, "
+        "  'detail_' || (i % 4), 1), "
+        " CASE WHEN i % 4 = 0 THEN NULL ELSE 1 + i % :categories END, "
+        " printf('%08x.png', i), datetime('now', '-' || i || ' minutes'), "
+        " datetime('now') FROM n"
+    ), {"prompts": prompts, "categories": categories})
+    db.session.flush()
+    CategoryService.rebuild_closure()
+    TagService.rebuild()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def route_samples():
+    """URLs représentatives des routes de lecture, selon les données en base"""
+    routes = ['/', '/statistiques', '/categories', '/api/categories/tree',
+              '/api/prompts?total=1']
+
+    tag = db.session.execute(text(
+        "SELECT name FROM tags ORDER BY id LIMIT 1")).scalar()
+    if tag:
+        routes += [f'/?tag={tag}', f'/?tag=-{tag}',
+                   f'/api/prompts?tag={tag}']
+    prompt_id = db.session.execute(text(
+        "SELECT max(id) FROM prompts")).scalar()
+    if prompt_id:
+        # Page lointaine : le curseur reprend au milieu de la galerie
+        cursor = PaginationService.encode_cursor([prompt_id // 2])
+        routes += [f'/prompt/{prompt_id}', '/?q=mountains',
+                   f'/?cursor={cursor}', f'/api/prompts?cursor={cursor}']
+    lora = db.session.execute(text(
+        "SELECT lora_name FROM prompt_loras LIMIT 1")).scalar()
+    if lora:
+        routes += [f'/?lora={lora}', f'/api/loras/{lora}', '/api/loras']
+    category_id = db.session.execute(text(
+        "SELECT id FROM categories WHERE parent_id IS NULL "
+        "ORDER BY id LIMIT 1")).scalar()
+    if category_id:
+        routes += [f'/category/{category_id}',
+                   f'/categories/{category_id}/edit',
+                   f'/api/prompts?category_id={category_id}']
+        if prompt_id:
+            routes.append(f'/api/prompts?category_id={category_id}'
+                          f'&cursor={cursor}')
+    return routes
+
+
+def capture_queries(app, url):
+    """Appelle ``url`` et retourne le statut et les SELECT émis"""
+    statements = []
+
+    def before_execute(_conn, _cursor, statement, parameters, *_):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_execute)
+    return response.status_code, statements
+
+
+def explain(statement, parameters):
+    """Lignes ``detail`` de ``EXPLAIN QUERY PLAN``"""
+    rows = db.session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters)
+    return [row[3] for row in rows]
+
+
+def full_scans(statement, plan, tables):
+    """Tables parcourues sans index dans un plan (alias ``table_1`` inclus)"""
+    # Simple parcours de la galerie dans l'ordre du rowid, sans tri ni autre
+    # filtre (sous-requête, jointure) : le LIMIT l'interrompt
+    if ' LIMIT ' in statement and len(plan) == 1:
+        return []
+
+    scans = []
+    for detail in plan:
+        match = SCAN_RE.match(detail)
+        if not match:
+            continue
+        name = re.sub(r'_\d+$', '', match.group(1))
+        if name in tables:
+            scans.append(name)
+    return scans
+
+
+def check_plans(app, routes=None):
+    """
+    Analyse les plans des requêtes de chaque route.
+    :return: liste de ``PlanReport`` (``scans`` : [(table, requête, plan)])
+    """
+    # Les caches en mémoire masqueraient les requêtes à analyser
+    CategoryService.invalidate_tree()
+    PaginationService._count_cache.clear()  # pylint: disable=protected-access
+
+    tables = set(db.metadata.tables)
+    reports = []
+    with app.app_context():
+        routes = routes or route_samples()
+    for url in routes:
+        status, statements = capture_queries(app, url)
+        scans = []
+        with app.app_context():
+            for statement, parameters in statements:
+                plan = explain(statement, parameters)
+                for table in full_scans(statement, plan, tables):
+                    if any(fnmatch(url, pattern) and table == allowed
+                           for pattern, allowed in ALLOWED_SCANS):
+                        continue
+                    scans.append((table, statement, plan))
+        reports.append(PlanReport(url, status, len(statements), scans))
+    return reports
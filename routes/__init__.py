@@ -1,5 +1,6 @@
 """Initialisation du module"""
 
+from .health_routes import health_bp
 from .prompt_routes import prompt_bp
 
 
@@ -8,3 +9,4 @@ def register_routes(app):
     Enregistrement des routes
     """
     app.register_blueprint(prompt_bp)
+    app.register_blueprint(health_bp)
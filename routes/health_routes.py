@@ -0,0 +1,42 @@
+"""Sondes de vie et de disponibilité (orchestrateur, proxy, healthcheck)"""
+
+import os
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy.exc import SQLAlchemyError
+from schema import current_revision, head_revision
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/healthz')
+def healthz():
+
+    """
+    Le processus répond : aucune dépendance n'est vérifiée.
+    """
+    return jsonify({'status': 'ok'})
+
+
+@health_bp.route('/readyz')
+def readyz():
+
+    """
+    L'instance peut recevoir du trafic : base joignable et à jour des
+    migrations, dossier d'upload accessible en écriture.
+    """
+    errors = []
+    try:
+        revision = current_revision()
+    except SQLAlchemyError as exc:
+        revision = None
+        errors.append(f"base inaccessible : {exc.__class__.__name__}")
+    else:
+        head = head_revision()
+        if revision != head:
+            errors.append(f"schéma en révision {revision}, attendu {head}")
+    if not os.access(current_app.config['UPLOAD_FOLDER'], os.W_OK):
+        errors.append("dossier d'upload non accessible en écriture")
+
+    if errors:
+        return jsonify({'status': 'unavailable', 'errors': errors}), 503
+    return jsonify({'status': 'ready', 'revision': revision})
@@ -1,98 +1,130 @@
 """Liste de toutes les routes de l'application"""
 
+import mimetypes
 import os
-import uuid
 from flask import (
     Blueprint, render_template, request, redirect,
-    url_for, flash, current_app, jsonify
+    url_for, flash, current_app, jsonify, abort, send_file, send_from_directory
 )
-from werkzeug.utils import secure_filename
-from models import db, Prompt, Category
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import safe_join
+from models import (db, Prompt, Category, CategoryClosure, IngestJob,
+                    StatCounter)
+from ingest import ingest_queue
 from utils import (
-    ComfyUIImage, allowed_file, clean_tags, CategoryService,
-    taille_path)
-from sqlalchemy import func
-from collections import Counter
+    allowed_file, clean_tags, CategoryService, ComfyUIImage, LoraService,
+    PaginationService, StatsService, TagService, SearchService,
+    taille_lisible, taille_path)
+from storage import (blob_hash, lock_storage, release_blob, store_upload,
+                     upload_metadata)
+from thumbnails import build_thumbnails, thumbnail_name
 from version import __version__
 
 prompt_bp = Blueprint('prompt', __name__)
 
+# Durée de cache des fichiers adressés par leur contenu (ils ne changent pas)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
 
-@prompt_bp.route('/')
-@prompt_bp.route('/category/<int:category_id>')
-def index(category_id=None):
 
+def _build_thumbnails(filename):
     """
-    Route principale affichant la liste des prompts.
-    Prend en compte les filtres par tag ou par requête de recherche.
+    Génère les miniatures d'une image uploadée. Un échec n'est pas bloquant :
+    la route ``thumbnail`` retentera la génération à la demande.
+    """
+    try:
+        build_thumbnails(current_app.config, filename)
+    except OSError as exc:
+        current_app.logger.warning("Miniatures impossibles pour %s : %s",
+                                   filename, exc)
+
+
+def _prompt_listing(category_id=None):
+    """
+    Construit la requête filtrée de la galerie à partir de la requête HTTP
+    (catégorie, tags, recherche) et sa clé de tri pour la pagination.
     """
     selected_category = None
     if category_id:
         selected_category = Category.query.get_or_404(category_id)
 
-    tag = request.args.get('tag')
+    selected_tags = [t for t in request.args.getlist('tag') if t.strip()]
+    selected_loras = [lora for lora in request.args.getlist('lora') if lora]
     query = request.args.get('q')
-    page = request.args.get('page', 1, type=int)
 
     prompts_query = Prompt.query
 
     # Filtrer par catégorie si sélectionnée
     if selected_category:
-        # Récupérer les IDs de la catégorie et de ses enfants
-        category_ids = [selected_category.id]
-        category_ids.extend([child.id for child in selected_category.
-                             get_all_children()])
-        prompts_query = (prompts_query.filter(
-            Prompt.category_id.
-            in_(category_ids)))
-
-    if tag:
-        prompts_query = prompts_query.filter(Prompt.tags.like(f'%{tag}%'))
-    if query:
-        prompts_query = prompts_query.filter(
-            (Prompt.prompt.contains(query))
-            | (Prompt.checkpoint.contains(query))
-            | (Prompt.loras.contains(query))
-        )
-
-    pagination = prompts_query.order_by(
-        Prompt.id.desc()).paginate(page=page,
-                                   per_page=current_app.config['IMG_PER_PAGE'])
+        # La catégorie et tous ses descendants, via la table de fermeture :
+        # la jointure parcourt l'index (category_id, id) de chaque
+        # sous-catégorie au lieu de toute la galerie dans l'ordre des id
+        prompts_query = prompts_query.join(
+            CategoryClosure,
+            CategoryClosure.descendant_id == Prompt.category_id).filter(
+                CategoryClosure.ancestor_id == selected_category.id)
+
+    if selected_tags:
+        prompts_query = TagService.filter_query(prompts_query, Prompt,
+                                                selected_tags)
+    if selected_loras:
+        prompts_query = LoraService.filter_query(prompts_query, Prompt,
+                                                 selected_loras)
+    sort_keys = [(Prompt.id, True)]
+    search = SearchService.search_subquery(query)
+    if search is not None:
+        # Recherche plein texte FTS5, triée par pertinence (BM25)
+        prompts_query = prompts_query.join(
+            search, search.c.prompt_id == Prompt.id)
+        sort_keys.insert(0, (search.c.rank, False))
+
+    count_key = (category_id, tuple(selected_tags), tuple(selected_loras),
+                 query or '')
+    return (prompts_query, sort_keys, count_key,
+            selected_category, selected_tags, selected_loras, query)
+
+
+@prompt_bp.route('/')
+@prompt_bp.route('/category/<int:category_id>')
+def index(category_id=None):
+
+    """
+    Route principale affichant la liste des prompts.
+    Prend en compte les filtres par tag ou par requête de recherche.
+    """
+    (prompts_query, sort_keys, count_key, selected_category,
+     selected_tags, selected_loras, query) = _prompt_listing(category_id)
+
+    try:
+        pagination = PaginationService.paginate(
+            prompts_query, sort_keys,
+            cursor=request.args.get('cursor'),
+            per_page=current_app.config['IMG_PER_PAGE'])
+    except ValueError:
+        # Curseur obsolète ou altéré : retour à la première page
+        pagination = PaginationService.paginate(
+            prompts_query, sort_keys,
+            per_page=current_app.config['IMG_PER_PAGE'])
+    pagination = pagination._replace(total=PaginationService.approximate_count(
+        prompts_query, count_key, current_app.config['PROMPT_COUNT_TTL']))
     prompts = pagination.items
 
-    all_tags = set(
-        tag.strip().lower()
-        for p in Prompt.query.all()
-        for tag in (p.tags or '').split(',')
-        if tag.strip()
-    )
+    all_tags = TagService.get_used_tags()
     # Récupérer l'arbre des catégories pour la sidebar
     category_tree = CategoryService.get_tree()
 
-    # Pré-calculer des compteurs pour éviter les .count()
+    # Pré-calculer les compteurs pour éviter les .count()
     # en cascade dans le template
-    category_prompt_counts = dict(
-        db.session.query(Prompt.category_id, func.count(Prompt.id))
-        .filter(Prompt.category_id.isnot(None))
-        .group_by(Prompt.category_id)
-        .all()
-    )
-    category_children_counts = dict(
-        db.session.query(Category.parent_id, func.count(Category.id))
-        .filter(Category.parent_id.isnot(None))
-        .group_by(Category.parent_id)
-        .all()
-    )
+    category_prompt_counts = CategoryService.get_prompt_counts()
 
     return render_template('index.html',
                            prompts=prompts,
-                           tags=sorted(all_tags),
-                           selected_tag=tag,
+                           tags=all_tags,
+                           selected_tags=selected_tags,
+                           selected_loras=selected_loras,
                            query=query or '',
                            pagination=pagination,
                            category_tree=category_tree,
                            category_prompt_counts=category_prompt_counts,
-                           category_children_counts=category_children_counts,
                            selected_category=selected_category,
                            app_version=__version__)
 
@@ -107,33 +139,30 @@ def view(prompt_id):
 
     prompt = Prompt.query.get_or_404(prompt_id)
     category_tree = CategoryService.get_tree()
-    category_prompt_counts = dict(
-        db.session.query(Prompt.category_id, func.count(Prompt.id))
-        .filter(Prompt.category_id.isnot(None))
-        .group_by(Prompt.category_id)
-        .all()
-    )
-    category_children_counts = dict(
-        db.session.query(Category.parent_id, func.count(Category.id))
-        .filter(Category.parent_id.isnot(None))
-        .group_by(Category.parent_id)
-        .all()
-    )
-    all_tags = set(
-        tag.strip().lower()
-        for p in Prompt.query.all()
-        for tag in (p.tags or '').split(',')
-        if tag.strip()
-    )
+    category_prompt_counts = CategoryService.get_prompt_counts()
+    all_tags = TagService.get_used_tags()
     return render_template('view.html',
                            prompt=prompt,
                            category_tree=category_tree,
                            category_prompt_counts=category_prompt_counts,
-                           category_children_counts=category_children_counts,
-                           tags=sorted(all_tags),
+                           tags=all_tags,
                            app_version=__version__)
 
 
+@prompt_bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(_exc):
+
+    """
+    Upload refusé car plus gros que ``MAX_CONTENT_LENGTH``.
+    """
+    message = ("❌ Fichier trop volumineux (> "
+               f"{taille_lisible(current_app.config['MAX_CONTENT_LENGTH'])}).")
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'error': message}), 413
+    flash(message, "error")
+    return redirect(request.path)
+
+
 @prompt_bp.route('/add', methods=['GET', 'POST'])
 def add():
 
@@ -155,30 +184,36 @@ def add():
                   "error")
             return redirect(url_for('.add'))
 
-        ext = os.path.splitext(image.filename)[1]
-        filename = secure_filename(f"{uuid.uuid4().hex}{ext}")
-        image.save(os.path.join(current_app.config['UPLOAD_FOLDER'],
-                                filename))
-        image_upload = ComfyUIImage(os.path.
-                                    join(current_app.config['UPLOAD_FOLDER'],
-                                         filename))
-        new_prompt = Prompt(prompt=image_upload.get_positive_prompt(),
-                            tags=tags_cleaned,
-                            image_filename=filename,
-                            seed=image_upload.get_seed(),
-                            steps=image_upload.get_steps(),
-                            checkpoint=image_upload.get_checkpoint(),
-                            loras=image_upload.get_loras(),
-                            neg_prompt=image_upload.get_negative_prompt(),
-                            cfg=image_upload.get_cfg(),
-                            prompt_raw=image_upload.get_prompt_raw(),
-                            sampler=image_upload.get_sampler(),
-                            scheduler=image_upload.get_scheduler(),
-                            category_id=categorie_id,
-                            )
-        db.session.add(new_prompt)
-        db.session.commit()
-        flash("Prompt ajouté avec succès.", "success")
+        # Format et métadonnées vérifiés pendant la réception : un fichier
+        # refusé n'entre pas dans le stockage
+        try:
+            texts = upload_metadata(image)
+            workflow = (ComfyUIImage.prompt_from_texts(texts)
+                        if texts is not None else None)
+        except ValueError as exc:
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'error': str(exc)}), 400
+            flash(str(exc), "error")
+            return redirect(url_for('.add'))
+
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        # Blob et job référençant le blob sont enregistrés sous le même
+        # verrou : une suppression concurrente ne peut pas s'intercaler
+        lock_storage()
+        filename, _, created = store_upload(upload_folder, image)
+        if created:
+            StatsService.record_upload(os.path.join(upload_folder, filename))
+
+        # Extraction des métadonnées, indexation et miniatures
+        # en arrière-plan
+        job = ingest_queue.submit(filename, tags_cleaned, categorie_id,
+                                  workflow)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(job.to_dict()), 202, {
+                'Location': url_for('.api_job', job_id=job.id)}
+
+        flash("Image reçue : le prompt apparaîtra dès la fin de son "
+              "traitement.", "success")
         return redirect(url_for('.index'))
 
     return render_template('add.html',
@@ -199,14 +234,29 @@ def edit(prompt_id):
     category_options = CategoryService.get_category_options()
     if request.method == 'POST':
         prompt.tags = clean_tags(request.form['tags'])
+        TagService.sync_prompt_tags(prompt)
         prompt.category_id = request.form['categorie']
 
         image = request.files['image']
         if image and allowed_file(image.filename):
-            filename = secure_filename(image.filename)
-            image.save(os.path.join(current_app.config['UPLOAD_FOLDER'],
-                                    filename))
+            # Nom tiré du contenu : aucune autre image ne peut être écrasée
+            upload_folder = current_app.config['UPLOAD_FOLDER']
+            lock_storage()
+            try:
+                filename, sha, created = store_upload(upload_folder, image)
+            except ValueError as exc:
+                flash(str(exc), "error")
+                return redirect(url_for('.edit', prompt_id=prompt.id))
+            if created:
+                StatsService.record_upload(os.path.join(upload_folder,
+                                                        filename))
+            previous = prompt.image_filename
             prompt.image_filename = filename
+            prompt.image_hash = sha
+            db.session.commit()
+            if previous != filename:
+                release_blob(current_app.config, previous)
+            _build_thumbnails(filename)
 
         db.session.commit()
         flash("Prompt modifié.", "success")
@@ -220,23 +270,104 @@ def edit(prompt_id):
 def delete(prompt_id):
 
     """
-    Supprime un prompt et son image associée (si présente).
+    Supprime un prompt et son image associée, si aucun autre prompt
+    ne la partage.
     :param prompt_id: ID du prompt à supprimer
     """
 
     prompt = Prompt.query.get_or_404(prompt_id)
-    if prompt.image_filename:
-        try:
-            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'],
-                                   prompt.image_filename))
-        except FileNotFoundError:
-            pass
+    filename = prompt.image_filename
     db.session.delete(prompt)
     db.session.commit()
+    release_blob(current_app.config, filename)
     flash("Prompt supprimé.", "info")
     return redirect(url_for('.index'))
 
 
+@prompt_bp.route('/thumbs/<int:size>/<path:filename>')
+def thumbnail(size, filename):
+
+    """
+    Sert la miniature d'une image, en la générant si elle n'existe pas encore.
+    :param size: Côté de la miniature (doit faire partie de THUMBNAIL_SIZES)
+    :param filename: Nom de l'image source dans le dossier d'upload
+    """
+
+    config = current_app.config
+    if size not in config['THUMBNAIL_SIZES']:
+        abort(404)
+
+    source = safe_join(config['UPLOAD_FOLDER'], filename)
+    if source is None:
+        abort(404)
+
+    name = thumbnail_name(filename, size, config['THUMBNAIL_FORMAT'])
+    if not os.path.exists(os.path.join(config['THUMB_FOLDER'], name)):
+        if not os.path.isfile(source):
+            abort(404)
+        try:
+            build_thumbnails(config, filename)
+        except OSError as exc:
+            # Source illisible (UnidentifiedImageError) ou écriture impossible
+            current_app.logger.warning("Miniature impossible pour %s : %s",
+                                       filename, exc)
+            abort(404)
+
+    response = send_from_directory(config['THUMB_FOLDER'], name,
+                                   max_age=30 * 24 * 3600)
+    if blob_hash(filename):
+        _cache_forever(response)
+    return response
+
+
+def _cache_forever(response):
+    """En-têtes de cache d'un fichier immuable : aucune revalidation"""
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+@prompt_bp.route('/media/<path:filename>')
+def media(filename):
+
+    """
+    Sert une image uploadée. Un blob (cf. storage.py) ne change jamais :
+    son empreinte sert d'ETag fort et il est mis en cache un an sans
+    revalidation. Requêtes conditionnelles et partielles (Range) sont gérées
+    par ``send_file``, qui transmet le fichier via ``wsgi.file_wrapper``
+    (sendfile sous gunicorn), ou laisse l'envoi au proxy frontal
+    (``USE_X_SENDFILE``, ``MEDIA_X_ACCEL_PREFIX``).
+    :param filename: Nom de l'image dans le dossier d'upload
+    """
+
+    config = current_app.config
+    sha = blob_hash(filename)
+    if sha and request.if_none_match.contains(sha):
+        # Revalidation sans même accéder au disque
+        response = current_app.response_class(status=304)
+        response.set_etag(sha)
+        return _cache_forever(response)
+
+    path = safe_join(config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if config['MEDIA_X_ACCEL_PREFIX']:
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['X-Accel-Redirect'] = (
+            f"{config['MEDIA_X_ACCEL_PREFIX'].rstrip('/')}/{filename}")
+        if sha:
+            response.set_etag(sha)
+    else:
+        response = send_file(path, etag=sha or True, conditional=True,
+                             max_age=IMMUTABLE_MAX_AGE if sha else None)
+    if sha:
+        _cache_forever(response)
+    return response
+
+
 # Route pour créer une nouvelle catégorie
 @prompt_bp.route('/categories/new', methods=['GET', 'POST'])
 def new_category():
@@ -249,14 +380,7 @@ def new_category():
             flash('Le nom de la catégorie est requis', 'error')
             return redirect(request.url)
 
-        category = Category(
-            name=name,
-            description=description,
-            parent_id=parent_id
-        )
-
-        db.session.add(category)
-        db.session.commit()
+        CategoryService.create_category(name, description, parent_id)
 
         flash(f'Catégorie "{name}" créée avec succès!', 'success')
         return redirect(url_for('prompt.manage_categories'))
@@ -276,10 +400,10 @@ def edit_category(category_id):
     if request.method == 'POST':
         category.name = request.form.get('name')
         category.description = request.form.get('description', '')
-        new_parent_id = request.form.get('parent_id') or None
+        new_parent_id = request.form.get('parent_id', type=int)
 
         # Vérifier si le changement de parent est valide
-        if new_parent_id and int(new_parent_id) != category.parent_id:
+        if new_parent_id != category.parent_id:
             try:
                 CategoryService.move_category(category.id, new_parent_id)
                 flash('Catégorie mise à jour avec succès!', 'success')
@@ -288,22 +412,14 @@ def edit_category(category_id):
                 return redirect(request.url)
         else:
             db.session.commit()
+            CategoryService.invalidate_tree()
             flash('Catégorie mise à jour avec succès!', 'success')
 
         return redirect(url_for('prompt.manage_categories'))
 
     # Exclure la catégorie elle-même et ses descendants des options parent
-    category_options = [('', '-- Aucune catégorie --')]
-
-    def add_valid_options(categories, level=0):
-        for cat in categories:
-            if cat.id != category.id and not category.is_ancestor_of(cat):
-                indent = "　" * level
-                category_options.append((cat.id, f"{indent}{cat.name}"))
-                add_valid_options(cat.children.all(), level + 1)
-
-    root_categories = Category.query.filter_by(parent_id=None).all()
-    add_valid_options(root_categories)
+    category_options = CategoryService.get_category_options(
+        exclude_id=category.id)
 
     return render_template('category_form.html',
                            category=category,
@@ -322,13 +438,12 @@ def delete_category(category_id):
 
     if prompts_count > 0 or children_count > 0:
         flash(
-            f'Impossible de supprimer "{category.name}": elle contient ' |
-            '{prompts_count} prompt(s) et {children_count} sous-catégorie(s)',
+            f'Impossible de supprimer "{category.name}": elle contient '
+            f'{prompts_count} prompt(s) et {children_count} sous-catégorie(s)',
             'error')
         return redirect(url_for('prompt.manage_categories'))
 
-    db.session.delete(category)
-    db.session.commit()
+    CategoryService.delete_category(category)
 
     flash(f'Catégorie "{category.name}" supprimée avec succès!', 'success')
     return redirect(url_for('prompt.manage_categories'))
@@ -340,8 +455,8 @@ def manage_categories():
     category_tree = CategoryService.get_tree()
     return render_template('manage_categories.html',
                            category_tree=category_tree,
-                           category_prompt_counts=dict(),
-                           category_children_counts=dict(),
+                           category_prompt_counts=CategoryService.
+                           get_prompt_counts(),
                            tags=[],
                            app_version=__version__)
 
@@ -351,7 +466,86 @@ def manage_categories():
 def api_categories_tree():
     root_categories = CategoryService.get_tree()
     tree = [CategoryService.build_tree_dict(cat) for cat in root_categories]
-    return jsonify(tree)
+    response = jsonify(tree)
+    # Le client revalide à chaque fois, mais reçoit un 304 si rien n'a changé
+    response.set_etag(CategoryService.get_tree_etag())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# API de liste des prompts (défilement infini, pagination par curseur)
+@prompt_bp.route('/api/prompts')
+def api_prompts():
+    (prompts_query, sort_keys, count_key,
+     *_) = _prompt_listing(request.args.get('category_id', type=int))
+    limit = min(max(request.args.get('limit', current_app.config['IMG_PER_PAGE'],
+                                     type=int), 1), 100)
+    try:
+        page = PaginationService.paginate(
+            prompts_query, sort_keys,
+            cursor=request.args.get('cursor'), per_page=limit)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    thumb_size = current_app.config['THUMBNAIL_SIZES'][0]
+    items = []
+    for prompt in page.items:
+        item = prompt.to_dict()
+        item['url'] = url_for('.view', prompt_id=prompt.id)
+        item['thumbnail'] = (url_for('.thumbnail', size=thumb_size,
+                                     filename=prompt.image_filename)
+                             if prompt.image_filename else None)
+        items.append(item)
+
+    data = {'items': items,
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor}
+    if page.next_cursor:
+        args = request.args.to_dict(flat=False)
+        args['cursor'] = page.next_cursor
+        data['next'] = url_for('.api_prompts', **args)
+    if request.args.get('total', type=int):
+        data['total'] = PaginationService.approximate_count(
+            prompts_query, count_key, current_app.config['PROMPT_COUNT_TTL'])
+    return jsonify(data)
+
+
+# API des LoRAs : usage, co-occurrences et histogramme des poids
+@prompt_bp.route('/api/loras')
+def api_loras():
+    return jsonify([{'name': name, 'count': count} for name, count
+                    in StatsService.counts(StatCounter.KIND_LORA)])
+
+
+@prompt_bp.route('/api/loras/<path:name>')
+def api_lora(name):
+    count = LoraService.usage_count(name)
+    if not count:
+        abort(404)
+    step = request.args.get('step', 0.1, type=float)
+    if not 0 < step <= 10:
+        step = 0.1
+    return jsonify({
+        'name': name,
+        'count': count,
+        'url': url_for('.index', lora=name),
+        'co_occurrences': [
+            {'name': other, 'count': common}
+            for other, common in LoraService.co_occurrences(name)],
+        'weights': [
+            {'weight': weight, 'count': n}
+            for weight, n in LoraService.weight_histogram(name, step)],
+    })
+
+
+# API pour suivre le traitement d'un upload
+@prompt_bp.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    job = db.get_or_404(IngestJob, job_id)
+    data = job.to_dict()
+    if job.prompt_id:
+        data['url'] = url_for('.view', prompt_id=job.prompt_id)
+    return jsonify(data)
 
 # -----------------------------------------------------------------------------------
 
@@ -359,72 +553,24 @@ def api_categories_tree():
 @prompt_bp.route('/statistiques')
 def statistiques():
 
-    # Recuperation des checkpoints
-    nbr_prompts = Prompt.query.count()
-
-    count_checkpoint = func.count(Prompt.checkpoint)
-
-    results_checkpoints = (
-        db.session.query(
-            Prompt.checkpoint,
-            count_checkpoint.label("count"),
-        )
-        .group_by(Prompt.checkpoint)
-        .order_by(func.count(Prompt.checkpoint).desc())
-    )
-    # Convertir en vrais tuples
-    results_checkpoints = [(r.checkpoint, r.count)
-                           for r in results_checkpoints]
-
-    # Recuperation des Loras
-    result_loras = db.session.query(Prompt.loras).all()
-
-    counter = Counter()
-    all_loras = []
-    for (loras_dict,) in result_loras:
-        if not loras_dict:
-            continue
-
-        counter.update(loras_dict.keys())
-
-        # recuperation pour le camembert
-        for k in loras_dict.keys():
-            all_loras.append(k)
-
-    loras_sorted = dict(sorted(counter.items(),
-                               key=lambda x: x[1],
-                               reverse=True))
-    results_loras = list(loras_sorted.items())
-
-    counter_loras = Counter(all_loras)
-    graph_loras_labels = list(counter_loras.keys())
-    graph_loras_values = list(counter_loras.values())
-
-    # Recuperation du nbr de tags
-    all_tags = db.session.query(Prompt.tags).all()
-
-    dict_tags = dict(sorted(
-        Counter(
-            t.strip()
-            for tag in all_tags
-            for p in tag
-            for t in p.split(",")
-        ).items(),
-        key=lambda x: x[1],
-        reverse=True))
-
-    results_tags = [(k, v) for k, v in dict_tags.items()]
-
-    # Récupération des informations pour l'affichage du camember
-    # pour les checkpoints
-    all_checkpoints = [c[0] for c in db.session.query(Prompt.checkpoint).all()]
-    counter_checkpoint = Counter(all_checkpoints)
-    graph_checkpoints_labels = list(counter_checkpoint.keys())
-    graph_checkpoints_values = list(counter_checkpoint.values())
-
-    # Recuperation de la taille du dossier des images
-    taille_upload_folder = taille_path(current_app.config['UPLOAD_FOLDER'])
-    # Recuperation de la taille de la bdd
+    # Compteurs pré-calculés (table stat_counters, tenue à jour en écriture)
+    nbr_prompts = StatsService.total_prompts()
+    results_checkpoints = StatsService.counts(StatCounter.KIND_CHECKPOINT)
+    results_loras = StatsService.counts(StatCounter.KIND_LORA)
+    results_tags = StatsService.counts(StatCounter.KIND_TAG)
+    results_samplers = StatsService.counts(StatCounter.KIND_SAMPLER)
+    results_schedulers = StatsService.counts(StatCounter.KIND_SCHEDULER)
+
+    # Récupération des informations pour l'affichage des camemberts
+    graph_checkpoints_labels = [c for c, _ in results_checkpoints]
+    graph_checkpoints_values = [n for _, n in results_checkpoints]
+    graph_loras_labels = [lora for lora, _ in results_loras]
+    graph_loras_values = [n for _, n in results_loras]
+
+    # Taille du dossier des images (compteur) et de la bdd
+    upload_bytes, _ = StatsService.upload_usage(
+        current_app.config['UPLOAD_FOLDER'])
+    taille_upload_folder = taille_lisible(upload_bytes)
     taille_bdd = taille_path(current_app.config['DB_PATH'])
 
     return render_template('statistiques.html',
@@ -432,9 +578,10 @@ def statistiques():
                            list_checkpoints=results_checkpoints,
                            loras=results_loras,
                            list_tags=results_tags,
+                           list_samplers=results_samplers,
+                           list_schedulers=results_schedulers,
                            category_tree=CategoryService.get_tree(),
                            category_prompt_counts=dict(),
-                           category_children_counts=dict(),
                            tags=[],
                            graph_checkpoints_labels=graph_checkpoints_labels,
                            graph_checkpoints_values=graph_checkpoints_values,
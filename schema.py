@@ -0,0 +1,77 @@
+"""
+Version du schéma de la base (révisions Alembic de ``migrations/``).
+Alembic et Flask-Migrate ne sont chargés que pour migrer réellement la
+base ou pour les commandes ``flask db`` : vérifier qu'elle est à jour se
+limite à lire une ligne et l'en-tête des scripts de migration.
+"""
+
+import os
+import re
+from functools import lru_cache
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'migrations')
+
+# Identifiants déclarés en tête de chaque script de migration
+REVISION_RE = re.compile(r"^(revision|down_revision)\s*=\s*(.+)$", re.M)
+REVISION_ID_RE = re.compile(r"['\"](\w+)['\"]")
+
+
+def current_revision():
+    """Révision appliquée à la base (None pour une base vide)"""
+    try:
+        return db.session.execute(
+            text("SELECT version_num FROM alembic_version")).scalar()
+    except OperationalError:
+        db.session.rollback()
+        return None
+
+
+@lru_cache(maxsize=None)
+def head_revision(directory=MIGRATIONS_DIR):
+    """
+    Dernière révision des scripts de migration, lue dans leurs en-têtes
+    sans charger Alembic.
+    :return: Identifiant de la révision, None s'il y a plusieurs têtes
+    """
+    revisions, parents = set(), set()
+    versions = os.path.join(directory, 'versions')
+    for name in os.listdir(versions):
+        if not name.endswith('.py'):
+            continue
+        with open(os.path.join(versions, name), encoding='utf-8') as f:
+            for key, value in REVISION_RE.findall(f.read()):
+                ids = REVISION_ID_RE.findall(value)
+                (revisions if key == 'revision' else parents).update(ids)
+    heads = revisions - parents
+    return heads.pop() if len(heads) == 1 else None
+
+
+def upgrade_database(app):
+    """Applique les migrations en attente (étape unique de démarrage)"""
+    # pylint: disable=import-outside-toplevel
+    from flask_migrate import upgrade
+    init_migrate(app)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+
+
+def ensure_schema(app):
+    """Migre la base seulement si elle n'est pas à la dernière révision"""
+    with app.app_context():
+        head = head_revision()
+        up_to_date = head is not None and current_revision() == head
+    if not up_to_date:
+        upgrade_database(app)
+
+
+def init_migrate(app):
+    """Branche Flask-Migrate sur l'application (commandes ``flask db``)"""
+    if 'migrate' in app.extensions:
+        return
+    # pylint: disable=import-outside-toplevel
+    from flask_migrate import Migrate
+    Migrate().init_app(app, db, directory=MIGRATIONS_DIR)
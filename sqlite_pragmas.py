@@ -0,0 +1,109 @@
+"""
+Réglages SQLite appliqués à chaque connexion (WAL, cache, mmap...) et
+maintenance périodique de la base (``PRAGMA optimize``, checkpoint du WAL).
+
+Les valeurs viennent de ``Config`` (variables d'environnement ``SQLITE_*``).
+"""
+
+import logging
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, text
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Pragmas appliqués à l'ouverture : (clé de configuration, pragma)
+CONNECT_PRAGMAS = (
+    ('SQLITE_BUSY_TIMEOUT', 'busy_timeout'),
+    ('SQLITE_JOURNAL_MODE', 'journal_mode'),
+    ('SQLITE_SYNCHRONOUS', 'synchronous'),
+    ('SQLITE_CACHE_SIZE', 'cache_size'),
+    ('SQLITE_MMAP_SIZE', 'mmap_size'),
+    ('SQLITE_TEMP_STORE', 'temp_store'),
+)
+
+
+def connect_pragmas(config):
+    """Liste des ``(pragma, valeur)`` configurés (``None`` : non appliqué)"""
+    return [(pragma, config[key]) for key, pragma in CONNECT_PRAGMAS
+            if config.get(key) not in (None, '')]
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Applique des pragmas à une connexion sqlite3 brute"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in pragmas:
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+    finally:
+        cursor.close()
+
+
+def run_maintenance(checkpoint='PASSIVE'):
+    """
+    ``PRAGMA optimize`` (mise à jour des statistiques utiles au
+    planificateur) puis checkpoint du WAL.
+    :return: résultat du checkpoint (busy, pages du WAL, pages recopiées)
+    """
+    db.session.execute(text("PRAGMA optimize"))
+    result = db.session.execute(
+        text(f"PRAGMA wal_checkpoint({checkpoint})")).fetchone()
+    db.session.commit()
+    return tuple(result) if result else None
+
+
+class SQLiteMaintenance:
+    """
+    Thread de maintenance lancé à la première requête de chaque processus
+    (les threads ne survivent pas au ``fork`` des workers).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        """Branche les pragmas de connexion et la maintenance sur ``app``"""
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            return
+
+        pragmas = connect_pragmas(app.config)
+
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):  # pylint: disable=unused-argument
+            apply_pragmas(dbapi_connection, pragmas)
+
+        app.extensions['sqlite_maintenance'] = {'pid': None}
+        if app.config.get('SQLITE_MAINTENANCE_INTERVAL'):
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        app = current_app._get_current_object()  # pylint: disable=protected-access
+        state = app.extensions['sqlite_maintenance']
+        if state['pid'] == os.getpid():
+            return
+        with self.lock:
+            if state['pid'] == os.getpid():
+                return
+            state['pid'] = os.getpid()
+            threading.Thread(target=self._loop, args=(app,),
+                             name="sqlite-maintenance", daemon=True).start()
+
+    @staticmethod
+    def _loop(app):
+        interval = app.config['SQLITE_MAINTENANCE_INTERVAL']
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    result = run_maintenance()
+                logger.info("Maintenance SQLite : checkpoint %s", result)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Maintenance SQLite impossible")
+
+
+sqlite_maintenance = SQLiteMaintenance()
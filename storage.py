@@ -0,0 +1,390 @@
+"""Stockage des images uploadées, adressé par leur contenu"""
+
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from flask import Request, current_app
+from sqlalchemy import func, select, text
+from models import db, Prompt, IngestJob
+from thumbnails import remove_thumbnails, thumbnail_name
+from utils import (PNG_SIGNATURE, PngTextParser, StatsService, allowed_file,
+                   file_sha256, taille_lisible)
+
+# Nom d'un blob : deux niveaux de sous-dossiers tirés de l'empreinte
+# (256 × 256 dossiers) pour qu'aucun dossier ne contienne des milliers
+# de fichiers, ex. « 3f/a2/3fa2…e9.png »
+BLOB_RE = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(\.\w+)?$')
+
+# Signatures des formats acceptés (cf. ALLOWED_EXTENSIONS) : PNG, JPEG, GIF
+IMAGE_SIGNATURES = (PNG_SIGNATURE, b'\xff\xd8\xff', b'GIF87a', b'GIF89a')
+SNIFF_SIZE = len(PNG_SIGNATURE)
+
+
+def blob_name(sha, ext=''):
+    """
+    Chemin relatif (au dossier d'upload) du blob d'une empreinte.
+    :param sha: Empreinte SHA-256 hexadécimale du contenu
+    :param ext: Extension conservée pour le type MIME servi
+    """
+    return f"{sha[:2]}/{sha[2:4]}/{sha}{ext.lower()}"
+
+
+def blob_hash(filename):
+    """Empreinte contenue dans un nom de blob (None pour un ancien nom)"""
+    match = BLOB_RE.match(filename or '')
+    return match.group(3) if match else None
+
+
+def store_file(upload_folder, path, move=False, sha=None):
+    """
+    Range un fichier dans le stockage. Un contenu déjà présent n'est pas
+    recopié : le blob existant est réutilisé.
+    :param path: Fichier à stocker
+    :param move: Déplace le fichier au lieu de le copier
+    :param sha: Empreinte du fichier si elle est déjà connue
+    :return: (nom du blob, empreinte, True si le blob vient d'être créé)
+    """
+    sha = sha or file_sha256(path)
+    filename = blob_name(sha, os.path.splitext(path)[1])
+    target = os.path.join(upload_folder, filename)
+    if os.path.exists(target):
+        if move:
+            os.remove(path)
+        return filename, sha, False
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if move:
+        os.replace(path, target)
+    else:
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+    return filename, sha, True
+
+
+class UploadSink:
+    """
+    Réception d'un fichier uploadé, utilisée par le parseur multipart de
+    Werkzeug à la place de son fichier temporaire (cf. ``UploadRequest``).
+    Chaque bloc est compté, haché et analysé (signature, chunks texte PNG)
+    à son arrivée : un fichier refusé cesse d'être écrit, et un fichier
+    accepté est déjà dans le dossier d'upload, prêt à devenir un blob.
+    """
+
+    def __init__(self, upload_folder, ext='', max_size=None):
+        self.upload_folder = upload_folder
+        self.ext = ext.lower()
+        self.max_size = max_size
+        self.path = None
+        self.size = 0
+        self.sha = hashlib.sha256()
+        self.png = None
+        self.error = None
+        self._head = b''
+        self._file = None
+
+    def write(self, data):
+        """Reçoit un bloc d'octets"""
+        if self.error:
+            return len(data)
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self._reject("❌ Fichier trop volumineux "
+                         f"(> {taille_lisible(self.max_size)}).")
+            return len(data)
+
+        chunk = data
+        if self._file is None:
+            # Rien n'est écrit avant d'avoir reconnu le format
+            self._head += data
+            if len(self._head) < SNIFF_SIZE:
+                return len(data)
+            if not self._head.startswith(IMAGE_SIGNATURES):
+                self._reject("❌ Format d'image non reconnu.")
+                return len(data)
+            if self._head.startswith(PNG_SIGNATURE):
+                self.png = PngTextParser()
+            self.path = os.path.join(self.upload_folder,
+                                     f".{uuid.uuid4().hex}{self.ext}")
+            self._file = open(self.path, 'w+b')  # pylint: disable=consider-using-with
+            chunk, self._head = self._head, b''
+
+        if self.png is not None and not self.png.complete:
+            try:
+                self.png.feed(chunk)
+            except ValueError as exc:
+                self._reject(str(exc))
+                return len(data)
+        self.sha.update(chunk)
+        self._file.write(chunk)
+        return len(data)
+
+    def _reject(self, error):
+        self.error = error
+        self.close()
+
+    def seek(self, offset, whence=0):
+        """Interface fichier attendue par ``FileStorage``"""
+        return self._file.seek(offset, whence) if self._file else 0
+
+    def read(self, size=-1):
+        """Interface fichier attendue par ``FileStorage``"""
+        return self._file.read(size) if self._file else b''
+
+    def finish(self):
+        """
+        Termine la réception et valide le fichier.
+        :return: Métadonnées texte ({clé: texte}) lues au vol pour un PNG,
+                 None pour un autre format
+        :raises ValueError: Si le fichier est refusé
+        """
+        if self._file is None and not self.error:
+            self._reject("❌ Format d'image non reconnu.")
+        if self.error:
+            raise ValueError(self.error)
+        if self.png is None:
+            return None
+        try:
+            return self.png.close()
+        except ValueError as exc:
+            self._reject(str(exc))
+            raise
+
+    def store(self):
+        """
+        Déplace le fichier reçu sous son blob (sans recopie ni relecture).
+        :return: (nom du blob, empreinte, True si le blob vient d'être créé)
+        """
+        self.finish()
+        self._file.close()
+        sha = self.sha.hexdigest()
+        filename = blob_name(sha, self.ext)
+        target = os.path.join(self.upload_folder, filename)
+        created = not os.path.exists(target)
+        if created:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(self.path, target)
+        else:
+            os.remove(self.path)
+        self.path = None
+        return filename, sha, created
+
+    def close(self):
+        """Ferme la réception ; le fichier non stocké est supprimé"""
+        if self._file is not None:
+            self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class UploadRequest(Request):
+    """
+    Requête dont les images envoyées sont reçues directement par une
+    ``UploadSink`` (limitée à ``MAX_CONTENT_LENGTH``) au lieu d'être d'abord
+    copiées dans un fichier temporaire.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        if not filename or not allowed_file(filename):
+            return super()._get_file_stream(total_content_length,
+                                            content_type, filename,
+                                            content_length)
+        sink = UploadSink(current_app.config['UPLOAD_FOLDER'],
+                          os.path.splitext(filename)[1],
+                          max_size=current_app.config['MAX_CONTENT_LENGTH'])
+        self.__dict__.setdefault('_upload_sinks', []).append(sink)
+        return sink
+
+    def close(self):
+        super().close()
+        # Fichiers d'une requête interrompue ou refusée
+        for sink in self.__dict__.get('_upload_sinks', ()):
+            sink.close()
+
+
+def upload_metadata(upload):
+    """
+    Valide un fichier reçu avant son stockage.
+    :param upload: ``FileStorage`` de la requête
+    :return: Métadonnées texte lues pendant la réception (PNG), ou None si
+             elles restent à lire sur le disque
+    :raises ValueError: Si le fichier est refusé
+    """
+    if isinstance(upload.stream, UploadSink):
+        return upload.stream.finish()
+    return None
+
+
+def store_upload(upload_folder, upload):
+    """
+    Enregistre un fichier reçu (``FileStorage``) dans le stockage.
+    :return: (nom du blob, empreinte, True si le blob vient d'être créé)
+    :raises ValueError: Si le fichier est refusé
+    """
+    if isinstance(upload.stream, UploadSink):
+        return upload.stream.store()
+    ext = os.path.splitext(upload.filename or '')[1]
+    tmp_path = os.path.join(upload_folder, f".{uuid.uuid4().hex}{ext}")
+    upload.save(tmp_path)
+    try:
+        return store_file(upload_folder, tmp_path, move=True)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def blob_refcount(filename):
+    """
+    Nombre de références à un blob : prompts qui l'affichent et jobs
+    d'ingestion pas encore terminés.
+    """
+    prompts = db.session.scalar(
+        select(func.count()).select_from(Prompt)
+        .where(Prompt.image_filename == filename))
+    jobs = db.session.scalar(
+        select(func.count()).select_from(IngestJob)
+        .where(IngestJob.image_filename == filename,
+               IngestJob.status.in_((IngestJob.STATUS_PENDING,
+                                     IngestJob.STATUS_RUNNING))))
+    return prompts + jobs
+
+
+def lock_storage():
+    """
+    Prend le verrou d'écriture de SQLite jusqu'au prochain commit ou
+    rollback. À appeler avant de stocker un blob qui va être référencé :
+    entre threads comme entre processus, l'enregistrement de la référence
+    et la suppression d'un blob (``release_blob``) ne peuvent pas
+    s'entrelacer.
+    """
+    db.session.execute(text("UPDATE stat_counters SET count = count WHERE 0"))
+
+
+def release_blob(config, filename):
+    """
+    Supprime un blob et ses miniatures s'il n'est plus référencé. À appeler
+    après le commit qui retire la référence ; le décompte est refait sous
+    le verrou d'écriture, puis la suppression est validée.
+    :return: True si le blob a été supprimé
+    """
+    if not filename:
+        return False
+    lock_storage()
+    if blob_refcount(filename):
+        db.session.rollback()
+        return False
+    path = os.path.join(config['UPLOAD_FOLDER'], filename)
+    StatsService.record_upload(path, sign=-1)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    remove_thumbnails(config['THUMB_FOLDER'], filename,
+                      config['THUMBNAIL_SIZES'], config['THUMBNAIL_FORMAT'])
+    db.session.commit()
+    return True
+
+
+def _link_or_copy(source, target):
+    """Crée ``target`` sans toucher à ``source`` (lien physique si possible)"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+
+
+def _move_thumbnails(config, old, new):
+    """Renomme les miniatures d'une image plutôt que de les régénérer"""
+    for size in config['THUMBNAIL_SIZES']:
+        source = os.path.join(config['THUMB_FOLDER'], thumbnail_name(
+            old, size, config['THUMBNAIL_FORMAT']))
+        target = os.path.join(config['THUMB_FOLDER'], thumbnail_name(
+            new, size, config['THUMBNAIL_FORMAT']))
+        if not os.path.exists(source):
+            continue
+        if os.path.exists(target):
+            os.remove(source)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+
+
+def migrate_uploads(config, batch_size=200, workers=None, progress=None):
+    """
+    Convertit le dossier d'upload au stockage par empreinte : chaque ancien
+    fichier est haché, rangé sous son blob (les doublons partagent le même),
+    et les prompts sont repointés. Pour chaque lot, les blobs sont créés
+    puis la base est validée avant la suppression des anciens fichiers :
+    une interruption ne laisse aucun prompt sans image et la commande peut
+    simplement être relancée.
+    :param progress: Callback ``progress(stats)`` appelé après chaque lot
+    :return: Dictionnaire de statistiques
+    """
+    upload_folder = config['UPLOAD_FOLDER']
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(upload_folder)
+        for name in names
+        if allowed_file(name) and not name.startswith('.')
+        and not blob_hash(os.path.relpath(os.path.join(root, name),
+                                          upload_folder).replace(os.sep, '/'))
+    )
+    stats = {'found': len(paths), 'processed': 0, 'blobs': 0,
+             'duplicates': 0, 'prompts': 0, 'bytes_freed': 0}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = pool.map(file_sha256, paths)
+        iterator = zip(paths, hashes)
+        while chunk := list(islice(iterator, batch_size)):
+            moves = []
+            for path, sha in chunk:
+                old = os.path.relpath(path, upload_folder).replace(os.sep, '/')
+                new = blob_name(sha, os.path.splitext(path)[1])
+                target = os.path.join(upload_folder, new)
+                if os.path.exists(target):
+                    stats['duplicates'] += 1
+                    stats['bytes_freed'] += os.path.getsize(path)
+                else:
+                    _link_or_copy(path, target)
+                    stats['blobs'] += 1
+                stats['prompts'] += db.session.execute(
+                    Prompt.__table__.update()
+                    .where(Prompt.image_filename == old)
+                    .values(image_filename=new, image_hash=sha)).rowcount
+                db.session.execute(
+                    IngestJob.__table__.update()
+                    .where(IngestJob.image_filename == old)
+                    .values(image_filename=new))
+                moves.append((path, old, new))
+            db.session.commit()
+
+            for path, old, new in moves:
+                os.remove(path)
+                _move_thumbnails(config, old, new)
+            stats['processed'] += len(chunk)
+            if progress:
+                progress(stats)
+
+    # Empreinte des prompts restaurés sans elle (sauvegardes antérieures) :
+    # elle est contenue dans le nom de leur blob
+    db.session.execute(
+        Prompt.__table__.update()
+        .where(Prompt.image_hash.is_(None),
+               Prompt.image_filename.op('GLOB')(
+                   '[0-9a-f][0-9a-f]/[0-9a-f][0-9a-f]/*'))
+        .values(image_hash=func.substr(Prompt.image_filename, 7, 64)))
+    StatsService.rebuild_storage(upload_folder)
+    db.session.commit()
+    return stats
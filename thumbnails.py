@@ -0,0 +1,98 @@
+"""Génération des miniatures (carrées) utilisées par la galerie"""
+
+import os
+import uuid
+
+# Extension de fichier selon le format de miniature configuré
+THUMBNAIL_EXTENSIONS = {'webp': '.webp', 'jpeg': '.jpg'}
+
+
+def thumbnail_name(filename, size, fmt='webp'):
+    """
+    Chemin relatif de la miniature d'une image.
+    :param filename: Nom (relatif au dossier d'upload) de l'image source
+    :param size: Côté de la miniature en pixels
+    :param fmt: Format de la miniature ('webp' ou 'jpeg')
+    :return: Chemin relatif au dossier des miniatures
+    """
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(str(size), stem + THUMBNAIL_EXTENSIONS[fmt])
+
+
+def generate_thumbnails(source_path, thumb_folder, filename, sizes,
+                        fmt='webp', quality=80, force=False):
+    """
+    Génère les miniatures d'une image pour chacune des tailles demandées.
+    L'image est recadrée au centre, comme le fait ``object-fit: cover``
+    dans la grille, puis réduite.
+    :return: Liste des miniatures (chemins absolus) créées
+    """
+    targets = {
+        size: os.path.join(thumb_folder, thumbnail_name(filename, size, fmt))
+        for size in sizes
+    }
+    if not force:
+        targets = {size: path for size, path in targets.items()
+                   if not os.path.exists(path)}
+    if not targets:
+        return []
+
+    # Pillow n'est chargé qu'à la première miniature générée
+    from PIL import Image, ImageOps  # pylint: disable=import-outside-toplevel
+
+    created = []
+    with Image.open(source_path) as img:
+        # Décodage JPEG réduit directement à la plus grande taille utile
+        img.draft('RGB', (max(targets), max(targets)))
+        img = ImageOps.exif_transpose(img)
+        mode = 'RGBA' if fmt == 'webp' and img.has_transparency_data else 'RGB'
+        if img.mode != mode:
+            img = img.convert(mode)
+
+        options = {'quality': quality}
+        if fmt == 'webp':
+            options['method'] = 4
+        else:
+            options['optimize'] = True
+
+        for size in sorted(targets, reverse=True):
+            path = targets[size]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            thumb = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+            # Nom temporaire propre à chaque écrivain : la route ``thumbnail``
+            # et le traitement d'un upload peuvent générer la même miniature
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                thumb.save(tmp_path, format=fmt.upper(), **options)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            created.append(path)
+    return created
+
+
+def remove_thumbnails(thumb_folder, filename, sizes, fmt='webp'):
+    """Supprime les miniatures d'une image (si présentes)"""
+    for size in sizes:
+        try:
+            os.remove(os.path.join(thumb_folder,
+                                   thumbnail_name(filename, size, fmt)))
+        except FileNotFoundError:
+            pass
+
+
+def build_thumbnails(config, filename, force=False):
+    """
+    Génère les miniatures d'une image uploadée selon la configuration
+    de l'application (``THUMBNAIL_SIZES``, ``THUMBNAIL_FORMAT``...).
+    """
+    return generate_thumbnails(
+        os.path.join(config['UPLOAD_FOLDER'], filename),
+        config['THUMB_FOLDER'],
+        filename,
+        config['THUMBNAIL_SIZES'],
+        fmt=config['THUMBNAIL_FORMAT'],
+        quality=config['THUMBNAIL_QUALITY'],
+        force=force,
+    )
@@ -1,22 +1,211 @@
 """Liste des fonctions utilitaires de l'application"""
 
 from config import ALLOWED_EXTENSIONS
-from models import db, Category
+from models import (db, Category, CategoryClosure, Prompt, PromptLora,
+                    StatCounter, Tag, prompt_tags)
+import base64
+import hashlib
 import json
-from PIL import Image
+import os
+from collections import namedtuple
+import re
+import struct
+import time
+import zlib
+from flask import current_app
 from pathlib import Path
+from sqlalchemy import and_, or_, func, select, text, table, column
+from sqlalchemy.orm import aliased
+from workflows import LORA_LOADERS, get_dispatch, model_name
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Chunks texte contenant les métadonnées ComfyUI / A1111
+PNG_TEXT_KEYS = ('prompt', 'parameters', 'workflow')
+
+
+def decode_png_text_chunk(chunk_type, data):
+    """
+    Décode un chunk texte PNG (tEXt, zTXt ou iTXt).
+    :return: (clé, texte)
+    :raises ValueError: Si le texte compressé est corrompu
+    """
+    key, _, rest = data.partition(b'\0')
+    key = key.decode('latin-1')
+    try:
+        if chunk_type == b'tEXt':
+            return key, rest.decode('latin-1')
+        if chunk_type == b'zTXt':
+            return key, zlib.decompress(rest[1:]).decode('latin-1')
+
+        # iTXt : drapeau de compression, méthode, langue, mot-clé traduit,
+        # texte
+        compressed = rest[:1] == b'\1'
+        _, _, rest = rest[2:].partition(b'\0')
+        _, _, text_data = rest.partition(b'\0')
+        if compressed:
+            text_data = zlib.decompress(text_data)
+        return key, text_data.decode('utf-8')
+    except zlib.error as exc:
+        raise ValueError(f"❌ Chunk {chunk_type.decode('latin-1')} "
+                         f"« {key} » corrompu.") from exc
+
+
+def read_png_text_chunks(source, keys=PNG_TEXT_KEYS, stop_key='prompt'):
+    """
+    Lit les chunks texte d'un PNG sans décoder l'image : le fichier est
+    parcouru chunk par chunk et les données des autres chunks (IDAT...)
+    sont sautées sans être lues.
+    :param source: Chemin ou fichier binaire ouvert
+    :param keys: Clés des chunks texte à décoder
+    :param stop_key: Arrête la lecture dès que cette clé a été trouvée
+    :return: Dictionnaire {clé: texte}, ou None si ce n'est pas un PNG
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as f:
+            return read_png_text_chunks(f, keys, stop_key)
+
+    if source.read(8) != PNG_SIGNATURE:
+        return None
+
+    texts = {}
+    wanted = {key.encode('latin-1') for key in keys}
+    while True:
+        header = source.read(8)
+        if len(header) < 8:
+            raise ValueError("❌ Fichier PNG tronqué.")
+        length, chunk_type = struct.unpack('>I4s', header)
+
+        if chunk_type == b'IEND':
+            break
+        if chunk_type in (b'tEXt', b'zTXt', b'iTXt'):
+            data = source.read(length)
+            source.seek(4, 1)  # CRC
+            if data.partition(b'\0')[0] in wanted:
+                key, value = decode_png_text_chunk(chunk_type, data)
+                texts[key] = value
+                if key == stop_key:
+                    break
+        else:
+            source.seek(length + 4, 1)
+    return texts
+
+
+class PngTextParser:
+    """
+    Version incrémentale de ``read_png_text_chunks`` : les octets sont
+    fournis au fil de leur réception (``feed``), sans jamais conserver
+    autre chose que le chunk texte en cours. Les données des autres chunks
+    sont seulement comptées.
+    """
+
+    def __init__(self, keys=PNG_TEXT_KEYS, stop_key='prompt'):
+        self.wanted = {key.encode('latin-1') for key in keys}
+        self.stop_key = stop_key
+        self.texts = {}
+        # Signature lue et valide / IEND ou ``stop_key`` atteint
+        self.is_png = None
+        self.complete = False
+        self._state = 'signature'
+        self._need = len(PNG_SIGNATURE)
+        self._buffer = bytearray()
+        self._skip = 0
+        self._chunk_type = None
+
+    def feed(self, data):
+        """
+        Analyse un bloc d'octets.
+        :raises ValueError: Si le fichier n'est pas un PNG
+        """
+        view = memoryview(data)
+        pos = 0
+        while pos < len(view) and not self.complete:
+            if self._skip:
+                step = min(self._skip, len(view) - pos)
+                self._skip -= step
+                pos += step
+                continue
+            take = min(self._need - len(self._buffer), len(view) - pos)
+            self._buffer += view[pos:pos + take]
+            pos += take
+            if len(self._buffer) == self._need:
+                token = bytes(self._buffer)
+                self._buffer.clear()
+                self._handle(token)
+
+    def _handle(self, token):
+        if self._state == 'signature':
+            self.is_png = token == PNG_SIGNATURE
+            if not self.is_png:
+                raise ValueError("❌ Le fichier n'est pas un PNG.")
+            self._state, self._need = 'header', 8
+        elif self._state == 'header':
+            length, chunk_type = struct.unpack('>I4s', token)
+            if chunk_type == b'IEND':
+                self.complete = True
+            elif chunk_type in (b'tEXt', b'zTXt', b'iTXt'):
+                self._state, self._need = 'text', length
+                self._chunk_type = chunk_type
+            else:
+                self._skip = length + 4  # données + CRC
+        else:
+            if token.partition(b'\0')[0] in self.wanted:
+                key, value = decode_png_text_chunk(self._chunk_type, token)
+                self.texts[key] = value
+                self.complete = key == self.stop_key
+            self._state, self._need = 'header', 8
+            self._skip = 4  # CRC
+
+    def close(self):
+        """
+        Termine l'analyse.
+        :return: Dictionnaire {clé: texte}
+        :raises ValueError: Si le PNG est tronqué
+        """
+        if not self.complete:
+            raise ValueError("❌ Fichier PNG tronqué.")
+        return self.texts
+
+
+# Métadonnées extraites d'une image, dans l'ordre des colonnes de Prompt
+ComfyUIMetadata = namedtuple("ComfyUIMetadata", [
+    "prompt", "seed", "steps", "checkpoint", "loras", "neg_prompt", "cfg",
+    "prompt_raw", "sampler", "scheduler",
+])
 
 
 class ComfyUIImage:
-    def __init__(self, image_path):
+    # Inputs indexés à la construction (cf. ``get_value``)
+    INDEXED_INPUTS = frozenset((
+        "seed", "noise_seed", "steps", "cfg", "sampler_name", "scheduler",
+        "positive", "negative",
+    ))
+
+    def __init__(self, image_path=None, prompt=None):
         self.image_path = image_path
-        self.prompt = self._extract_prompt()
-        self.workflow_type = self._detect_workflow()
+        self.prompt = prompt if prompt is not None else self._extract_prompt()
+        self._index_nodes()
 
     def _extract_prompt(self):
         """Extrait le JSON du champ 'prompt' dans les métadonnées PNG"""
-        img = Image.open(self.image_path)
-        raw = img.info.get("prompt") or img.info.get("parameters")
+        info = read_png_text_chunks(self.image_path)
+        if info is None:
+            # JPEG / WebP : lecture des métadonnées par Pillow (chargé
+            # seulement dans ce cas)
+            from PIL import Image  # pylint: disable=import-outside-toplevel
+            with Image.open(self.image_path) as img:
+                info = img.info
+        return self.prompt_from_texts(info)
+
+    @staticmethod
+    def prompt_from_texts(info):
+        """
+        Décode le JSON du champ 'prompt' (ou 'parameters') des métadonnées
+        texte d'une image.
+        :param info: Dictionnaire {clé: texte}
+        """
+        raw = info.get("prompt") or info.get("parameters")
         if not raw:
             raise ValueError("❌ Aucun champ 'prompt' trouvé dans l'image.")
         try:
@@ -25,19 +214,67 @@ class ComfyUIImage:
         except json.JSONDecodeError:
             raise ValueError("❌ Impossible de décoder le JSON du champ 'prompt'.")
 
-    def _detect_workflow(self):
-        """Détecte le type de workflow utilisé."""
+    def _index_nodes(self):
+        """
+        Parcourt le graphe une seule fois pour : indexer les nœuds par
+        class_type, relever la première valeur scalaire des inputs utiles,
+        les LoRAs, puis détecter le workflow et extraire ses champs
+        via la table de dispatch du registre (cf. ``workflows``).
+        """
+        names, fields_table, detect_table, default = get_dispatch()
+        self.nodes_by_class = {}
+        self.values = {}
+        self.lora_stack = []
+        self.lora_nodes = []
+        detected = set()
+        found = {}
 
-        class_types = {
-            node.get("class_type")
-            for node in self.prompt.values()
+        for node in self.prompt.values():
+            if not isinstance(node, dict):
+                continue
+            class_type = node.get("class_type")
+            self.nodes_by_class.setdefault(class_type, []).append(node)
+
+            inputs = node.get("inputs") or {}
+            for key in self.INDEXED_INPUTS.intersection(inputs):
+                if key not in self.values:
+                    value = inputs[key]
+                    if not isinstance(value, list):
+                        self.values[key] = value
+
+            # Pile de LoRAs (lora_name_1, model_weight_1, lora_name_2...)
+            if "lora_name_1" in inputs:
+                for key, value in inputs.items():
+                    if key.startswith("lora_name_"):
+                        index = key.split("_")[-1]
+                        self.lora_stack.append(
+                            (value, inputs.get(f"model_weight_{index}")))
+            elif class_type in LORA_LOADERS:
+                self.lora_nodes.append(node)
+
+            if class_type in detect_table:
+                detected.update(detect_table[class_type])
+
+            for workflow, field, priority, spec in fields_table.get(
+                    class_type, ()):
+                value = inputs.get(spec.input_key)
+                if value is None or isinstance(value, list):
+                    continue
+                if spec.title and spec.title not in node.get(
+                        "_meta", {}).get("title", ""):
+                    continue
+                current = found.get((workflow, field))
+                if current is None or priority < current[0]:
+                    found[(workflow, field)] = (priority, value, spec)
+
+        workflow = min(detected) if detected else default
+        self.workflow_type = names[workflow] if workflow is not None else None
+        self.fields = {
+            field: spec.transform(value) if spec.transform else value
+            for (index, field), (_, value, spec) in found.items()
+            if index == workflow
         }
 
-        if "UNETLoader" in class_types:
-            return "anima"
-        else:
-            return "illustrious"
-
     @property
     def is_illustrious(self):
         return self.workflow_type == "illustrious"
@@ -50,17 +287,11 @@ class ComfyUIImage:
     # Helpers
     #
     def find_node(self, class_type):
-        for node in self.prompt.values():
-            if node.get("class_type") == class_type:
-                return node
-        return None
+        nodes = self.nodes_by_class.get(class_type)
+        return nodes[0] if nodes else None
 
     def find_nodes(self, class_type):
-        return [
-            node
-            for node in self.prompt.values()
-            if node.get("class_type") == class_type
-        ]
+        return self.nodes_by_class.get(class_type, [])
 
     def get_input(self, node, key, default=None):
         if not node:
@@ -68,13 +299,14 @@ class ComfyUIImage:
         return node.get("inputs", {}).get(key, default)
 
     def get_value(self, value):
-        """Cherche une clé dans tous les nœuds du prompt (inputs seulement)"""
-        for key, node in self.prompt.items():
-            if value in list(node["inputs"].keys()):
-                inputs = node.get("inputs", {})
+        """Première valeur scalaire de l'input ``value`` dans le graphe"""
+        if value in self.INDEXED_INPUTS:
+            return self.values.get(value)
 
-                if value in inputs and not isinstance(inputs[value], list):
-                    return inputs[value]
+        for node in self.prompt.values():
+            inputs = node.get("inputs", {})
+            if value in inputs and not isinstance(inputs[value], list):
+                return inputs[value]
 
         return None
 
@@ -91,82 +323,44 @@ class ComfyUIImage:
     # Prompts
     #
     def get_positive_prompt(self):
-
-        # Workflow Illustrious
-        prompt = self.get_value("positive")
-        if isinstance(prompt, str):
-            return prompt
-
-        # Workflow Anima
-        for node in self.find_nodes("CLIPTextEncode"):
-            title = node.get("_meta", {}).get("title", "")
-            if "Positive" in title:
-                return self.get_input(node, "text")
-
-        return None
+        prompt = self.fields.get("prompt")
+        if prompt is None:
+            prompt = self.get_value("positive")
+        return prompt if isinstance(prompt, str) else None
 
     def get_negative_prompt(self):
-
-        # Workflow Illustrious
-        prompt = self.get_value("negative")
-        if isinstance(prompt, str):
-            return prompt
-
-        # Workflow Anima
-        for node in self.find_nodes("CLIPTextEncode"):
-            title = node.get("_meta", {}).get("title", "")
-            if "Negative" in title:
-                return self.get_input(node, "text")
-
-        return None
+        prompt = self.fields.get("neg_prompt")
+        if prompt is None:
+            prompt = self.get_value("negative")
+        return prompt if isinstance(prompt, str) else None
 
     def get_seed(self):
-        seed_temp = self.get_value("seed")
+        seed_temp = self.fields.get("seed", self.get_value("seed"))
         if seed_temp is not None:
             return seed_temp
         else:
             return self.get_value("noise_seed")
 
     def get_cliploader(self):
-        node = self.find_node("CLIPLoader")
-        if node:
-            cliploader = self.get_input(node,"clip_name")
-            return cliploader
-
-        return None
+        return self.fields.get("clip")
 
     def get_steps(self):
-        return self.get_value("steps")
-    
+        return self.fields.get("steps", self.get_value("steps"))
+
     def get_cfg(self):
-        return self.get_value("cfg")
-    
+        return self.fields.get("cfg", self.get_value("cfg"))
+
     def get_sampler(self):
-        return self.get_value("sampler_name")
-    
+        return self.fields.get("sampler", self.get_value("sampler_name"))
+
     def get_scheduler(self):
-        return self.get_value("scheduler")
+        return self.fields.get("scheduler", self.get_value("scheduler"))
 
     #
     # Checkpoint
     #
     def get_checkpoint(self):
-
-        # Illustrious
-        node = self.find_node("Eff. Loader SDXL")
-        if node:
-            checkpoint = self.get_input(node, "base_ckpt_name")
-            if checkpoint:
-                return checkpoint.split("/")[-1].replace(".safetensors", "")
-
-        # Anima
-        node = self.find_node("UNETLoader")
-        if node:
-            checkpoint = self.get_input(node, "unet_name")
-            if checkpoint:
-                return checkpoint.split("/")[-1].replace(".safetensors", "")
-
-        return None
+        return self.fields.get("checkpoint")
 
     #
     # LoRAs
@@ -174,97 +368,692 @@ class ComfyUIImage:
     def get_loras(self):
         loras = {}
 
-        # Format CR LoRA Stack (Illustrious)
-        for node in self.prompt.values():
-            inputs = node.get("inputs", {})
+        # Format pile de LoRAs (CR LoRA Stack, Illustrious)
+        for value, weight in self.lora_stack:
 
-            for key, value in inputs.items():
+            if not isinstance(value, str) or value == "None":
+                continue
 
-                if not key.startswith("lora_name_"):
-                    continue
+            loras[model_name(value)] = weight
 
-                index = key.split("_")[-1]
+        # Chargeurs unitaires (LoraLoaderModelOnly pour Anima, LoraLoader)
+        for node in self.lora_nodes:
+            name_key, weight_key = LORA_LOADERS[node.get("class_type")]
+            name = self.get_input(node, name_key)
 
-                if not value or value == "None":
-                    continue
+            if not isinstance(name, str) or not name:
+                continue
 
-                name = value.split("/")[-1].replace(".safetensors", "")
-                weight = inputs.get(f"model_weight_{index}")
+            loras[model_name(name)] = self.get_input(node, weight_key, 1.0)
 
-                loras[name] = weight
+        return loras or None
 
-        # Format LoraLoaderModelOnly (Anima)
-        for node in self.find_nodes("LoraLoaderModelOnly"):
+    def get_prompt_raw(self):
+        return self.prompt
 
-            name = self.get_input(node, "lora_name")
+    def extract(self):
+        """Extrait l'ensemble des métadonnées depuis l'index des nœuds"""
+        return ComfyUIMetadata(
+            prompt=self.get_positive_prompt(),
+            seed=self.get_seed(),
+            steps=self.get_steps(),
+            checkpoint=self.get_checkpoint(),
+            loras=self.get_loras(),
+            neg_prompt=self.get_negative_prompt(),
+            cfg=self.get_cfg(),
+            prompt_raw=self.get_prompt_raw(),
+            sampler=self.get_sampler(),
+            scheduler=self.get_scheduler(),
+        )
 
-            if not name:
-                continue
+    def get_metadata(self):
+        """Retourne les métadonnées extraites, indexées par colonne de Prompt"""
+        return self.extract()._asdict()
 
-            name = name.split("/")[-1].replace(".safetensors", "")
 
-            loras[name] = self.get_input(
-                node,
-                "strength_model",
-                1.0
-            )
+class CategoryService:
 
-        return loras or None
+    # Arbre en mémoire partagé par les requêtes du processus :
+    # (chargé_le, génération, arbre, etag). La génération est incrémentée à
+    # chaque écriture pour ne jamais remettre en cache un arbre périmé.
+    _tree_cache = None
+    _tree_generation = 0
 
-    def get_prompt_raw(self):
-        return self.prompt
+    @staticmethod
+    def _load_tree():
+        """Charge toutes les catégories en une requête et assemble l'arbre"""
+        rows = db.session.execute(
+            select(Category.id, Category.name, Category.description,
+                   Category.parent_id).order_by(Category.id)).all()
+
+        nodes = {row.id: {'id': row.id,
+                          'name': row.name,
+                          'description': row.description,
+                          'parent_id': row.parent_id,
+                          'children': []}
+                 for row in rows}
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node['parent_id'])
+            (parent['children'] if parent else roots).append(node)
+        return roots
 
+    @staticmethod
+    def _cached_tree():
+        cache = CategoryService._tree_cache
+        ttl = current_app.config.get('CATEGORY_TREE_TTL', 60)
+        if (cache is None
+                or cache[1] != CategoryService._tree_generation
+                or time.monotonic() - cache[0] > ttl):
+            generation = CategoryService._tree_generation
+            tree = CategoryService._load_tree()
+            etag = hashlib.sha1(json.dumps(tree, sort_keys=True)
+                                .encode("utf-8")).hexdigest()
+            cache = (time.monotonic(), generation, tree, etag)
+            if generation == CategoryService._tree_generation:
+                CategoryService._tree_cache = cache
+        return cache
 
-class CategoryService:
+    @staticmethod
+    def invalidate_tree():
+        """À appeler après chaque écriture validée sur les catégories"""
+        CategoryService._tree_generation += 1
+        CategoryService._tree_cache = None
 
     @staticmethod
     def get_tree():
-        """Retourne l'arbre des catégories"""
-        root_categories = Category.query.filter_by(parent_id=None).all()
-        return root_categories
+        """
+        Retourne l'arbre des catégories (noeuds ``dict`` avec ``children``).
+        Les noeuds sont partagés entre requêtes : ne pas les modifier.
+        """
+        return CategoryService._cached_tree()[2]
+
+    @staticmethod
+    def get_tree_etag():
+        """ETag de la version en cache de l'arbre"""
+        return CategoryService._cached_tree()[3]
+
+    @staticmethod
+    def get_prompt_counts():
+        """Nombre de prompts par catégorie, en une requête"""
+        return dict(
+            db.session.query(Prompt.category_id, func.count(Prompt.id))
+            .filter(Prompt.category_id.isnot(None))
+            .group_by(Prompt.category_id)
+            .all()
+        )
 
     @staticmethod
     def build_tree_dict(category):
         """Construit un dictionnaire récursif pour l'arbre"""
         return {
-            'id': category.id,
-            'name': category.name,
-            'description': category.description,
+            'id': category['id'],
+            'name': category['name'],
+            'description': category['description'],
             'children': [CategoryService.build_tree_dict(child)
-                         for child in category.children.all()]
+                         for child in category['children']]
         }
 
     @staticmethod
-    def get_category_options():
-        """Retourne les options pour les formulaires (avec indentation)"""
+    def get_category_options(exclude_id=None):
+        """
+        Retourne les options pour les formulaires (avec indentation).
+        ``exclude_id`` retire une catégorie et tout son sous-arbre.
+        """
         options = [('', '-- Aucune catégorie --')]
 
         def add_category_options(categories, level=0):
             for category in categories:
+                if category['id'] == exclude_id:
+                    continue
                 # Caractère d'espacement japonais pour l'indentation
                 indent = "　" * level
-                options.append((category.id, f"{indent}{category.name}"))
-                add_category_options(category.children.all(), level + 1)
+                options.append((category['id'], f"{indent}{category['name']}"))
+                add_category_options(category['children'], level + 1)
 
-        root_categories = Category.query.filter_by(parent_id=None).all()
-        add_category_options(root_categories)
+        add_category_options(CategoryService.get_tree())
 
         return options
 
+    @staticmethod
+    def create_category(name, description='', parent_id=None):
+        """Crée une catégorie et ses chemins dans la table de fermeture"""
+        category = Category(name=name,
+                            description=description,
+                            parent_id=parent_id)
+        db.session.add(category)
+        db.session.flush()
+
+        db.session.execute(text(
+            "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+            "SELECT ancestor_id, :id, depth + 1 FROM category_closure "
+            "WHERE descendant_id = :parent_id "
+            "UNION ALL SELECT :id, :id, 0"
+        ), {"id": category.id, "parent_id": parent_id})
+        db.session.commit()
+        CategoryService.invalidate_tree()
+        return category
+
     @staticmethod
     def move_category(category_id, new_parent_id):
         """Déplace une catégorie (avec vérification de boucles)"""
-        category = Category.query.get(category_id)
-        new_parent = Category.query.get(new_parent_id) if new_parent_id else None
+        category = db.session.get(Category, category_id)
+        new_parent = (db.session.get(Category, new_parent_id)
+                      if new_parent_id else None)
 
         # Vérifier qu'on ne crée pas de boucle
         if new_parent and (new_parent.id == category.id or category.is_ancestor_of(new_parent)):
             raise ValueError("Impossible de déplacer : cela créerait une boucle")
 
-        category.parent_id = new_parent_id
+        # Détache le sous-arbre de ses anciens ancêtres...
+        params = {"id": category.id,
+                  "parent_id": new_parent.id if new_parent else None}
+        db.session.execute(text(
+            "DELETE FROM category_closure "
+            "WHERE descendant_id IN (SELECT descendant_id FROM category_closure"
+            " WHERE ancestor_id = :id) "
+            "AND ancestor_id IN (SELECT ancestor_id FROM category_closure"
+            " WHERE descendant_id = :id AND ancestor_id <> :id)"
+        ), params)
+        # ... et le rattache aux ancêtres du nouveau parent
+        db.session.execute(text(
+            "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+            "SELECT above.ancestor_id, below.descendant_id, "
+            "above.depth + below.depth + 1 "
+            "FROM category_closure above, category_closure below "
+            "WHERE above.descendant_id = :parent_id "
+            "AND below.ancestor_id = :id"
+        ), params)
+
+        category.parent_id = params["parent_id"]
         db.session.commit()
+        CategoryService.invalidate_tree()
         return True
 
+    @staticmethod
+    def delete_category(category):
+        """Supprime une catégorie (sans enfant) et ses chemins"""
+        db.session.execute(
+            CategoryClosure.__table__.delete().where(
+                (CategoryClosure.ancestor_id == category.id)
+                | (CategoryClosure.descendant_id == category.id)))
+        db.session.delete(category)
+        db.session.commit()
+        CategoryService.invalidate_tree()
+
+    @staticmethod
+    def rebuild_closure():
+        """Reconstruit entièrement la table de fermeture depuis ``parent_id``"""
+        db.session.execute(CategoryClosure.__table__.delete())
+        db.session.execute(text(
+            "WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS ("
+            " SELECT id, id, 0 FROM categories"
+            " UNION ALL"
+            " SELECT tree.ancestor_id, categories.id, tree.depth + 1"
+            " FROM tree JOIN categories"
+            " ON categories.parent_id = tree.descendant_id"
+            " WHERE tree.depth < 1000"
+            ") INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+            "SELECT ancestor_id, descendant_id, depth FROM tree"
+        ))
+
+
+class TagService:
+
+    # Découpe la colonne ``prompts.tags`` (chaîne séparée par des virgules)
+    # en couples (prompt_id, tag) directement dans SQLite.
+    SPLIT_TAGS_SQL = """
+        WITH RECURSIVE split(prompt_id, tag, rest) AS (
+            SELECT id, '', tags || ',' FROM prompts WHERE tags IS NOT NULL
+            UNION ALL
+            SELECT prompt_id,
+                   lower(trim(substr(rest, 1, instr(rest, ',') - 1))),
+                   substr(rest, instr(rest, ',') + 1)
+            FROM split WHERE rest <> ''
+        )
+        SELECT DISTINCT prompt_id, tag FROM split WHERE tag <> ''
+    """
+
+    @staticmethod
+    def split_tags(tag_string):
+        """Retourne la liste ordonnée et sans doublon des tags d'une chaîne"""
+        names = []
+        for tag in (tag_string or '').split(','):
+            tag = tag.strip().lower()
+            if tag and tag not in names:
+                names.append(tag)
+        return names
+
+    @staticmethod
+    def sync_prompt_tags(prompt):
+        """Met à jour l'index des tags d'un prompt depuis ``prompt.tags``"""
+        names = TagService.split_tags(prompt.tags)
+        existing = {
+            tag.name: tag
+            for tag in Tag.query.filter(Tag.name.in_(names)).all()
+        } if names else {}
+
+        missing = [name for name in names if name not in existing]
+        if missing:
+            # INSERT OR IGNORE : un autre worker d'ingestion peut créer
+            # le même tag au même moment
+            db.session.execute(text("INSERT OR IGNORE INTO tags (name) "
+                                    "VALUES (:name)"),
+                               [{"name": name} for name in missing])
+            existing.update(
+                (tag.name, tag)
+                for tag in Tag.query.filter(Tag.name.in_(missing)))
+        prompt.tag_items = [existing[name] for name in names]
+
+    @staticmethod
+    def get_used_tags():
+        """Retourne les noms des tags utilisés par au moins un prompt"""
+        used = select(prompt_tags.c.tag_id).where(
+            prompt_tags.c.tag_id == Tag.id).exists()
+        return [name for (name,) in
+                db.session.query(Tag.name).filter(used).order_by(Tag.name)]
+
+    @staticmethod
+    def get_tag_counts():
+        """Retourne [(tag, nombre de prompts)] trié par fréquence"""
+        count = func.count(prompt_tags.c.prompt_id)
+        return (
+            db.session.query(Tag.name, count)
+            .join(prompt_tags, prompt_tags.c.tag_id == Tag.id)
+            .group_by(Tag.id)
+            .order_by(count.desc(), Tag.name)
+            .all()
+        )
+
+    @staticmethod
+    def prompt_ids_with_tags(names):
+        """Sous-requête des ids de prompts portant au moins un de ces tags"""
+        return (
+            select(prompt_tags.c.prompt_id)
+            .join(Tag, Tag.id == prompt_tags.c.tag_id)
+            .where(Tag.name.in_(names))
+        )
+
+    @staticmethod
+    def parse_tag_filters(tag_args):
+        """
+        Analyse les paramètres ``?tag=`` :
+        ``tag=a&tag=b`` (ET), ``tag=a|b`` (OU), ``tag=-a`` (SAUF).
+        :return: (liste de groupes OU à inclure, tags à exclure)
+        """
+        include, exclude = [], []
+        for arg in tag_args:
+            arg = (arg or '').strip()
+            if arg.startswith('-'):
+                exclude.extend(TagService.split_tags(arg[1:].replace('|', ',')))
+                continue
+            names = TagService.split_tags(arg.replace('|', ','))
+            if names:
+                include.append(names)
+        return include, exclude
+
+    @staticmethod
+    def filter_query(query, model, tag_args):
+        """Applique les filtres de tags exacts à une requête sur les prompts"""
+        include, exclude = TagService.parse_tag_filters(tag_args)
+        for names in include:
+            query = query.filter(
+                model.id.in_(TagService.prompt_ids_with_tags(names)))
+        if exclude:
+            query = query.filter(
+                model.id.notin_(TagService.prompt_ids_with_tags(exclude)))
+        return query
+
+    @staticmethod
+    def rebuild():
+        """Reconstruit entièrement l'index des tags depuis ``prompts.tags``"""
+        db.session.execute(prompt_tags.delete())
+        db.session.execute(text(
+            "INSERT OR IGNORE INTO tags (name) "
+            f"SELECT DISTINCT tag FROM ({TagService.SPLIT_TAGS_SQL})"
+        ))
+        db.session.execute(text(
+            "INSERT INTO prompt_tags (prompt_id, tag_id) "
+            f"SELECT s.prompt_id, t.id FROM ({TagService.SPLIT_TAGS_SQL}) s "
+            "JOIN tags t ON t.name = s.tag"
+        ))
+        db.session.execute(text(
+            "DELETE FROM tags WHERE id NOT IN "
+            "(SELECT tag_id FROM prompt_tags)"
+        ))
+
+
+class LoraService:
+    """Requêtes sur la table normalisée ``prompt_loras``"""
+
+    @staticmethod
+    def prompt_ids_with_lora(name):
+        """Sous-requête des ids de prompts utilisant ce LoRA"""
+        return select(PromptLora.prompt_id).where(PromptLora.lora_name == name)
+
+    @staticmethod
+    def filter_query(query, model, names):
+        """Ne garde que les prompts utilisant tous les LoRAs ``names``"""
+        for name in names:
+            query = query.filter(
+                model.id.in_(LoraService.prompt_ids_with_lora(name)))
+        return query
+
+    @staticmethod
+    def usage_count(name):
+        """Nombre de prompts utilisant ce LoRA"""
+        return db.session.query(func.count(PromptLora.prompt_id)).filter(
+            PromptLora.lora_name == name).scalar()
+
+    @staticmethod
+    def co_occurrences(name, limit=20):
+        """Retourne [(LoRA, nombre de prompts communs)] avec ce LoRA"""
+        other = aliased(PromptLora)
+        count = func.count(other.prompt_id)
+        return (
+            db.session.query(other.lora_name, count)
+            .join(PromptLora, PromptLora.prompt_id == other.prompt_id)
+            .filter(PromptLora.lora_name == name, other.lora_name != name)
+            .group_by(other.lora_name)
+            .order_by(count.desc(), other.lora_name)
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def weight_histogram(name, step=0.1):
+        """
+        Retourne [(poids, nombre)] des poids utilisés avec ce LoRA, arrondis
+        au multiple de ``step`` le plus proche (poids inconnu : ``None``).
+        """
+        bucket = func.cast(func.round(PromptLora.weight / step), db.Integer)
+        rows = (
+            db.session.query(bucket, func.count(PromptLora.prompt_id))
+            .filter(PromptLora.lora_name == name)
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        return [(None if index is None else round(index * step, 6), count)
+                for index, count in rows]
+
+    @staticmethod
+    def rebuild():
+        """Reconstruit entièrement ``prompt_loras`` depuis ``prompts.loras``"""
+        db.session.execute(PromptLora.__table__.delete())
+        db.session.execute(text(
+            "INSERT INTO prompt_loras (prompt_id, lora_name, weight) "
+            "SELECT prompts.id, j.key, CASE WHEN j.type IN ('integer', 'real') "
+            "THEN j.value END FROM prompts, json_each(prompts.loras) j "
+            "WHERE typeof(j.key) = 'text'"
+        ))
+
+
+class StatsService:
+    """
+    Lecture et reconstruction des compteurs de ``stat_counters``.
+    Les compteurs de prompts sont tenus à jour par des triggers SQL ;
+    l'occupation du dossier d'upload l'est par les routes qui écrivent ou
+    suppriment des fichiers (``record_upload``).
+    """
+
+    # Recalcul complet des compteurs issus des tables (hors ``storage``)
+    REBUILD_SQL = (
+        "INSERT INTO stat_counters (kind, key, count) "
+        "SELECT 'total', 'prompts', count(*) FROM prompts",
+        "INSERT INTO stat_counters (kind, key, count) "
+        "SELECT 'checkpoint', coalesce(checkpoint, ''), count(*) FROM prompts "
+        "GROUP BY coalesce(checkpoint, '')",
+        "INSERT INTO stat_counters (kind, key, count) "
+        "SELECT 'sampler', coalesce(sampler, ''), count(*) FROM prompts "
+        "GROUP BY coalesce(sampler, '')",
+        "INSERT INTO stat_counters (kind, key, count) "
+        "SELECT 'scheduler', coalesce(scheduler, ''), count(*) FROM prompts "
+        "GROUP BY coalesce(scheduler, '')",
+        "INSERT INTO stat_counters (kind, key, count) "
+        "SELECT 'lora', j.key, count(*) FROM prompts, json_each(prompts.loras) j "
+        "WHERE typeof(j.key) = 'text' GROUP BY j.key",
+        "INSERT INTO stat_counters (kind, key, count) "
+        "SELECT 'tag', tags.name, count(*) FROM prompt_tags "
+        "JOIN tags ON tags.id = prompt_tags.tag_id GROUP BY tags.id",
+    )
+
+    @staticmethod
+    def counts(kind):
+        """Retourne [(clé, nombre)] d'un type de compteur, par fréquence"""
+        rows = (db.session.query(StatCounter.key, StatCounter.count)
+                .filter(StatCounter.kind == kind, StatCounter.count > 0)
+                .order_by(StatCounter.count.desc(), StatCounter.key))
+        # La clé '' représente les prompts sans valeur (NULL)
+        return [(key or None, count) for key, count in rows]
+
+    @staticmethod
+    def total_prompts():
+        """Nombre total de prompts"""
+        return db.session.query(StatCounter.count).filter_by(
+            kind=StatCounter.KIND_TOTAL, key='prompts').scalar() or 0
+
+    @staticmethod
+    def upload_usage(upload_folder):
+        """
+        Retourne (octets, fichiers) du dossier d'upload. Le dossier n'est
+        parcouru que si les compteurs n'existent pas encore.
+        """
+        usage = dict(db.session.query(StatCounter.key, StatCounter.count)
+                     .filter_by(kind=StatCounter.KIND_STORAGE))
+        if 'bytes' not in usage or 'files' not in usage:
+            usage = StatsService.rebuild_storage(upload_folder)
+            db.session.commit()
+        return usage['bytes'], usage['files']
+
+    @staticmethod
+    def record_upload(path, sign=1):
+        """
+        Ajoute (``sign=1``) ou retire (``sign=-1``) un fichier des compteurs
+        d'occupation, à appeler après l'écriture ou avant la suppression du
+        fichier. Sans effet tant que les compteurs ne sont pas initialisés.
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        db.session.execute(text(
+            "UPDATE stat_counters SET count = count + :sign * "
+            "CASE key WHEN 'bytes' THEN :size ELSE 1 END "
+            "WHERE kind = 'storage'"
+        ), {"sign": sign, "size": size})
+
+    @staticmethod
+    def rebuild_storage(upload_folder):
+        """Recompte le dossier d'upload (parcours complet des fichiers)"""
+        files = [f for f in Path(upload_folder).rglob('*') if f.is_file()]
+        usage = {'bytes': sum(f.stat().st_size for f in files),
+                 'files': len(files)}
+        db.session.execute(StatCounter.__table__.delete().where(
+            StatCounter.kind == StatCounter.KIND_STORAGE))
+        db.session.add_all(StatCounter(kind=StatCounter.KIND_STORAGE,
+                                       key=key, count=count)
+                           for key, count in usage.items())
+        db.session.flush()
+        return usage
+
+    @staticmethod
+    def rebuild():
+        """Recalcule les compteurs issus des prompts et des tags"""
+        db.session.execute(StatCounter.__table__.delete().where(
+            StatCounter.kind != StatCounter.KIND_STORAGE))
+        for sql in StatsService.REBUILD_SQL:
+            db.session.execute(text(sql))
+
+
+class SearchService:
+
+    # Table virtuelle FTS5 ``prompts_fts`` (rowid = prompts.id), maintenue par
+    # des triggers SQLite (cf. migration ``search_fts``).
+    fts = table("prompts_fts", column("rowid"), column("rank"))
+
+    TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+    @staticmethod
+    def build_match_query(query):
+        """
+        Convertit la saisie utilisateur en requête FTS5 :
+        les mots sont cherchés par préfixe, les "expressions entre
+        guillemets" comme des phrases exactes.
+        :return: Chaîne MATCH ou None si la saisie est vide
+        """
+        terms = []
+        for phrase, word in SearchService.TOKEN_RE.findall(query or ''):
+            if phrase.strip():
+                terms.append('"' + phrase.strip().replace('"', '""') + '"')
+            elif word.strip('"*'):
+                terms.append('"' + word.strip('"*').replace('"', '""') + '"*')
+        return ' '.join(terms) or None
+
+    @staticmethod
+    def search_subquery(query):
+        """
+        Sous-requête (prompt_id, rank) des prompts correspondant à la
+        recherche, ``rank`` étant le score BM25 (plus petit = plus pertinent).
+        """
+        match = SearchService.build_match_query(query)
+        if match is None:
+            return None
+        fts = SearchService.fts
+        return (
+            select(fts.c.rowid.label("prompt_id"), fts.c.rank.label("rank"))
+            .where(text("prompts_fts MATCH :match").bindparams(match=match))
+            .subquery()
+        )
+
+    @staticmethod
+    def rebuild():
+        """Reconstruit entièrement l'index plein texte depuis ``prompts``"""
+        db.session.execute(text("DELETE FROM prompts_fts"))
+        db.session.execute(text(
+            "INSERT INTO prompts_fts (rowid, prompt, neg_prompt, checkpoint, "
+            "loras) SELECT id, prompt, neg_prompt, checkpoint, "
+            "CASE WHEN json_valid(loras) THEN "
+            "(SELECT group_concat(key, ' ') FROM json_each(prompts.loras)) END "
+            "FROM prompts"
+        ))
+
+
+KeysetPage = namedtuple(
+    'KeysetPage', ['items', 'next_cursor', 'prev_cursor', 'total'])
+
+
+class PaginationService:
+    """
+    Pagination par clé (keyset) : au lieu d'un ``OFFSET``, chaque page
+    reprend après la clé de tri de la dernière ligne vue, transmise au client
+    dans un curseur opaque. Le coût d'une page ne dépend pas de sa position.
+    """
+
+    # Totaux approximatifs : {clé du filtre: (calculé_le, total)}
+    _count_cache = {}
+    COUNT_CACHE_MAX = 256
+
+    @staticmethod
+    def encode_cursor(values, direction='next'):
+        """Curseur opaque (base64 url) contenant la clé de tri et le sens"""
+        payload = json.dumps({'k': list(values), 'd': direction},
+                             separators=(',', ':'))
+        return base64.urlsafe_b64encode(
+            payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor, size):
+        """
+        Décode un curseur ; lève ``ValueError`` s'il est invalide ou ne
+        correspond pas au tri courant (``size`` clés attendues).
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            values, direction = data['k'], data['d']
+        except (ValueError, TypeError, KeyError) as exc:
+            raise ValueError("Curseur invalide") from exc
+        if (not isinstance(values, list) or len(values) != size
+                or direction not in ('next', 'prev')):
+            raise ValueError("Curseur invalide")
+        # Seuls des scalaires peuvent être liés dans la requête SQL
+        if any(isinstance(value, bool)
+               or not isinstance(value, (int, float, str))
+               for value in values):
+            raise ValueError("Curseur invalide")
+        return values, direction
+
+    @staticmethod
+    def _seek(sort_keys, values, forward):
+        """Condition « après la clé ``values`` » dans l'ordre lexicographique"""
+        conditions = []
+        for i, ((expr, descending), value) in enumerate(zip(sort_keys, values)):
+            after = expr < value if descending == forward else expr > value
+            conditions.append(and_(*[e == v for (e, _), v
+                                     in zip(sort_keys[:i], values[:i])],
+                                   after))
+        return or_(*conditions)
+
+    @staticmethod
+    def paginate(query, sort_keys, cursor=None, per_page=20):
+        """
+        Retourne une ``KeysetPage`` de ``query``.
+
+        :param sort_keys: liste de ``(expression, décroissant)`` formant une
+            clé unique (terminer par la clé primaire)
+        :param cursor: curseur reçu du client (``None`` pour la 1re page)
+        """
+        forward, values = True, None
+        if cursor:
+            values, direction = PaginationService.decode_cursor(
+                cursor, len(sort_keys))
+            forward = direction == 'next'
+
+        query = query.add_columns(*[expr for expr, _ in sort_keys])
+        if values is not None:
+            query = query.filter(
+                PaginationService._seek(sort_keys, values, forward))
+        query = query.order_by(*[
+            expr.desc() if descending == forward else expr.asc()
+            for expr, descending in sort_keys])
+
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if not forward:
+            rows.reverse()
+
+        items = [row[0] for row in rows]
+        if not rows:
+            return KeysetPage(items, None, None, None)
+
+        has_next = has_more if forward else True
+        has_prev = values is not None if forward else has_more
+        first, last = tuple(rows[0][1:]), tuple(rows[-1][1:])
+        return KeysetPage(
+            items,
+            PaginationService.encode_cursor(last, 'next') if has_next else None,
+            PaginationService.encode_cursor(first, 'prev') if has_prev else None,
+            None)
+
+    @staticmethod
+    def approximate_count(query, key, ttl=30):
+        """
+        Nombre de lignes de ``query``, mis en cache ``ttl`` secondes par
+        ``key`` (le total affiché peut donc être légèrement en retard).
+        """
+        cache = PaginationService._count_cache
+        cached = cache.get(key)
+        if cached and time.monotonic() - cached[0] <= ttl:
+            return cached[1]
+
+        total = query.order_by(None).count()
+        if len(cache) >= PaginationService.COUNT_CACHE_MAX:
+            cache.clear()
+        cache[key] = (time.monotonic(), total)
+        return total
+
 
 def allowed_file(filename):
     """
@@ -277,6 +1066,19 @@ def allowed_file(filename):
             in ALLOWED_EXTENSIONS)
 
 
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Calcule l'empreinte SHA-256 d'un fichier, lu par blocs.
+    :param path: Chemin du fichier
+    :return: Empreinte hexadécimale
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
 def clean_tags(tag_string):
     """
     Enlève pour chaque tag les espaces avant et apres
@@ -301,10 +1103,14 @@ def taille_path(path, lisible=True):
     if not lisible:
         return taille
 
-    # Format lisible
+    return taille_lisible(taille)
+
+
+def taille_lisible(taille):
+    """Formate une taille en octets (ex: ``1.50 Mo``)"""
     for unite in ['o', 'Ko', 'Mo', 'Go', 'To', 'Po']:
         if taille < 1024:
             return f"{taille:.2f} {unite}"
         taille /= 1024
 
-    return f"{taille:.2f} Po"
\ No newline at end of file
+    return f"{taille:.2f} Po"
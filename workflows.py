@@ -0,0 +1,110 @@
+"""
+Registre des workflows ComfyUI supportés.
+
+Chaque workflow est décrit de façon déclarative : les class_types qui
+permettent de le reconnaître et, pour chaque champ extrait, la liste des
+(class_type, input, filtre sur le titre, transformation) où le lire.
+Le registre est compilé une fois en une table de dispatch indexée par
+class_type, ce qui permet à ``ComfyUIImage`` de détecter le workflow et
+d'extraire ses champs en un seul parcours du graphe, quel que soit le
+nombre de workflows enregistrés.
+"""
+
+from collections import namedtuple
+
+# Emplacement d'un champ : input ``input_key`` des nœuds ``class_type``
+# (dont le titre contient ``title`` si précisé), converti par ``transform``
+FieldSpec = namedtuple("FieldSpec",
+                       ["class_type", "input_key", "title", "transform"],
+                       defaults=[None, None])
+
+# Chargeurs de LoRA : class_type -> (input du nom, input du poids)
+LORA_LOADERS = {
+    "LoraLoaderModelOnly": ("lora_name", "strength_model"),
+    "LoraLoader": ("lora_name", "strength_model"),
+}
+
+
+def model_name(value):
+    """Nom court d'un modèle (sans dossier ni extension .safetensors)"""
+    return value.split("/")[-1].replace(".safetensors", "")
+
+
+_workflows = []
+_dispatch = None
+
+
+def register_workflow(name, detect, fields):
+    """
+    Enregistre un workflow. Les workflows sont testés dans l'ordre
+    d'enregistrement ; celui dont ``detect`` est vide sert de défaut.
+    :param name: Nom du workflow (``ComfyUIImage.workflow_type``)
+    :param detect: class_types dont la présence identifie le workflow
+    :param fields: {champ: [FieldSpec, ...]} par ordre de priorité
+    """
+    global _dispatch  # pylint: disable=global-statement
+    _workflows.append((name, tuple(detect), fields))
+    _dispatch = None
+
+
+def get_dispatch():
+    """
+    Compile (une fois) le registre en table de dispatch.
+    :return: (noms des workflows,
+              {class_type: [(n° workflow, champ, priorité, FieldSpec)]},
+              {class_type: [n° des workflows détectés]},
+              n° du workflow par défaut)
+    """
+    global _dispatch  # pylint: disable=global-statement
+    if _dispatch is None:
+        names, fields_table, detect_table, default = [], {}, {}, None
+        for index, (name, detect, fields) in enumerate(_workflows):
+            names.append(name)
+            if not detect and default is None:
+                default = index
+            for class_type in detect:
+                detect_table.setdefault(class_type, []).append(index)
+            for field, specs in fields.items():
+                for priority, spec in enumerate(specs):
+                    fields_table.setdefault(spec.class_type, []).append(
+                        (index, field, priority, spec))
+        _dispatch = (names, fields_table, detect_table, default)
+    return _dispatch
+
+
+register_workflow(
+    "anima",
+    detect=["UNETLoader"],
+    fields={
+        "checkpoint": [FieldSpec("UNETLoader", "unet_name",
+                                 transform=model_name)],
+        "prompt": [FieldSpec("CLIPTextEncode", "text", title="Positive")],
+        "neg_prompt": [FieldSpec("CLIPTextEncode", "text", title="Negative")],
+        "clip": [FieldSpec("CLIPLoader", "clip_name")],
+    },
+)
+
+register_workflow(
+    "sdxl",
+    detect=["CheckpointLoaderSimple"],
+    fields={
+        "checkpoint": [FieldSpec("CheckpointLoaderSimple", "ckpt_name",
+                                 transform=model_name)],
+        "prompt": [FieldSpec("CLIPTextEncode", "text", title="Positive")],
+        "neg_prompt": [FieldSpec("CLIPTextEncode", "text", title="Negative")],
+    },
+)
+
+register_workflow(
+    "illustrious",
+    detect=[],
+    fields={
+        "checkpoint": [FieldSpec("Eff. Loader SDXL", "base_ckpt_name",
+                                 transform=model_name)],
+        "prompt": [FieldSpec("Eff. Loader SDXL", "positive")],
+        "neg_prompt": [FieldSpec("Eff. Loader SDXL", "negative")],
+        "seed": [FieldSpec("KSampler SDXL (Eff.)", "noise_seed")],
+        "steps": [FieldSpec("KSampler SDXL (Eff.)", "steps")],
+        "cfg": [FieldSpec("KSampler SDXL (Eff.)", "cfg")],
+    },
+)
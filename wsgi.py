@@ -0,0 +1,9 @@
+"""
+Point d'entrée WSGI de production (``gunicorn -c gunicorn.conf.py wsgi:app``).
+Les migrations ne sont pas appliquées ici mais une seule fois au démarrage
+du serveur (cf. ``on_starting`` dans gunicorn.conf.py).
+"""
+
+from app import create_app
+
+app = create_app({"AUTO_MIGRATE": False})